@@ -2,7 +2,7 @@
 import requests
 import json
 import asyncio
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 from config import Config
 
 class OpenRouterClient:
@@ -108,22 +108,19 @@ class OpenRouterClient:
         else:
             return {"type": "expense", "category": "другое"}
     
-    async def analyze_spending(self, transactions: List, period_days: int) -> str:
-        """Анализ трат и советы"""
+    async def analyze_spending(self, category_stats: Dict[str, Dict], period_days: int) -> str:
+        """Анализ трат и советы по статистике категорий за период"""
         
-        if not transactions:
+        if not category_stats:
             return "📊 Недостаточно данных для анализа. Добавьте больше транзакций!"
         
         # Подготавливаем данные для AI
-        total_income = sum(t.amount for t in transactions if t.transaction_type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.transaction_type == 'expense')
+        total_income = sum(v['income'] for v in category_stats.values())
+        total_expense = sum(v['expense'] for v in category_stats.values())
         balance = total_income - total_expense
         
-        # Группируем по категориям
-        categories = {}
-        for t in transactions:
-            if t.transaction_type == 'expense':
-                categories[t.category] = categories.get(t.category, 0) + t.amount
+        # Расходы по категориям
+        categories = {c: v['expense'] for c, v in category_stats.items() if v['expense']}
         
         top_expenses = sorted(categories.items(), key=lambda x: x[1], reverse=True)[:5]
         
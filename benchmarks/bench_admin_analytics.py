@@ -0,0 +1,80 @@
+# benchmarks/bench_admin_analytics.py
+"""
+Время админского отчета в зависимости от числа транзакций.
+
+Запуск: python benchmarks/bench_admin_analytics.py [--sizes 10000,100000,1000000]
+                                                   [--users 1000] [--repeat 5]
+
+База наполняется пакетами до каждого размера из --sizes, после чего
+get_admin_analytics вызывается repeat раз. Для сравнения замеряется полный
+проход по transactions, которым отчет считался до счетчиков. Время отчета
+не должно расти вместе с таблицей.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+
+CATEGORIES = ("еда", "транспорт", "дом", "развлечения", "здоровье", "другое")
+BATCH_SIZE = 10000
+
+
+def fill(db: DatabaseManager, users: int, count: int):
+    for _ in range(count // BATCH_SIZE):
+        db.add_transactions_batch([
+            (random.randint(1, users), random.randint(10, 5000), "покупка",
+             random.choice(CATEGORIES), random.choice(("income", "expense")))
+            for _ in range(BATCH_SIZE)
+        ])
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def full_scan(db: DatabaseManager):
+    with db._snapshot() as conn:
+        conn.execute("""
+            SELECT COUNT(*), COUNT(DISTINCT user_id),
+                   SUM(CASE WHEN category = 'другое' THEN 1 ELSE 0 END)
+            FROM transactions
+        """).fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="размеры таблицы через запятую")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"))
+        for user_id in range(1, args.users + 1):
+            db.register_user(user_id, f"user{user_id}", "User")
+
+        print(f"{'транзакций':>12} {'отчет, мс':>10} {'полный проход, мс':>18}")
+        filled = 0
+        for size in sizes:
+            fill(db, args.users, size - filled)
+            filled = size
+            report = best_of(args.repeat, db.get_admin_analytics)
+            scan = best_of(args.repeat, lambda: full_scan(db))
+            print(f"{size:>12} {report * 1000:>10.2f} {scan * 1000:>18.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
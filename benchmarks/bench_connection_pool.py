@@ -0,0 +1,77 @@
+# benchmarks/bench_connection_pool.py
+"""
+Сравнение пула соединений с подключением на каждый вызов.
+
+Запуск: python benchmarks/bench_connection_pool.py [--messages 2000] [--users 50]
+
+Синтетическая нагрузка повторяет путь одного входящего сообщения
+с транзакцией: проверка регистрации, обновление активности,
+добавление транзакции, последняя транзакция и баланс.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+
+
+class PerCallDatabaseManager(DatabaseManager):
+    """Старое поведение: новое соединение без PRAGMA на каждый вызов"""
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def run_workload(db: DatabaseManager, messages: int, users: int) -> float:
+    """Прогон нагрузки, возвращает время в секундах"""
+    rng = random.Random(42)
+    for user_id in range(1, users + 1):
+        db.register_user(user_id, f"user{user_id}", f"User {user_id}")
+
+    started = time.perf_counter()
+    for _ in range(messages):
+        user_id = rng.randint(1, users)
+        db.is_user_registered(user_id)
+        db.update_user_activity(user_id, f"user{user_id}", f"User {user_id}")
+        db.add_transaction(user_id, rng.randint(100, 50000), "обед", "еда", "expense")
+        db.get_last_transaction(user_id)
+        db.get_user_balance(user_id)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for name, manager_cls in (("per-call connect", PerCallDatabaseManager),
+                              ("pooled + pragmas", DatabaseManager)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = manager_cls(os.path.join(tmp, "bench.db"))
+            elapsed = run_workload(db, args.messages, args.users)
+            db.close()
+        results[name] = elapsed
+        print(f"{name:<18} {elapsed:8.3f} s  {args.messages / elapsed:10.1f} msg/s")
+
+    baseline, pooled = results["per-call connect"], results["pooled + pragmas"]
+    print(f"\nУскорение: x{baseline / pooled:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_created_ts.py
+"""
+Фильтр по периоду и разбор времени: created_at (TEXT) против created_ts (INTEGER).
+
+Запуск: python benchmarks/bench_created_ts.py [--users 200] [--per-user 2000] [--days 30]
+
+Диапазонный запрос по пользователю выполняется по индексу (user_id, created_at)
+с datetime('now', ?) и по индексу (user_id, created_ts) с целым параметром.
+Отдельно сравнивается построение datetime на строку в Python.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager, _since_epoch
+
+EPOCH = datetime(1970, 1, 1)
+
+TEXT_QUERY = """
+    SELECT id, amount, created_at FROM transactions INDEXED BY bench_user_created
+    WHERE user_id = ? AND created_at >= datetime('now', ?)
+    ORDER BY created_at DESC
+"""
+EPOCH_QUERY = """
+    SELECT id, amount, created_ts FROM transactions INDEXED BY idx_transactions_user_ts
+    WHERE user_id = ? AND created_ts >= ?
+    ORDER BY created_ts DESC
+"""
+
+
+def seed(conn: sqlite3.Connection, users: int, per_user: int):
+    """История на год назад, равномерно по времени"""
+    now = int(time.time())
+    step = 365 * 86400 // per_user
+    rows = []
+    for user_id in range(users):
+        for i in range(per_user):
+            ts = now - i * step
+            rows.append((user_id, 100 + i, "обед", "еда", "expense",
+                         time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)), ts))
+    conn.executemany("""
+        INSERT INTO transactions (user_id, amount, description, category, transaction_type,
+                                  created_at, created_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.execute("CREATE INDEX bench_user_created ON transactions (user_id, created_at)")
+    conn.commit()
+
+
+def timed(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"))
+        with db._connection() as conn:
+            seed(conn, args.users, args.per_user)
+
+            def scan_text():
+                for user_id in range(args.users):
+                    conn.execute(TEXT_QUERY, (user_id, f'-{args.days} days')).fetchall()
+
+            def scan_epoch():
+                for user_id in range(args.users):
+                    conn.execute(EPOCH_QUERY, (user_id, _since_epoch(args.days))).fetchall()
+
+            rows = conn.execute("SELECT created_at, created_ts FROM transactions").fetchall()
+            texts = [row[0] for row in rows]
+            stamps = [row[1] for row in rows]
+
+            print(f"Диапазонные запросы ({args.users} пользователей, {args.days} дней):")
+            print(f"  created_at + datetime('now', ?) {timed(scan_text):8.3f} s")
+            print(f"  created_ts + целый параметр     {timed(scan_epoch):8.3f} s")
+
+            print(f"\nРазбор времени ({len(rows)} строк):")
+            print(f"  datetime.fromisoformat(text)    "
+                  f"{timed(lambda: [datetime.fromisoformat(t) for t in texts]):8.3f} s")
+            print(f"  EPOCH + timedelta(seconds=ts)   "
+                  f"{timed(lambda: [EPOCH + timedelta(seconds=t) for t in stamps]):8.3f} s")
+            print(f"  datetime.fromtimestamp(ts, UTC) "
+                  f"{timed(lambda: [datetime.fromtimestamp(t, timezone.utc) for t in stamps]):8.3f} s")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_group_commit.py
+"""
+Пропускная способность add_transaction: коммит на строку против group commit.
+
+Запуск: python benchmarks/bench_group_commit.py [--clients 200] [--per-client 20]
+                                                [--synchronous NORMAL|FULL]
+
+Моделирует утренний всплеск: clients параллельных обработчиков, каждый
+добавляет per-client транзакций через AsyncDatabaseManager.
+С --synchronous FULL каждый коммит делает fsync, как на медленном диске.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_manager
+from database.async_db_manager import AsyncDatabaseManager
+
+
+async def client(db: AsyncDatabaseManager, user_id: int, count: int):
+    for i in range(count):
+        ok = await db.add_transaction(user_id, 100 + i, "обед", "еда", "expense")
+        assert ok, "вставка не удалась"
+
+
+async def run(group_commit: bool, clients: int, per_client: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabaseManager(os.path.join(tmp, "bench.db"), group_commit=group_commit)
+        started = time.perf_counter()
+        await asyncio.gather(*(client(db, user_id, per_client) for user_id in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        rows = db.sync.get_user_transaction_stats(0)['transactions']
+        assert rows == per_client, f"ожидалось {per_client} строк, получено {rows}"
+        await db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--per-client", type=int, default=20)
+    parser.add_argument("--synchronous", default="NORMAL", choices=("NORMAL", "FULL"))
+    args = parser.parse_args()
+
+    db_manager.SQLITE_PRAGMAS = tuple(
+        f"PRAGMA synchronous={args.synchronous}" if p.startswith("PRAGMA synchronous") else p
+        for p in db_manager.SQLITE_PRAGMAS
+    )
+
+    total = args.clients * args.per_client
+    results = {}
+    for name, group_commit in (("commit per row", False), ("group commit", True)):
+        elapsed = asyncio.run(run(group_commit, args.clients, args.per_client))
+        results[name] = elapsed
+        print(f"{name:<15} {elapsed:8.3f} s  {total / elapsed:10.1f} rows/s")
+
+    print(f"\nУскорение: x{results['commit per row'] / results['group commit']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
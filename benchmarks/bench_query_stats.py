@@ -0,0 +1,68 @@
+# benchmarks/bench_query_stats.py
+"""
+Накладные расходы статистики запросов (QueryStats) на вызовы DatabaseManager.
+
+Запуск: python benchmarks/bench_query_stats.py [--transactions 20000] [--calls 2000] [--repeat 5]
+
+Одни и те же операции выполняются на базе без статистики и со статистикой
+(журнал медленных выключен, чтобы не мерить EXPLAIN): короткое чтение
+баланса, добавление транзакции, чтение списка транзакций и массовый импорт.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+from database.query_stats import QueryStats
+
+USER_ID = 1
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure(path: str, query_stats, transactions: int, calls: int, repeat: int) -> dict:
+    db = DatabaseManager(path, query_stats=query_stats)
+    db.register_user(USER_ID, "user", "User")
+    rows = [(USER_ID, 100 + i % 500, "покупка", "еда", "expense") for i in range(transactions)]
+    results = {
+        'импорт, с': best_of(1, lambda: db.add_transactions_bulk(rows)),
+        'баланс, мкс': best_of(repeat, lambda: [db.get_user_balance(USER_ID) for _ in range(calls)]) / calls * 1e6,
+        'добавление, мкс': best_of(
+            repeat, lambda: [db.add_transaction(USER_ID, 10, "кофе", "еда", "expense") for _ in range(calls // 10)]
+        ) / (calls // 10) * 1e6,
+        'список, мс': best_of(repeat, lambda: db.get_transactions(USER_ID, 30)) * 1000,
+    }
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = measure(os.path.join(tmp, "plain.db"), None, args.transactions, args.calls, args.repeat)
+        timed = measure(os.path.join(tmp, "timed.db"), QueryStats(slow_query_ms=0),
+                        args.transactions, args.calls, args.repeat)
+
+    print(f"{'операция':>16} {'без статистики':>15} {'со статистикой':>15}")
+    for name in plain:
+        print(f"{name:>16} {plain[name]:>15.2f} {timed[name]:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,18 @@ import asyncio
 import logging
 import os
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
-from database.db_manager import DatabaseManager
+from database.backup import create_backup_task
+from database.query_stats import write_metrics
+from database.storage import create_storage
 from handlers.transactions import TransactionHandler
 from handlers.reports import ReportHandler
 from handlers.delete_transactions import DeleteHandler
 from handlers.keyboard_handler import KeyboardHandler
+from handlers.search import SearchHandler
+from handlers.history import HistoryHandler
 from ai.openrouter_client import OpenRouterClient
 from config import Config
 
@@ -23,11 +27,14 @@ class FinanceBot:
         self.config = Config()
         self.bot = Bot(token=self.config.BOT_TOKEN)
         self.dp = Dispatcher()
-        self.db = DatabaseManager()
+        self.db = create_storage(self.config)
+        self.backups = create_backup_task(self.config)
         self.ai_client = OpenRouterClient(self.config.OPENROUTER_API_KEY)
         self.transaction_handler = TransactionHandler(self.db, self.ai_client)
         self.report_handler = ReportHandler(self.db, self.ai_client)
         self.delete_handler = DeleteHandler(self.db)
+        self.search_handler = SearchHandler(self.db)
+        self.history_handler = HistoryHandler(self.db)
         self.keyboard_handler = KeyboardHandler()
 
         # Регистрируем обработчики
@@ -41,8 +48,8 @@ class FinanceBot:
             user_id = message.from_user.id
 
             # Регистрируем пользователя
-            if not self.db.is_user_registered(user_id):
-                success = self.db.register_user(
+            if not await self.db.is_user_registered(user_id):
+                success = await self.db.register_user(
                     user_id,
                     message.from_user.username,
                     message.from_user.first_name
@@ -78,7 +85,10 @@ class FinanceBot:
                 "**📊 Отчеты и статистика:**\n"
                 "• `/balance` - текущий баланс\n"
                 "• `/stats` - статистика за месяц\n"
-                "• `/report` - детальный отчет с AI анализом\n\n"
+                "• `/report` - детальный отчет с AI анализом\n"
+                "• `/history` - история операций с листанием\n"
+                "• `/export` - выгрузка всех транзакций в CSV\n"
+                "• `/search такси март` - поиск по описанию\n\n"
                 "**🗑 Управление транзакциями:**\n"
                 "• `/delete` - удалить последнюю\n"
                 "• `/deletelist` - выбрать из списка\n"
@@ -99,19 +109,114 @@ class FinanceBot:
                 await message.answer("❌ Команда только для администраторов")
                 return
 
-            stats = self.db.get_user_stats()
+            stats = await self.db.get_user_stats()
+            cache = self.db.get_user_cache_stats()
             await message.answer(
                 f"👑 **Статистика бота**\n\n"
                 f"👥 Всего пользователей: {stats['total']}\n"
                 f"🟢 Активных за 7 дней: {stats['active_7d']}\n"
-                f"🆕 Новых за 30 дней: {stats['new_30d']}",
+                f"🆕 Новых за 30 дней: {stats['new_30d']}\n\n"
+                f"⚡ Кэш пользователей: {cache['size']} ID, "
+                f"попаданий {cache['hits']}, промахов {cache['misses']}",
                 parse_mode="Markdown"
             )
 
+        @self.dp.message(Command("checkbalances"))
+        async def check_balances_command(message: Message):
+            if message.from_user.id not in self.config.ADMIN_USERS:
+                await message.answer("❌ Команда только для администраторов")
+                return
+
+            # Сверяем и сразу пересчитываем расходящиеся балансы
+            mismatches = await self.db.check_user_balances(fix=True)
+            if not mismatches:
+                await message.answer("✅ Балансы всех пользователей согласованы")
+                return
+
+            users = ", ".join(str(m['user_id']) for m in mismatches[:20])
+            await message.answer(
+                f"⚠️ Найдено расхождений: {len(mismatches)}\n"
+                f"👥 Пользователи: {users}\n\n"
+                f"🔧 Таблица балансов пересчитана из транзакций"
+            )
+
+        @self.dp.message(Command("backup"))
+        async def backup_command(message: Message):
+            if message.from_user.id not in self.config.ADMIN_USERS:
+                await message.answer("❌ Команда только для администраторов")
+                return
+            if self.backups is None:
+                await message.answer("ℹ️ База в PostgreSQL - бэкапы через pg_dump")
+                return
+
+            stats = self.backups.get_stats()
+            if stats['running']:
+                progress = stats['progress']
+                done = progress['total'] - progress['remaining']
+                await message.answer(
+                    f"⏳ Идет бэкап {os.path.basename(progress['path'])}: "
+                    f"{done}/{progress['total']} страниц"
+                )
+                return
+
+            await message.answer("💾 Запускаю бэкап...")
+            try:
+                results = await self.backups.run_once()
+            except Exception as e:
+                await message.answer(f"❌ Ошибка бэкапа: {e}")
+                return
+
+            last = self.backups.get_stats()['last']
+            files = "\n".join(f"• {os.path.basename(r['path'])}" for r in results)
+            await message.answer(
+                f"✅ Бэкап готов за {last['seconds']} с\n"
+                f"📦 {last['size'] // 1024} КБ -> {last['compressed_size'] // 1024} КБ (gzip)\n"
+                f"{files}"
+            )
+
+        @self.dp.message(Command("dbstats"))
+        async def db_stats_command(message: Message):
+            if message.from_user.id not in self.config.ADMIN_USERS:
+                await message.answer("❌ Команда только для администраторов")
+                return
+
+            await self.db.explain_slow_queries()
+            stats = self.db.get_query_stats()
+            if stats is None:
+                await message.answer("ℹ️ Статистика запросов выключена (DB_QUERY_STATS) или не ведется для PostgreSQL")
+                return
+
+            lines = [
+                f"📈 Запросы к базе с {stats['since']:%d.%m.%Y %H:%M} UTC",
+                f"🐢 Медленных (от {stats['slow_query_ms']:g} мс): {stats['slow_total']}",
+                "",
+                "⏱ Топ по суммарному времени:"
+            ]
+            methods = sorted(stats['methods'].items(), key=lambda item: item[1]['seconds'], reverse=True)
+            for method, m in methods[:10]:
+                errors = f", ошибок {m['errors']}" if m['errors'] else ""
+                lines.append(
+                    f"• {method}: {m['calls']} выз., {m['seconds']:.2f} с, "
+                    f"p50 {m['p50'] * 1000:.1f} мс, p99 {m['p99'] * 1000:.1f} мс, строк {m['rows']}{errors}"
+                )
+            if not methods:
+                lines.append("• вызовов пока не было")
+
+            if stats['slow_queries']:
+                lines.append("\n🐢 Последние медленные:")
+                for entry in stats['slow_queries'][-3:]:
+                    lines.append(f"• {entry['at']} {entry['method']}: {entry['seconds'] * 1000:.0f} мс")
+                    if entry['sql']:
+                        lines.append(f"  {entry['sql'][:200]}")
+                    lines.extend(f"  ↳ {line}" for line in entry['plan'][:5])
+
+            # Лимит сообщения Telegram - 4096 символов
+            await message.answer("\n".join(lines)[:4000])
+
         @self.dp.message(Command("balance"))
         async def balance_command(message: Message):
             user_id = message.from_user.id
-            balance = self.db.get_user_balance(user_id)
+            balance = await self.db.get_user_balance(user_id)
 
             await message.answer(f"💰 Текущий баланс: {balance:,.0f} ₸")
 
@@ -123,6 +228,18 @@ class FinanceBot:
         async def stats_command(message: Message):
             await self.report_handler.handle_stats_request(message)
 
+        @self.dp.message(Command("export"))
+        async def export_command(message: Message):
+            await self.report_handler.handle_export_request(message)
+
+        @self.dp.message(Command("history"))
+        async def history_command(message: Message):
+            await self.history_handler.handle_history(message)
+
+        @self.dp.message(Command("search"))
+        async def search_command(message: Message, command: CommandObject):
+            await self.search_handler.handle_search(message, command.args)
+
         @self.dp.message(Command("delete"))
         async def delete_last_command(message: Message):
             await self.delete_handler.handle_delete_last(message)
@@ -150,12 +267,70 @@ class FinanceBot:
                 await self.report_handler._generate_report(callback)
             elif callback.data.startswith("delete_"):
                 await self.delete_handler.handle_delete_callback(callback)
+            elif callback.data.startswith("admin_users:"):
+                await self.keyboard_handler.handle_users_page_callback(callback, self.db)
+            elif callback.data.startswith("hist:"):
+                await self.history_handler.handle_history_callback(callback)
+            elif callback.data.startswith("search:"):
+                await self.search_handler.handle_search_callback(callback)
             await callback.answer()
 
+    async def archive_periodically(self):
+        """Раз в сутки переносит транзакции старше ARCHIVE_AFTER_DAYS в архив"""
+        while True:
+            await asyncio.sleep(24 * 3600)
+            try:
+                moved = await self.db.archive_transactions(self.config.ARCHIVE_AFTER_DAYS)
+                if moved:
+                    logger.info(f"🗄 В архив перенесено транзакций: {moved}")
+            except Exception as e:
+                logger.error(f"Ошибка архивирования транзакций: {e}")
+
+    async def export_metrics_periodically(self):
+        """Раз в DB_METRICS_INTERVAL секунд пишет статистику запросов в DB_METRICS_PATH"""
+        while True:
+            await asyncio.sleep(self.config.DB_METRICS_INTERVAL)
+            stats = self.db.get_query_stats()
+            if stats is None:
+                return
+            try:
+                write_metrics(self.config.DB_METRICS_PATH, stats)
+            except OSError as e:
+                logger.error(f"Ошибка записи метрик базы: {e}")
+
+    async def build_search_index(self):
+        """Достройка поискового индекса после обновления существующей базы"""
+        try:
+            indexed = await self.db.build_search_index()
+            if indexed:
+                logger.info(f"🔎 В поисковый индекс добавлено транзакций: {indexed}")
+        except Exception as e:
+            logger.error(f"Ошибка построения поискового индекса: {e}")
+
     async def start_polling(self):
         """Запуск бота"""
         logger.info("🤖 Финансовый бот запускается...")
-        await self.dp.start_polling(self.bot)
+        await self.db.start()
+        if self.backups:
+            self.backups.start()
+        archiver = None
+        if self.config.ARCHIVE_AFTER_DAYS > 0:
+            archiver = asyncio.ensure_future(self.archive_periodically())
+        indexer = asyncio.ensure_future(self.build_search_index())
+        exporter = None
+        if self.config.DB_METRICS_PATH:
+            exporter = asyncio.ensure_future(self.export_metrics_periodically())
+        try:
+            await self.dp.start_polling(self.bot)
+        finally:
+            if archiver:
+                archiver.cancel()
+            if exporter:
+                exporter.cancel()
+            indexer.cancel()
+            if self.backups:
+                await self.backups.close()
+            await self.db.close()
 
 if __name__ == "__main__":
     bot = FinanceBot()
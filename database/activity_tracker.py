@@ -0,0 +1,57 @@
+# database/activity_tracker.py
+import asyncio
+from typing import Dict, Optional
+
+from database.db_manager import DatabaseManager, _utc_timestamp
+
+
+class ActivityTracker:
+    """Буферизованный учет last_activity.
+
+    Вместо записи в базу на каждое сообщение время активности копится
+    в памяти (последнее значение на пользователя) и раз в flush_interval
+    секунд сбрасывается одним пакетным UPSERT. При остановке бота
+    буфер сбрасывается принудительно.
+    """
+
+    def __init__(self, db: DatabaseManager, lane, flush_interval: float = 30.0):
+        self.db = db
+        self._lane = lane
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int):
+        """Отметить активность пользователя (без обращения к базе)"""
+        self._pending[user_id] = _utc_timestamp()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_periodically())
+
+    async def flush(self):
+        """Записать накопленную активность в базу"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await self._lane.run(self.db.touch_users_activity, list(pending.items()))
+        except Exception as e:
+            print(f"Ошибка сохранения активности: {e}")
+            # Возвращаем в буфер то, что не перезаписано более свежими отметками
+            for user_id, timestamp in pending.items():
+                self._pending.setdefault(user_id, timestamp)
+
+    async def close(self):
+        """Остановить периодический сброс и записать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
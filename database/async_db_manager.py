@@ -0,0 +1,242 @@
+# database/async_db_manager.py
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Tuple
+
+from database.activity_tracker import ActivityTracker
+from database.db_manager import (
+    DatabaseManager, Transaction, TransactionBatch, BULK_BATCH_SIZE, HISTORY_PAGE_SIZE, SEARCH_PAGE_SIZE, STREAM_CHUNK_SIZE, USERS_PAGE_SIZE
+)
+from database.group_commit import GroupCommitWriter
+from database.query_stats import QueryStats
+from database.storage import Storage
+
+
+class _WorkerLane:
+    """Пул потоков с ограниченной очередью заданий (backpressure)"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._max_pending = max_pending
+        # Семафор создается лениво, внутри работающего цикла событий
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение функции в потоке; ждет, если очередь заполнена"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending)
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class AsyncDatabaseManager(Storage):
+    """Хранилище на SQLite: асинхронная обертка над DatabaseManager.
+
+    Все записи идут через один поток-писатель, чтения - через пул
+    потоков-читателей, поэтому SQLite никогда не блокирует цикл событий aiogram.
+    С group_commit=True add_transaction пишет пачками через GroupCommitWriter.
+    """
+
+    def __init__(self, db_path: str = "data/finance_bot.db", readers: int = 3,
+                 max_pending: int = 100, group_commit: bool = False, streams: int = 2,
+                 query_stats: Optional[QueryStats] = None):
+        # Соединений хватает на всех читателей и писателя. Read-only снимки
+        # берут потоки-читатели (история, поиск), аналитический поток и
+        # потоковые чтения, которые держат соединение между порциями, - каждому
+        # свое, чтобы читатель не ждал медленного потребителя выгрузки
+        self.sync = DatabaseManager(
+            db_path, pool_size=readers + 1, snapshot_pool_size=readers + streams + 1, query_stats=query_stats
+        )
+        self.db_path = db_path
+        self._writer = _WorkerLane("db-writer", 1, max_pending)
+        self._readers = _WorkerLane("db-reader", readers, max_pending)
+        # Долгие админские запросы не занимают потоки пользовательских чтений
+        self._analytics = _WorkerLane("db-analytics", 1, max_pending)
+        self._group_commit = GroupCommitWriter(self.sync, self._writer) if group_commit else None
+        self._activity = ActivityTracker(self.sync, self._writer)
+        # Потоковое чтение держит соединение между порциями - ограничиваем число таких чтений
+        self._max_streams = streams
+        self._streams: Optional[asyncio.Semaphore] = None
+
+    async def close(self):
+        """Остановка потоков и закрытие соединений"""
+        await self._activity.close()
+        if self._group_commit:
+            await self._group_commit.close()
+        self._writer.shutdown()
+        self._readers.shutdown()
+        self._analytics.shutdown()
+        self.sync.close()
+
+    # === ЗАПИСЬ ===
+
+    async def register_user(self, user_id: int, username: str = None, first_name: str = None) -> bool:
+        """Регистрация нового пользователя"""
+        return await self._writer.run(self.sync.register_user, user_id, username, first_name)
+
+    async def add_transaction(self, user_id: int, amount: float, description: str,
+                              category: str, transaction_type: str) -> Optional[Tuple[Transaction, float]]:
+        """Добавление транзакции: (созданная транзакция, новый баланс) или None"""
+        if self._group_commit:
+            row = (user_id, amount, description, category, transaction_type)
+            return await self._group_commit.submit(row)
+        return await self._writer.run(
+            self.sync.add_transaction, user_id, amount, description, category, transaction_type
+        )
+
+    async def add_transactions_bulk(self, rows: Iterable[tuple], batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Массовый импорт: строки читаются и пишутся в потоке-писателе"""
+        return await self._writer.run(self.sync.add_transactions_bulk, rows, batch_size)
+
+    def record_activity(self, user_id: int):
+        """Отметка активности: копится в памяти и пишется пакетом"""
+        self._activity.touch(user_id)
+
+    async def update_user_activity(self, user_id: int, username: str = None, first_name: str = None):
+        """Обновление активности пользователя"""
+        return await self._writer.run(self.sync.update_user_activity, user_id, username, first_name)
+
+    async def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удаление транзакции по ID"""
+        return await self._writer.run(self.sync.delete_transaction, transaction_id, user_id)
+
+    async def delete_transaction_returning(self, transaction_id: int,
+                                           user_id: int) -> Optional[Tuple[Transaction, float]]:
+        """Удаление транзакции: (удаленная транзакция, новый баланс) или None"""
+        return await self._writer.run(self.sync.delete_transaction_returning, transaction_id, user_id)
+
+    async def check_user_balances(self, fix: bool = False) -> List[dict]:
+        """Сверка таблицы балансов с транзакциями"""
+        lane = self._writer if fix else self._analytics
+        return await lane.run(self.sync.check_user_balances, fix)
+
+    async def archive_transactions(self, days: int) -> Dict[int, int]:
+        """Перенос старых транзакций в архивы по годам.
+
+        Идет в потоке аналитики: блокировка записи берется на каждую порцию
+        отдельно, поток-писатель между порциями продолжает работу.
+        """
+        return await self._analytics.run(self.sync.archive_transactions, days)
+
+    async def build_search_index(self, rebuild: bool = False) -> int:
+        """Достройка поискового индекса порциями (как архивирование - в потоке аналитики)"""
+        return await self._analytics.run(self.sync.build_search_index, rebuild)
+
+    # === ЧТЕНИЕ ===
+
+    async def is_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации пользователя; попадание в кэш - без потока и запроса"""
+        cached = self.sync.user_cache.lookup(user_id)
+        if cached is not None:
+            return cached
+        return await self._readers.run(self.sync.fetch_user_registered, user_id)
+
+    def get_user_cache_stats(self) -> dict:
+        """Счетчики кэша зарегистрированных пользователей"""
+        return self.sync.user_cache.stats()
+
+    def get_query_stats(self) -> Optional[dict]:
+        """Время вызовов по методам и журнал медленных"""
+        if self.sync.query_stats is None:
+            return None
+        return self.sync.query_stats.snapshot()
+
+    async def explain_slow_queries(self):
+        """Планы запросов журнала медленных - в аналитическом потоке, не в потоке записи"""
+        if self.sync.query_stats is not None:
+            await self._analytics.run(self.sync.query_stats.explain_slow)
+
+    async def get_user_stats(self) -> dict:
+        """Статистика пользователей (для админов)"""
+        return await self._analytics.run(self.sync.get_user_stats)
+
+    async def get_detailed_users_list(self) -> list:
+        """Подробный список пользователей (для админов)"""
+        return await self._analytics.run(self.sync.get_detailed_users_list)
+
+    async def get_users_page(self, after: Optional[Tuple[str, int]] = None,
+                             before: Optional[Tuple[str, int]] = None,
+                             limit: int = USERS_PAGE_SIZE) -> dict:
+        """Страница пользователей со статистикой (для админов)"""
+        return await self._analytics.run(self.sync.get_users_page, after, before, limit)
+
+    async def get_user_transaction_stats(self, user_id: int) -> dict:
+        """Статистика транзакций конкретного пользователя"""
+        return await self._readers.run(self.sync.get_user_transaction_stats, user_id)
+
+    async def get_user_balance(self, user_id: int) -> float:
+        """Получение баланса пользователя"""
+        return await self._readers.run(self.sync.get_user_balance, user_id)
+
+    async def get_transactions(self, user_id: int, days: int = 30,
+                               limit: Optional[int] = None) -> List[Transaction]:
+        """Получение транзакций за период (новые первыми)"""
+        return await self._readers.run(self.sync.get_transactions, user_id, days, limit)
+
+    async def get_transaction_batch(self, user_id: int, days: int = 30,
+                                    limit: Optional[int] = None) -> TransactionBatch:
+        """Транзакции за период в колоночном виде (новые первыми)"""
+        return await self._readers.run(self.sync.get_transaction_batch, user_id, days, limit)
+
+    async def iter_transactions(self, user_id: int, days: int = 30,
+                                chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Transaction]:
+        """Потоковое чтение транзакций за период: порции читаются в потоке-читателе"""
+        if self._streams is None:
+            self._streams = asyncio.Semaphore(self._max_streams)
+
+        async with self._streams:
+            rows = self.sync.iter_transactions(user_id, days, chunk_size)
+            try:
+                while True:
+                    chunk = await self._readers.run(list, itertools.islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    for transaction in chunk:
+                        yield transaction
+            finally:
+                # Возвращаем соединение в пул, даже если чтение прервали
+                await self._readers.run(rows.close)
+
+    async def get_category_stats(self, user_id: int, days: int = 30) -> Dict[str, Dict]:
+        """Статистика по категориям"""
+        return await self._readers.run(self.sync.get_category_stats, user_id, days)
+
+    async def get_history_page(self, user_id: int, after: Optional[Tuple[datetime, int]] = None,
+                               before: Optional[Tuple[datetime, int]] = None,
+                               limit: int = HISTORY_PAGE_SIZE) -> dict:
+        """Страница истории транзакций (новые первыми)"""
+        return await self._readers.run(self.sync.get_history_page, user_id, after, before, limit)
+
+    async def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Transaction]:
+        """Получение транзакции пользователя по ID"""
+        return await self._readers.run(self.sync.get_transaction_by_id, transaction_id, user_id)
+
+    async def get_last_transaction(self, user_id: int) -> Optional[Transaction]:
+        """Получение последней транзакции пользователя"""
+        return await self._readers.run(self.sync.get_last_transaction, user_id)
+
+    async def get_recent_transactions_for_deletion(self, user_id: int, limit: int = 10) -> List[Transaction]:
+        """Получение последних транзакций для удаления"""
+        return await self._readers.run(self.sync.get_recent_transactions_for_deletion, user_id, limit)
+
+    async def search_transactions(self, user_id: int, query: str, since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None, after: Optional[int] = None,
+                                  before: Optional[int] = None, limit: int = SEARCH_PAGE_SIZE) -> dict:
+        """Поиск транзакций пользователя по словам описания"""
+        return await self._readers.run(
+            self.sync.search_transactions, user_id, query, since, until, after, before, limit
+        )
+
+    async def get_admin_analytics(self) -> dict:
+        """Агрегированные данные для админской аналитики"""
+        return await self._analytics.run(self.sync.get_admin_analytics)
@@ -0,0 +1,257 @@
+# database/backup.py
+"""
+Онлайн-бэкапы SQLite через sqlite3.Connection.backup.
+
+Копирование идет шагами по pages страниц с паузой sleep между шагами,
+внутри одной транзакции чтения на исходной базе. В WAL-режиме чтение не
+берет блокировку записи, поэтому бот продолжает писать во время бэкапа,
+а снимок остается согласованным: изменения других соединений не
+перезапускают копирование. Готовая копия сжимается в gzip с меткой времени
+в имени, старые архивы сверх keep удаляются.
+"""
+import asyncio
+import functools
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from database.sharded_storage import shard_paths
+
+# Страниц за шаг и пауза между шагами (секунды)
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.05
+
+# Метка времени в имени архива: finance_bot-20240131-235959.db.gz
+BACKUP_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupCancelled(Exception):
+    """Бэкап остановлен при закрытии бота"""
+
+
+def _archive_prefix(db_path: str) -> str:
+    root, _ = os.path.splitext(os.path.basename(db_path))
+    return f"{root}-"
+
+
+def backup_database(db_path: str, backup_dir: str, pages: int = BACKUP_PAGES,
+                    sleep: float = BACKUP_SLEEP, keep: int = 7, progress=None) -> dict:
+    """Снимок базы в backup_dir/<имя>-<время>.db.gz; возвращает метрики.
+
+    progress(path, remaining, total) вызывается после каждого шага
+    и может прервать бэкап исключением.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime(BACKUP_TIME_FORMAT)
+    root, ext = os.path.splitext(os.path.basename(db_path))
+    archive_path = os.path.join(backup_dir, f"{root}-{stamp}{ext}.gz")
+    # Два бэкапа в одну секунду не должны перезаписать друг друга
+    suffix = 1
+    while os.path.exists(archive_path):
+        archive_path = os.path.join(backup_dir, f"{root}-{stamp}.{suffix}{ext}.gz")
+        suffix += 1
+    temp_path = os.path.join(backup_dir, f".{os.path.basename(archive_path)}.tmp")
+    steps = 0
+
+    def on_step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress:
+            progress(db_path, remaining, total)
+        # backup() сам ждет только при SQLITE_BUSY; паузу между шагами делаем здесь
+        if remaining:
+            time.sleep(sleep)
+
+    started = time.perf_counter()
+    source = sqlite3.connect(db_path, timeout=5)
+    target = sqlite3.connect(temp_path)
+    try:
+        # Транзакция чтения на весь бэкап: один снимок для всех шагов
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+        source.rollback()
+        copied = time.perf_counter()
+        target.close()
+        source.close()
+
+        size = os.path.getsize(temp_path)
+        try:
+            with open(temp_path, "rb") as raw, gzip.open(archive_path, "wb", compresslevel=6) as archive:
+                shutil.copyfileobj(raw, archive)
+        except BaseException:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            raise
+    except BaseException:
+        target.close()
+        source.close()
+        raise
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    finished = time.perf_counter()
+    return {
+        'path': archive_path,
+        'steps': steps,
+        'size': size,
+        'compressed_size': os.path.getsize(archive_path),
+        'copy_seconds': round(copied - started, 3),
+        'total_seconds': round(finished - started, 3),
+        'removed': prune_backups(db_path, backup_dir, keep),
+        'finished_at': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def prune_backups(db_path: str, backup_dir: str, keep: int) -> List[str]:
+    """Удаление архивов базы сверх keep последних"""
+    prefix = _archive_prefix(db_path)
+    archives = sorted(
+        (name for name in os.listdir(backup_dir)
+         if name.startswith(prefix) and name.endswith(".gz")),
+        key=lambda name: os.path.getmtime(os.path.join(backup_dir, name))
+    )
+    removed = archives[:-keep] if keep > 0 else []
+    for name in removed:
+        os.remove(os.path.join(backup_dir, name))
+    return removed
+
+
+class BackupTask:
+    """Периодический бэкап файлов SQLite в фоне.
+
+    Раз в interval секунд копирует все файлы базы (при шардировании - каждый
+    шард) в отдельном потоке. Прогресс текущего бэкапа и метрики последнего
+    доступны через get_stats().
+    """
+
+    def __init__(self, db_paths: List[str], backup_dir: str, interval: float,
+                 keep: int = 7, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP):
+        self.db_paths = db_paths
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._current: Optional[asyncio.Future] = None
+        self._stopping = False
+        self._progress: Optional[dict] = None
+        self._last: Optional[dict] = None
+        self._last_error: Optional[str] = None
+        self._completed = 0
+
+    def start(self):
+        """Запуск расписания (первый бэкап - через interval секунд)"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run_periodically())
+
+    async def close(self):
+        """Остановить расписание и прервать идущий бэкап"""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Поток бэкапа не отменить снаружи: ждем, пока он заметит остановку
+        if self._current is not None and not self._current.done():
+            try:
+                await self._current
+            except Exception:
+                pass
+
+    async def run_once(self) -> List[dict]:
+        """Бэкап всех файлов базы сейчас; повторный вызов ждет текущий"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            results = []
+            try:
+                for db_path in self._files():
+                    self._current = loop.run_in_executor(None, functools.partial(
+                        backup_database, db_path, self.backup_dir, self.pages,
+                        self.sleep, self.keep, self._on_progress
+                    ))
+                    # shield: отмена задачи не должна отменять ожидание потока в close()
+                    results.append(await asyncio.shield(self._current))
+            except BackupCancelled:
+                return results
+            except Exception as e:
+                self._last_error = str(e)
+                raise
+            finally:
+                self._progress = None
+
+            self._completed += 1
+            self._last_error = None
+            self._last = {
+                'files': len(results),
+                'size': sum(r['size'] for r in results),
+                'compressed_size': sum(r['compressed_size'] for r in results),
+                'seconds': round(sum(r['total_seconds'] for r in results), 3),
+                'finished_at': results[-1]['finished_at'] if results else None,
+                'paths': [r['path'] for r in results]
+            }
+            return results
+
+    def _files(self) -> List[str]:
+        """Файлы базы и уже созданные архивы по годам (finance_bot.archive2023.db)"""
+        files = []
+        for db_path in self.db_paths:
+            root, ext = os.path.splitext(db_path)
+            files.append(db_path)
+            files.extend(sorted(glob.glob(f"{glob.escape(root)}.archive*{ext}")))
+        return files
+
+    def get_stats(self) -> dict:
+        """Прогресс текущего бэкапа и метрики последнего успешного"""
+        return {
+            'running': self._progress is not None,
+            'progress': dict(self._progress) if self._progress else None,
+            'last': self._last,
+            'last_error': self._last_error,
+            'completed': self._completed
+        }
+
+    def _on_progress(self, db_path: str, remaining: int, total: int):
+        # Вызывается из потока бэкапа после каждого шага
+        if self._stopping:
+            raise BackupCancelled()
+        self._progress = {'path': db_path, 'remaining': remaining, 'total': total}
+
+    async def _run_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                results = await self.run_once()
+                for r in results:
+                    print(f"💾 Бэкап {r['path']}: {r['size']} -> {r['compressed_size']} байт, "
+                          f"{r['steps']} шагов, {r['total_seconds']} с")
+            except Exception as e:
+                print(f"Ошибка бэкапа базы: {e}")
+
+
+def create_backup_task(config) -> Optional[BackupTask]:
+    """Бэкапы для файлов SQLite из конфигурации; для PostgreSQL - None (pg_dump)"""
+    if config.DATABASE_URL.startswith(("postgres://", "postgresql://")):
+        return None
+    if config.DB_SHARDS > 1:
+        db_paths = shard_paths(config.DATABASE_PATH, config.DB_SHARDS)
+    else:
+        db_paths = [config.DATABASE_PATH]
+    return BackupTask(
+        db_paths, config.BACKUP_DIR, config.BACKUP_INTERVAL_HOURS * 3600,
+        keep=config.BACKUP_KEEP, pages=config.BACKUP_PAGES, sleep=config.BACKUP_SLEEP
+    )
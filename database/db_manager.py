@@ -1,148 +1,930 @@
 # database/db_manager.py
+import calendar
+import itertools
+import math
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
-
-@dataclass
-class Transaction:
-    """Модель транзакции"""
-    id: Optional[int] = None
-    user_id: int = None
-    amount: float = None
-    description: str = None
-    category: str = None
-    transaction_type: str = None  # 'income' или 'expense'
-    created_at: Optional[datetime] = None
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+
+from database.migrations import ROLLUP_TABLES, SEARCH_INDEX_COMPLETE, apply_migrations, init_archive
+from database.models import Transaction, TransactionBatch
+from database.query_stats import InstrumentedConnection, QueryStats, timed
+from database.user_cache import RegisteredUserCache, USER_CACHE_CAPACITY
+
+
+# Настройки каждого соединения из пула
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",       # ~16 МБ страничного кэша
+    "PRAGMA mmap_size=134217728",     # 128 МБ memory-mapped I/O
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Настройки read-only соединений для аналитики: запись запрещена и на уровне SQLite
+SNAPSHOT_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Размер кэша подготовленных выражений на соединение
+STATEMENT_CACHE_SIZE = 256
+
+# До какой длины периода статистика берется из дневных сводок (дальше - из месячных)
+DAILY_ROLLUP_MAX_DAYS = 366
+
+# Сколько строк читать за один fetchmany при потоковом чтении истории
+STREAM_CHUNK_SIZE = 500
+
+# Допустимое расхождение сумм при проверке балансов (накопление REAL)
+BALANCE_TOLERANCE = 0.01
+
+# Сегменты пользователей по числу операций: (имя, минимум операций), от большего
+ACTIVITY_SEGMENTS = (("high", 10), ("medium", 3), ("low", 1))
+
+# Пользователей на странице админского списка
+USERS_PAGE_SIZE = 10
+
+# Сколько строк переносить в архив за одну транзакцию записи
+ARCHIVE_CHUNK_SIZE = 1000
+
+# Больше лет архива не переносим: запрос за весь период подключает все архивы,
+# а SQLite по умолчанию подключает к соединению не больше 10 баз
+MAX_ARCHIVE_YEARS = 10
+
+# Схема подключенного архива в тексте SQL: archive_<год>.transactions
+ARCHIVE_SCHEMA_RE = re.compile(r"\barchive_(\d{4})\.")
+
+# Строк в одном executemany при массовом импорте
+BULK_BATCH_SIZE = 1000
+
+# Транзакций на странице истории
+HISTORY_PAGE_SIZE = 10
+
+# Найденных транзакций на странице поиска
+SEARCH_PAGE_SIZE = 10
+
+# Сколько строк добавлять в поисковый индекс за одну транзакцию записи
+SEARCH_INDEX_CHUNK_SIZE = 5000
+
+# Колонки transactions в порядке основной и архивных таблиц
+TRANSACTION_COLUMNS = ("id, user_id, amount, description, category, transaction_type, "
+                       "created_at, created_ts")
+
+
+def _utc_timestamp() -> str:
+    """Текущее время UTC в формате CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _format_epoch(timestamp: int) -> str:
+    """Epoch-секунды -> текст в формате CURRENT_TIMESTAMP (UTC)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+
+
+def _since_epoch(days: int) -> int:
+    """Граница периода «последние days дней» в epoch-секундах"""
+    return int(time.time()) - days * 86400
+
+
+def _to_epoch(moment: datetime) -> int:
+    """naive UTC datetime -> epoch-секунды"""
+    return calendar.timegm(moment.timetuple())
+
+
+def search_terms(query: str) -> List[str]:
+    """Слова поискового запроса в нижнем регистре (без операторов и кавычек)"""
+    return re.findall(r"\w+", query.lower())
+
+
+def _search_match(user_id: int, terms: List[str]) -> str:
+    """Выражение MATCH для FTS5: строки пользователя, где есть все слова (по префиксу)"""
+    words = " AND ".join(f'description : "{term}"*' for term in terms)
+    return f'user_id : "{user_id}" AND {words}'
+
+
+def prepare_bulk_row(row: tuple, now_ts: int) -> tuple:
+    """Проверка строки массового импорта.
+    
+    row - (user_id, amount, description, category, transaction_type[, created_at]),
+    created_at - datetime или 'YYYY-MM-DD HH:MM:SS' (UTC), по умолчанию now_ts.
+    Возвращает (user_id, amount, description, category, transaction_type, created_ts);
+    для некорректной строки - ValueError или TypeError с причиной.
+    """
+    if len(row) not in (5, 6):
+        raise ValueError(f"ожидается 5 или 6 полей, получено {len(row)}")
+    user_id, amount, description, category, transaction_type = row[:5]
+    if transaction_type not in ('income', 'expense'):
+        raise ValueError(f"неизвестный тип операции: {transaction_type!r}")
+    if not description or not category:
+        raise ValueError("пустое описание или категория")
+    amount = float(amount)
+    if not math.isfinite(amount):
+        raise ValueError(f"некорректная сумма: {amount}")
+    
+    created_at = row[5] if len(row) == 6 else None
+    if created_at is None:
+        created_ts = now_ts
+    else:
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        created_ts = _to_epoch(created_at)
+    return int(user_id), amount, str(description), str(category), transaction_type, created_ts
+
+
+def _activity_segment(txn_count: int) -> Optional[str]:
+    """Сегмент пользователя по числу операций (None - без операций)"""
+    for name, minimum in ACTIVITY_SEGMENTS:
+        if txn_count >= minimum:
+            return name
+    return None
+
 
 class DatabaseManager:
     """Менеджер базы данных SQLite"""
     
-    def __init__(self, db_path: str = "data/finance_bot.db"):
+    def __init__(self, db_path: str = "data/finance_bot.db", pool_size: int = 4,
+                 user_cache_capacity: int = USER_CACHE_CAPACITY, snapshot_pool_size: int = 2,
+                 query_stats: Optional[QueryStats] = None):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool = queue.Queue(maxsize=pool_size)
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        # Отдельный пул read-only соединений для долгих чтений (аналитика, отчеты)
+        self.snapshot_pool_size = snapshot_pool_size
+        self._snapshot_pool = queue.Queue(maxsize=snapshot_pool_size)
+        self._snapshot_connections: List[sqlite3.Connection] = []
+        self.user_cache = RegisteredUserCache(user_cache_capacity)
+        # Соединения с подключенными архивами: отключаются при возврате в пул
+        self._archive_connections = set()
+        # Время вызовов и журнал медленных запросов (None - без замеров)
+        self.query_stats = query_stats
         self.init_database()
+        self._warm_user_cache()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие долгоживущего соединения с настроенными PRAGMA"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=self._connection_factory()
+        )
+        conn.row_factory = sqlite3.Row
+        self._instrument(conn)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _connect_readonly(self) -> sqlite3.Connection:
+        """Открытие read-only соединения (mode=ro, query_only) для снимков"""
+        conn = sqlite3.connect(
+            f"{Path(self.db_path).resolve().as_uri()}?mode=ro",
+            uri=True,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=self._connection_factory()
+        )
+        conn.row_factory = sqlite3.Row
+        self._instrument(conn)
+        for pragma in SNAPSHOT_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _connection_factory(self):
+        """Класс соединения: со статистикой запросов - считающий строки"""
+        return InstrumentedConnection if self.query_stats is not None else sqlite3.Connection
+    
+    def _instrument(self, conn: sqlite3.Connection):
+        """Подключение соединения к статистике запросов"""
+        if self.query_stats is not None:
+            conn.query_stats = self.query_stats
+    
+    def _explain_query(self, sql: str, params) -> List[str]:
+        """План запроса для журнала медленных вызовов.
+        
+        Строится на отдельном соединении без статистики: соединения пулов
+        могут быть заняты, в том числе самим медленным вызовом.
+        """
+        try:
+            conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=5)
+        except sqlite3.Error as e:
+            return [f"EXPLAIN недоступен: {e}"]
+        try:
+            years = sorted({int(year) for year in ARCHIVE_SCHEMA_RE.findall(sql)})
+            self._attach_archives(conn, years, readonly=True)
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+        except sqlite3.Error as e:
+            return [f"EXPLAIN недоступен: {e}"]
+        finally:
+            conn.close()
+    
+    def _checkout(self, pool: queue.Queue, connections: list, size: int, connect) -> sqlite3.Connection:
+        """Свободное соединение пула; новое открывается, пока пул не заполнен"""
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if len(connections) < size:
+                conn = connect()
+                connections.append(conn)
+                return conn
+        return pool.get()
+    
+    @contextmanager
+    def _connection(self):
+        """Соединение из пула: commit при успехе, rollback при ошибке"""
+        conn = self._checkout(self._pool, self._connections, self.pool_size, self._connect)
+        
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._detach_archives(conn)
+            self._pool.put(conn)
+    
+    @contextmanager
+    def _snapshot(self, archives_since: Optional[int] = None):
+        """Read-only соединение с одной транзакцией чтения на весь блок.
+        
+        В WAL-режиме все запросы блока видят один и тот же снимок базы
+        и не мешают записи: писатель продолжает коммитить в WAL.
+        archives_since - начало периода (epoch), для которого нужны архивы;
+        None - блок архивы не читает.
+        """
+        conn = self._checkout(
+            self._snapshot_pool, self._snapshot_connections, self.snapshot_pool_size,
+            self._connect_readonly
+        )
+        try:
+            while True:
+                # ATTACH невозможен внутри транзакции - подключаем архивы до BEGIN
+                years = []
+                if archives_since is not None:
+                    years = self._archive_years(conn, archives_since)
+                    self._attach_archives(conn, years, readonly=True)
+                conn.execute("BEGIN")
+                # Перенос в архив между списком лет и BEGIN мог добавить год,
+                # который снимок уже видит, а соединение - нет
+                if archives_since is None or set(self._archive_years(conn, archives_since)) <= set(years):
+                    break
+                conn.rollback()
+            yield conn
+        finally:
+            conn.rollback()
+            self._detach_archives(conn)
+            self._snapshot_pool.put(conn)
+    
+    def close(self):
+        """Закрытие всех соединений пулов"""
+        with self._pool_lock:
+            for conn in self._connections + self._snapshot_connections:
+                conn.close()
+            self._connections.clear()
+            self._snapshot_connections.clear()
+            self._pool = queue.Queue(maxsize=self.pool_size)
+            self._snapshot_pool = queue.Queue(maxsize=self.snapshot_pool_size)
+    
+    # === АРХИВ ===
+    
+    def archive_path(self, year: int) -> str:
+        """Файл архива за год рядом с базой: finance_bot.db -> finance_bot.archive2023.db"""
+        root, ext = os.path.splitext(self.db_path)
+        return f"{root}.archive{year}{ext}"
+    
+    def _archive_years(self, conn, since_ts: int = 0) -> List[int]:
+        """Годы архивов, в которых есть транзакции не старше since_ts"""
+        rows = conn.execute("""
+            SELECT year FROM transaction_archives
+            WHERE max_created_ts >= ?
+            ORDER BY year
+        """, (since_ts,)).fetchall()
+        return [row[0] for row in rows]
+    
+    def _attach_archives(self, conn, years: List[int], readonly: bool = False):
+        """Подключение архивов к соединению (вне транзакции).
+        
+        Схема архива за год - archive_<год>. SQLite по умолчанию подключает
+        не больше 10 баз к одному соединению (MAX_ARCHIVE_YEARS), поэтому
+        подключаются только годы периода запроса, а при возврате соединения
+        в пул они отключаются.
+        """
+        if not years:
+            return
+        attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+        for year in years:
+            schema = f"archive_{year}"
+            if schema in attached:
+                continue
+            path = Path(self.archive_path(year)).resolve()
+            self._archive_connections.add(conn)
+            conn.execute(
+                f"ATTACH DATABASE ? AS {schema}",
+                (f"{path.as_uri()}?mode=ro" if readonly else str(path),)
+            )
+    
+    def _detach_archives(self, conn):
+        """Отключение архивов от соединения пула (вне транзакции)"""
+        if conn not in self._archive_connections:
+            return
+        try:
+            for row in conn.execute("PRAGMA database_list").fetchall():
+                if row[1].startswith("archive_"):
+                    conn.execute(f"DETACH DATABASE {row[1]}")
+            self._archive_connections.discard(conn)
+        except sqlite3.Error as e:
+            # Останется подключенным до следующего возврата в пул
+            print(f"Ошибка отключения архивов: {e}")
+    
+    @staticmethod
+    def _transactions_source(years: List[int]) -> str:
+        """Источник для FROM: горячая таблица или она же вместе с архивами.
+        
+        Строка, уже скопированная в архив, но еще не удаленная из горячей
+        таблицы, берется один раз - из горячей.
+        """
+        if not years:
+            return "transactions"
+        parts = [f"SELECT {TRANSACTION_COLUMNS} FROM main.transactions"]
+        for year in years:
+            parts.append(f"""
+                SELECT {TRANSACTION_COLUMNS} FROM archive_{year}.transactions AS a
+                WHERE NOT EXISTS (SELECT 1 FROM main.transactions AS m WHERE m.id = a.id)
+            """)
+        return f"({' UNION ALL '.join(parts)}) AS transactions"
+    
+    def _period_source(self, conn, since_ts: int) -> str:
+        """Источник транзакций за период: архивы подключаются, только если нужны"""
+        years = self._archive_years(conn, since_ts)
+        self._attach_archives(conn, years)
+        return self._transactions_source(years)
+    
+    def _write_archive(self, year: int, rows: List[tuple]):
+        """Копирование строк в архив за год (отдельное соединение, свой коммит)"""
+        conn = sqlite3.connect(self.archive_path(year), timeout=5)
+        try:
+            init_archive(conn)
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO transactions ({TRANSACTION_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @timed
+    def archive_transactions(self, days: int, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> Dict[int, int]:
+        """Перенос транзакций старше days дней в архивы по годам.
+        
+        Порция строк сначала записывается в архив (свой коммит), потом в одной
+        транзакции основной базы удаляется из горячей таблицы и архив
+        регистрируется в transaction_archives - читатели в любой момент видят
+        каждую строку ровно один раз. Балансы и сводки не меняются: архивные
+        строки в них по-прежнему учтены. После переноса затронутые архивы
+        сжимаются VACUUM. Возвращает число перенесенных строк по годам.
+        Если архив занял бы больше MAX_ARCHIVE_YEARS лет - ValueError,
+        и ничего не переносится.
+        """
+        cutoff = _since_epoch(days)
+        moved: Dict[int, int] = {}
+        
+        with self._connection() as conn:
+            years = set(self._archive_years(conn))
+            years.update(row[0] for row in conn.execute("""
+                SELECT DISTINCT CAST(strftime('%Y', created_ts, 'unixepoch') AS INTEGER)
+                FROM transactions
+                WHERE created_ts < ?
+            """, (cutoff,)))
+        if len(years) > MAX_ARCHIVE_YEARS:
+            raise ValueError(
+                f"архив занял бы {len(years)} лет ({min(years)}-{max(years)}), "
+                f"допустимо не больше {MAX_ARCHIVE_YEARS}: запросы за весь период "
+                f"не смогут подключить все архивы"
+            )
+        
+        while True:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                # Блокировка записи на порцию: строку не удалят между копированием и удалением
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"""
+                    SELECT {TRANSACTION_COLUMNS} FROM transactions
+                    WHERE created_ts < ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (cutoff, chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                
+                by_year: Dict[int, List[tuple]] = {}
+                for row in rows:
+                    by_year.setdefault(time.gmtime(row[7]).tm_year, []).append(row)
+                for year, year_rows in by_year.items():
+                    self._write_archive(year, year_rows)
+                
+                cursor.executemany("""
+                    INSERT INTO transaction_archives (year, row_count, max_created_ts)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(year) DO UPDATE SET
+                        row_count = row_count + excluded.row_count,
+                        max_created_ts = MAX(max_created_ts, excluded.max_created_ts)
+                """, [(year, len(year_rows), max(r[7] for r in year_rows))
+                      for year, year_rows in by_year.items()])
+                
+                last_by_user: Dict[int, str] = {}
+                for row in rows:
+                    last_by_user[row[1]] = max(last_by_user.get(row[1], ''), row[6])
+                cursor.executemany("""
+                    INSERT INTO archived_users (user_id, last_txn_at)
+                    VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        last_txn_at = MAX(last_txn_at, excluded.last_txn_at)
+                """, list(last_by_user.items()))
+                
+                cursor.executemany("DELETE FROM transactions WHERE id = ?", [(row[0],) for row in rows])
+                conn.commit()
+            
+            for year, year_rows in by_year.items():
+                moved[year] = moved.get(year, 0) + len(year_rows)
+        
+        for year in moved:
+            self.compact_archive(year)
+        return moved
+    
+    @timed
+    def compact_archive(self, year: int):
+        """VACUUM архива за год: пересобирает файл без пустых страниц"""
+        conn = sqlite3.connect(self.archive_path(year), timeout=5)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    
+    # === ПОИСК ===
+    
+    @timed
+    def build_search_index(self, rebuild: bool = False,
+                           chunk_size: int = SEARCH_INDEX_CHUNK_SIZE) -> int:
+        """Достройка полнотекстового индекса транзакций порциями (онлайн).
+        
+        Строки с id <= indexed_upto уже в индексе и дальше ведутся триггерами;
+        каждая порция добавляет следующие chunk_size строк и сдвигает границу
+        в одной транзакции, поэтому вставки и удаления между порциями не
+        теряются и не попадают в индекс дважды. С rebuild=True индекс сначала
+        очищается. Пока индекс не достроен, поиск видит только часть строк.
+        Возвращает число добавленных строк.
+        """
+        indexed = 0
+        if rebuild:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('delete-all')")
+                cursor.execute("UPDATE search_index_state SET indexed_upto = 0")
+                conn.commit()
+        
+        while True:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT indexed_upto FROM search_index_state")
+                upto = cursor.fetchone()[0]
+                if upto == SEARCH_INDEX_COMPLETE:
+                    break
+                
+                cursor.execute("""
+                    SELECT MAX(id), COUNT(*) FROM (
+                        SELECT id FROM transactions WHERE id > ? ORDER BY id LIMIT ?
+                    )
+                """, (upto, chunk_size))
+                last_id, count = cursor.fetchone()
+                if not count:
+                    # Новее границы строк нет - дальше все ведут триггеры
+                    cursor.execute("UPDATE search_index_state SET indexed_upto = ?",
+                                   (SEARCH_INDEX_COMPLETE,))
+                    conn.commit()
+                    break
+                
+                cursor.execute("""
+                    INSERT INTO transactions_fts (rowid, description, user_id)
+                    SELECT id, description, user_id FROM transactions
+                    WHERE id > ? AND id <= ?
+                """, (upto, last_id))
+                cursor.execute("UPDATE search_index_state SET indexed_upto = ?", (last_id,))
+                conn.commit()
+            indexed += count
+        
+        return indexed
+    
+    @timed
+    def search_transactions(self, user_id: int, query: str, since: Optional[datetime] = None,
+                            until: Optional[datetime] = None, after: Optional[int] = None,
+                            before: Optional[int] = None, limit: int = SEARCH_PAGE_SIZE) -> dict:
+        """Поиск транзакций пользователя по словам описания (новые первыми).
+        
+        Строки находит индекс FTS5: все слова запроса должны встретиться
+        в описании, последнее слово и остальные - по префиксу («такс» найдет
+        «такси»). since/until - границы периода (naive UTC, until не включая).
+        Keyset-пагинация по ID: after - ID последней строки текущей страницы,
+        before - первой. Итоги (count, income, expense) - по всем найденным
+        за период. Архивные годы в поиск не входят.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return {'transactions': [], 'count': 0, 'income': 0.0, 'expense': 0.0,
+                    'has_prev': False, 'has_next': False}
+        
+        period = "AND t.created_ts >= ?"
+        period_params = (_to_epoch(since) if since else 0,)
+        if until:
+            period += " AND t.created_ts < ?"
+            period_params += (_to_epoch(until),)
+        if before is not None:
+            condition, order, params = "AND transactions_fts.rowid > ?", "ASC", (before,)
+        elif after is not None:
+            condition, order, params = "AND transactions_fts.rowid < ?", "DESC", (after,)
+        else:
+            condition, order, params = "", "DESC", ()
+        match = _search_match(user_id, terms)
+        
+        with self._snapshot() as conn:
+            cursor = conn.cursor()
+            
+            # CROSS JOIN фиксирует порядок: строки находит индекс FTS5, а не обход
+            # всех транзакций пользователя за период
+            cursor.execute(f"""
+                SELECT t.* FROM transactions_fts
+                CROSS JOIN transactions AS t ON t.id = transactions_fts.rowid
+                WHERE transactions_fts MATCH ? AND t.user_id = ? {period} {condition}
+                ORDER BY transactions_fts.rowid {order}
+                LIMIT ?
+            """, (match, user_id, *period_params, *params, limit + 1))
+            rows = cursor.fetchall()
+            
+            cursor.execute(f"""
+                SELECT 
+                    COUNT(*),
+                    COALESCE(SUM(CASE WHEN t.transaction_type = 'income' THEN t.amount ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN t.transaction_type = 'expense' THEN t.amount ELSE 0 END), 0)
+                FROM transactions_fts
+                CROSS JOIN transactions AS t ON t.id = transactions_fts.rowid
+                WHERE transactions_fts MATCH ? AND t.user_id = ? {period}
+            """, (match, user_id, *period_params))
+            count, income, expense = cursor.fetchone()
+        
+        # Лишняя строка - признак, что в этом направлении есть еще страница
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        
+        return {
+            'transactions': [self._row_to_transaction(row) for row in rows],
+            'count': count,
+            'income': income,
+            'expense': expense,
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
     
     def init_database(self):
-        """Инициализация базы данных"""
+        """Инициализация базы данных: применение недостающих миграций схемы"""
         # Создаем директорию если не существует
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            apply_migrations(self, conn)
+    
+    @staticmethod
+    def _row_to_transaction(row) -> Transaction:
+        """Строка таблицы transactions -> Transaction"""
+        return Transaction(
+            id=row['id'],
+            user_id=row['user_id'],
+            amount=row['amount'],
+            description=row['description'],
+            category=row['category'],
+            transaction_type=row['transaction_type'],
+            created_at=datetime.fromisoformat(row['created_at'])
+        )
+    
+    def _apply_deltas(self, cursor, rows: List[tuple], sign: int):
+        """Обновление производных таблиц в текущей транзакции.
+        
+        rows - кортежи (user_id, amount, category, transaction_type, created_at),
+        sign = 1 для добавленных строк и -1 для удаленных.
+        """
+        balances = {}
+        daily = {}
+        monthly = {}
+        categories = {}
+        days = {}
+        for user_id, amount, category, transaction_type, created_at in rows:
+            income, expense, count, last_at = balances.get(user_id, (0.0, 0.0, 0, ''))
+            if transaction_type == 'income':
+                income += amount
+            elif transaction_type == 'expense':
+                expense += amount
+            balances[user_id] = (income, expense, count + 1, max(last_at, created_at))
+            
+            for buckets, key in ((daily, created_at[:10]), (monthly, created_at[:7])):
+                bucket_key = (user_id, key, category, transaction_type)
+                total, count = buckets.get(bucket_key, (0.0, 0))
+                buckets[bucket_key] = (total + amount, count + 1)
+            
+            categories[(category, transaction_type)] = categories.get((category, transaction_type), 0) + 1
+            total, count = days.get((created_at[:10], transaction_type), (0.0, 0))
+            days[(created_at[:10], transaction_type)] = (total + amount, count + 1)
+        
+        for (table, bucket), buckets in zip(ROLLUP_TABLES, (daily, monthly)):
+            if sign > 0:
+                cursor.executemany(f"""
+                    INSERT INTO {table} (user_id, {bucket}, category, transaction_type, total, count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, {bucket}, category, transaction_type) DO UPDATE SET
+                        total = total + excluded.total,
+                        count = count + excluded.count
+                """, [(*key, total, count) for key, (total, count) in buckets.items()])
+            else:
+                cursor.executemany(f"""
+                    UPDATE {table} SET total = total - ?, count = count - ?
+                    WHERE user_id = ? AND {bucket} = ? AND category = ? AND transaction_type = ?
+                """, [(total, count, *key) for key, (total, count) in buckets.items()])
+                # Опустевшие периоды удаляем, чтобы сводки не разрастались
+                cursor.executemany(f"""
+                    DELETE FROM {table}
+                    WHERE user_id = ? AND {bucket} = ? AND category = ? AND transaction_type = ?
+                      AND count <= 0
+                """, list(buckets))
+        
+        self._apply_counter_deltas(cursor, balances, categories, days, len(rows), sign)
+        
+        if sign > 0:
+            cursor.executemany("""
+                INSERT INTO user_balances (user_id, income_total, expense_total, txn_count, last_txn_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    income_total = income_total + excluded.income_total,
+                    expense_total = expense_total + excluded.expense_total,
+                    txn_count = txn_count + excluded.txn_count,
+                    last_txn_at = MAX(COALESCE(last_txn_at, ''), excluded.last_txn_at)
+            """, [(user_id, *totals) for user_id, totals in balances.items()])
+        else:
+            # После удаления дата последней транзакции берется по индексу
+            cursor.executemany("""
+                UPDATE user_balances SET
+                    income_total = income_total - ?,
+                    expense_total = expense_total - ?,
+                    txn_count = txn_count - ?,
+                    last_txn_at = COALESCE(
+                        (SELECT datetime(MAX(created_ts), 'unixepoch') FROM transactions
+                         WHERE transactions.user_id = user_balances.user_id),
+                        (SELECT last_txn_at FROM archived_users
+                         WHERE archived_users.user_id = user_balances.user_id)
+                    )
+                WHERE user_id = ?
+            """, [(income, expense, count, user_id)
+                  for user_id, (income, expense, count, _) in balances.items()])
+    
+    def _apply_counter_deltas(self, cursor, balances: dict, categories: dict, days: dict,
+                              rows_count: int, sign: int):
+        """Счетчики админской аналитики; вызывается до обновления user_balances"""
+        # Переходы пользователей между сегментами - по числу операций до изменения
+        user_ids = list(balances)
+        placeholders = ", ".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT user_id, txn_count FROM user_balances
+            WHERE user_id IN ({placeholders})
+        """, user_ids)
+        old_counts = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        stats = {'transactions': sign * rows_count}
+        for user_id, (_, _, count, _) in balances.items():
+            old = old_counts.get(user_id, 0)
+            before, after = _activity_segment(old), _activity_segment(old + sign * count)
+            if before != after:
+                if before:
+                    stats[f"segment_{before}"] = stats.get(f"segment_{before}", 0) - 1
+                if after:
+                    stats[f"segment_{after}"] = stats.get(f"segment_{after}", 0) + 1
+        
+        cursor.executemany("""
+            INSERT INTO global_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, [(name, delta) for name, delta in stats.items() if delta])
+        cursor.executemany("""
+            INSERT INTO category_counters (category, transaction_type, count) VALUES (?, ?, ?)
+            ON CONFLICT(category, transaction_type) DO UPDATE SET count = count + excluded.count
+        """, [(*key, sign * count) for key, count in categories.items()])
+        cursor.executemany("""
+            INSERT INTO daily_counters (day, transaction_type, count, total) VALUES (?, ?, ?, ?)
+            ON CONFLICT(day, transaction_type) DO UPDATE SET
+                count = count + excluded.count,
+                total = total + excluded.total
+        """, [(*key, sign * count, sign * total) for key, (total, count) in days.items()])
+        if sign < 0:
+            cursor.executemany("""
+                DELETE FROM category_counters
+                WHERE category = ? AND transaction_type = ? AND count <= 0
+            """, list(categories))
+            cursor.executemany("""
+                DELETE FROM daily_counters
+                WHERE day = ? AND transaction_type = ? AND count <= 0
+            """, list(days))
+    
+    def _rebuild_user_balances(self, cursor, source: str = "transactions"):
+        """Полный пересчет таблицы балансов из транзакций (source - с архивами)"""
+        cursor.execute("DELETE FROM user_balances")
+        cursor.execute(f"""
+            INSERT INTO user_balances (user_id, income_total, expense_total, txn_count, last_txn_at)
+            SELECT 
+                user_id,
+                COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0),
+                COUNT(*),
+                MAX(created_at)
+            FROM {source}
+            GROUP BY user_id
+        """)
+    
+    def _rebuild_category_rollups(self, cursor, source: str = "transactions"):
+        """Полный пересчет сводок по категориям из транзакций (source - с архивами)"""
+        for (table, bucket), length in zip(ROLLUP_TABLES, (10, 7)):
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(f"""
+                INSERT INTO {table} (user_id, {bucket}, category, transaction_type, total, count)
+                SELECT user_id, substr(created_at, 1, {length}), category, transaction_type,
+                       SUM(amount), COUNT(*)
+                FROM {source}
+                GROUP BY 1, 2, 3, 4
+            """)
+    
+    def _rebuild_global_counters(self, cursor, source: str = "transactions"):
+        """Полный пересчет счетчиков аналитики (после пересчета user_balances)"""
+        cursor.execute("DELETE FROM category_counters")
+        cursor.execute(f"""
+            INSERT INTO category_counters (category, transaction_type, count)
+            SELECT category, transaction_type, COUNT(*)
+            FROM {source}
+            GROUP BY 1, 2
+        """)
+        
+        cursor.execute("DELETE FROM daily_counters")
+        cursor.execute(f"""
+            INSERT INTO daily_counters (day, transaction_type, count, total)
+            SELECT substr(created_at, 1, 10), transaction_type, COUNT(*), SUM(amount)
+            FROM {source}
+            GROUP BY 1, 2
+        """)
+        
+        cursor.execute("DELETE FROM global_stats")
+        cursor.execute(f"INSERT INTO global_stats (name, value) SELECT 'transactions', COUNT(*) FROM {source}")
+        cursor.execute("SELECT txn_count FROM user_balances WHERE txn_count > 0")
+        segments = {}
+        for (txn_count,) in cursor.fetchall():
+            name = f"segment_{_activity_segment(txn_count)}"
+            segments[name] = segments.get(name, 0) + 1
+        cursor.executemany("INSERT INTO global_stats (name, value) VALUES (?, ?)", list(segments.items()))
+    
+    @timed
+    def check_user_balances(self, fix: bool = False) -> List[dict]:
+        """Сверка таблицы балансов с транзакциями (и исправление при fix=True)"""
+        # Только проверка - на снимке; с исправлением - в пишущем соединении
+        with (self._connection() if fix else self._snapshot(archives_since=0)) as conn:
+            # Балансы учитывают и архивные строки
+            source = self._period_source(conn, 0)
             cursor = conn.cursor()
             
-            # Таблица транзакций
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    amount REAL NOT NULL,
-                    description TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    transaction_type TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+            cursor.execute(f"""
+                SELECT 
+                    user_id,
+                    COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0),
+                    COUNT(*),
+                    MAX(created_at)
+                FROM {source}
+                GROUP BY user_id
             """)
+            expected = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
             
-            # Таблица пользователей (обновленная)
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
+                SELECT user_id, income_total, expense_total, txn_count, last_txn_at
+                FROM user_balances
             """)
+            actual = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
             
-            # Проверяем и добавляем недостающие колонки в существующую таблицу
-            cursor.execute("PRAGMA table_info(users)")
-            columns = [col[1] for col in cursor.fetchall()]
+            empty = (0, 0, 0, None)
+            mismatches = []
+            for user_id in sorted(set(expected) | set(actual)):
+                exp = expected.get(user_id, empty)
+                act = actual.get(user_id, empty)
+                if (abs(exp[0] - act[0]) > BALANCE_TOLERANCE
+                        or abs(exp[1] - act[1]) > BALANCE_TOLERANCE
+                        or exp[2] != act[2] or exp[3] != act[3]):
+                    mismatches.append({
+                        'user_id': user_id,
+                        'expected': dict(zip(('income', 'expense', 'transactions', 'last_transaction'), exp)),
+                        'actual': dict(zip(('income', 'expense', 'transactions', 'last_transaction'), act))
+                    })
             
-            if 'is_active' not in columns:
-                cursor.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 1")
-                
-            if 'registration_date' not in columns:
-                # Добавляем колонку без DEFAULT, потом заполняем
-                cursor.execute("ALTER TABLE users ADD COLUMN registration_date TIMESTAMP")
-                # Заполняем существующие записи
-                cursor.execute("""
-                    UPDATE users SET registration_date = COALESCE(created_at, CURRENT_TIMESTAMP)
-                    WHERE registration_date IS NULL
-                """)
+            if fix and mismatches:
+                self._rebuild_user_balances(cursor, source)
+                self._rebuild_global_counters(cursor, source)
             
-            # Обновляем is_active для всех записей где NULL
-            cursor.execute("UPDATE users SET is_active = 1 WHERE is_active IS NULL")
-            
-            conn.commit()
+            return mismatches
     
+    @timed
     def register_user(self, user_id: int, username: str = None, first_name: str = None) -> bool:
         """Регистрация нового пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT OR IGNORE INTO users (user_id, username, first_name, is_active, registration_date, last_activity)
                     VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                 """, (user_id, username, first_name))
                 conn.commit()
-                return cursor.rowcount > 0
+                registered = cursor.rowcount > 0
+            if registered:
+                self.user_cache.add(user_id)
+            return registered
         except Exception as e:
             print(f"Ошибка регистрации пользователя: {e}")
             return False
     
+    def _warm_user_cache(self):
+        """Загрузка ID активных пользователей в кэш при старте"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id FROM users WHERE is_active = 1
+                LIMIT ?
+            """, (self.user_cache.capacity + 1,))
+            user_ids = [row[0] for row in cursor.fetchall()]
+        self.user_cache.warm(user_ids, complete=len(user_ids) <= self.user_cache.capacity)
+    
     def is_user_registered(self, user_id: int) -> bool:
-        """Проверка регистрации пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Проверка регистрации пользователя (сначала по кэшу в памяти)"""
+        cached = self.user_cache.lookup(user_id)
+        if cached is not None:
+            return cached
+        return self.fetch_user_registered(user_id)
+    
+    @timed
+    def fetch_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации по базе с пополнением кэша"""
+        with self._connection() as conn:
             cursor = conn.cursor()
-            try:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM users WHERE user_id = ? AND (is_active = 1 OR is_active IS NULL)
-                """, (user_id,))
-            except sqlite3.OperationalError:
-                # Fallback для старой структуры
-                cursor.execute("SELECT COUNT(*) FROM users WHERE user_id = ?", (user_id,))
-            return cursor.fetchone()[0] > 0
+            cursor.execute("""
+                SELECT COUNT(*) FROM users WHERE user_id = ? AND is_active = 1
+            """, (user_id,))
+            registered = cursor.fetchone()[0] > 0
+        if registered:
+            self.user_cache.add(user_id)
+        return registered
     
+    @timed
     def get_user_stats(self) -> dict:
         """Статистика пользователей (для админов)"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._snapshot() as conn:
             cursor = conn.cursor()
             
-            try:
-                # Пробуем новую структуру
-                cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-                total_users = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE is_active = 1 AND last_activity >= datetime('now', '-7 days')
-                """)
-                active_users = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE is_active = 1 AND registration_date >= datetime('now', '-30 days')
-                """)
-                new_users = cursor.fetchone()[0]
-                
-            except sqlite3.OperationalError:
-                # Fallback для старой структуры
-                cursor.execute("SELECT COUNT(*) FROM users")
-                total_users = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE last_activity >= datetime('now', '-7 days')
-                """)
-                active_users = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    SELECT COUNT(*) FROM users 
-                    WHERE created_at >= datetime('now', '-30 days')
-                """)
-                new_users = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
+            total_users = cursor.fetchone()[0]
+            
+            cursor.execute("""
+                SELECT COUNT(*) FROM users 
+                WHERE is_active = 1 AND last_activity >= datetime('now', '-7 days')
+            """)
+            active_users = cursor.fetchone()[0]
+            
+            cursor.execute("""
+                SELECT COUNT(*) FROM users 
+                WHERE is_active = 1 AND registration_date >= datetime('now', '-30 days')
+            """)
+            new_users = cursor.fetchone()[0]
             
             return {
                 "total": total_users,
@@ -150,40 +932,24 @@ class DatabaseManager:
                 "new_30d": new_users
             }
     
+    @timed
     def get_detailed_users_list(self) -> list:
         """Подробный список пользователей (для админов)"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._snapshot() as conn:
             cursor = conn.cursor()
             
-            try:
-                # Пробуем новую структуру
-                cursor.execute("""
-                    SELECT 
-                        user_id,
-                        username,
-                        first_name,
-                        registration_date,
-                        last_activity,
-                        is_active
-                    FROM users 
-                    WHERE is_active = 1 OR is_active IS NULL
-                    ORDER BY last_activity DESC
-                """)
-                
-            except sqlite3.OperationalError:
-                # Fallback для старой структуры
-                cursor.execute("""
-                    SELECT 
-                        user_id,
-                        username,
-                        first_name,
-                        created_at as registration_date,
-                        last_activity,
-                        1 as is_active
-                    FROM users 
-                    ORDER BY last_activity DESC
-                """)
+            cursor.execute("""
+                SELECT 
+                    user_id,
+                    username,
+                    first_name,
+                    registration_date,
+                    last_activity,
+                    is_active
+                FROM users 
+                WHERE is_active = 1
+                ORDER BY last_activity DESC
+            """)
             
             users = []
             for row in cursor.fetchall():
@@ -198,138 +964,417 @@ class DatabaseManager:
             
             return users
     
+    @timed
+    def get_users_page(self, after: Optional[Tuple[str, int]] = None,
+                       before: Optional[Tuple[str, int]] = None,
+                       limit: int = USERS_PAGE_SIZE) -> dict:
+        """Страница активных пользователей со статистикой транзакций (для админов).
+        
+        Порядок - по последней активности, новые первыми. Keyset-пагинация по
+        ключу (last_activity, user_id): after - ключ последней строки текущей
+        страницы (следующая страница), before - первой (предыдущая). Итоги
+        берутся из user_balances одним запросом с LEFT JOIN.
+        """
+        if before is not None:
+            condition, order, params = "AND (u.last_activity, u.user_id) > (?, ?)", "ASC", tuple(before)
+        elif after is not None:
+            condition, order, params = "AND (u.last_activity, u.user_id) < (?, ?)", "DESC", tuple(after)
+        else:
+            condition, order, params = "", "DESC", ()
+        
+        with self._snapshot() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f"""
+                SELECT 
+                    u.user_id,
+                    u.username,
+                    u.first_name,
+                    u.registration_date,
+                    u.last_activity,
+                    COALESCE(b.txn_count, 0) AS transactions,
+                    COALESCE(b.income_total, 0) AS income,
+                    COALESCE(b.expense_total, 0) AS expense,
+                    b.last_txn_at
+                FROM users AS u
+                LEFT JOIN user_balances AS b ON b.user_id = u.user_id
+                WHERE u.is_active = 1 {condition}
+                ORDER BY u.last_activity {order}, u.user_id {order}
+                LIMIT ?
+            """, (*params, limit + 1))
+            rows = cursor.fetchall()
+        
+        # Лишняя строка - признак, что в этом направлении есть еще страница
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        
+        users = []
+        for row in rows:
+            users.append({
+                'user_id': row['user_id'],
+                'username': row['username'],
+                'first_name': row['first_name'],
+                'registration_date': row['registration_date'],
+                'last_activity': row['last_activity'],
+                'transactions': row['transactions'],
+                'income': row['income'],
+                'expense': row['expense'],
+                'balance': row['income'] - row['expense'],
+                'last_transaction': row['last_txn_at']
+            })
+        
+        return {
+            'users': users,
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
+    
+    @timed
     def get_user_transaction_stats(self, user_id: int) -> dict:
         """Статистика транзакций конкретного пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            # Количество транзакций
-            cursor.execute("SELECT COUNT(*) FROM transactions WHERE user_id = ?", (user_id,))
-            total_transactions = cursor.fetchone()[0]
-            
-            # Баланс
             cursor.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0) as income,
-                    COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0) as expense
-                FROM transactions 
+                SELECT income_total, expense_total, txn_count, last_txn_at
+                FROM user_balances 
                 WHERE user_id = ?
             """, (user_id,))
             
-            result = cursor.fetchone()
-            income, expense = result[0], result[1]
-            balance = income - expense
-            
-            # Последняя транзакция
-            cursor.execute("""
-                SELECT created_at FROM transactions 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            """, (user_id,))
-            
-            last_transaction = cursor.fetchone()
-            last_transaction_date = last_transaction[0] if last_transaction else None
+            row = cursor.fetchone()
+            if not row:
+                return {
+                    'transactions': 0,
+                    'income': 0,
+                    'expense': 0,
+                    'balance': 0,
+                    'last_transaction': None
+                }
             
+            income, expense, total_transactions, last_transaction_date = row
             return {
                 'transactions': total_transactions,
                 'income': income,
                 'expense': expense,
-                'balance': balance,
+                'balance': income - expense,
                 'last_transaction': last_transaction_date
             }
     
+    @timed
     def add_transaction(self, user_id: int, amount: float, description: str, 
-                       category: str, transaction_type: str) -> bool:
-        """Добавление транзакции"""
+                       category: str, transaction_type: str) -> Optional[Tuple[Transaction, float]]:
+        """Добавление транзакции: (созданная транзакция, новый баланс) или None"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO transactions (user_id, amount, description, category, transaction_type)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (user_id, amount, description, category, transaction_type))
+                transactions = self._insert_transactions(
+                    cursor, [(user_id, amount, description, category, transaction_type)]
+                )
+                balances = self._read_balances(cursor, [user_id])
                 conn.commit()
-                return True
+                return transactions[0], balances[user_id]
         except Exception as e:
             print(f"Ошибка добавления транзакции: {e}")
-            return False
+            return None
+    
+    @timed
+    def add_transactions_batch(self, rows: List[tuple]) -> Optional[List[Tuple[Transaction, float]]]:
+        """Добавление пачки транзакций одним коммитом (group commit).
+        
+        rows - кортежи (user_id, amount, description, category, transaction_type).
+        Возвращает пары (транзакция, баланс после пачки) в том же порядке
+        или None при ошибке.
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                # Блокировку записи берем сразу: ID выдаются подряд
+                cursor.execute("BEGIN IMMEDIATE")
+                transactions = self._insert_transactions(cursor, rows)
+                balances = self._read_balances(cursor, {t.user_id for t in transactions})
+                conn.commit()
+                return [(t, balances[t.user_id]) for t in transactions]
+        except Exception as e:
+            print(f"Ошибка пакетного добавления транзакций: {e}")
+            return None
+    
+    @timed
+    def add_transactions_bulk(self, rows: Iterable[tuple], batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Массовый импорт транзакций: пачки executemany в одной транзакции записи.
+        
+        rows - кортежи (user_id, amount, description, category, transaction_type)
+        и необязательный шестой элемент created_at (datetime или
+        'YYYY-MM-DD HH:MM:SS', UTC) для импорта истории. Читаются лениво,
+        по batch_size строк. Балансы, сводки и счетчики обновляются один раз
+        на пачку. Ошибочная строка пропускается и не прерывает импорт.
+        Возвращает {'inserted': число строк, 'failures': [(номер строки, причина)]}.
+        """
+        now_ts = int(time.time())
+        numbered = enumerate(rows)
+        inserted = 0
+        failures = []
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            while True:
+                chunk = list(itertools.islice(numbered, batch_size))
+                if not chunk:
+                    break
+                
+                prepared = []
+                for index, row in chunk:
+                    try:
+                        *fields, created_ts = prepare_bulk_row(row, now_ts)
+                        prepared.append((index, (*fields, _format_epoch(created_ts), created_ts)))
+                    except (TypeError, ValueError) as e:
+                        failures.append((index, str(e)))
+                
+                values = self._insert_bulk_chunk(cursor, prepared, failures)
+                if values:
+                    self._apply_deltas(cursor, [
+                        (user_id, amount, category, transaction_type, created_at)
+                        for user_id, amount, _, category, transaction_type, created_at, _ in values
+                    ], 1)
+                inserted += len(values)
+            conn.commit()
+        
+        return {'inserted': inserted, 'failures': failures}
+    
+    @staticmethod
+    def _insert_bulk_chunk(cursor, prepared: List[Tuple[int, tuple]], failures: list) -> List[tuple]:
+        """Вставка пачки одним executemany; если пачка не прошла - по строкам.
+        
+        Каждая попытка под своим SAVEPOINT: ошибка откатывает только ее,
+        а не всю транзакцию импорта. Возвращает значения вставленных строк.
+        """
+        sql = """
+            INSERT INTO transactions (user_id, amount, description, category, transaction_type,
+                                      created_at, created_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        cursor.execute("SAVEPOINT bulk_batch")
+        try:
+            cursor.executemany(sql, [values for _, values in prepared])
+            cursor.execute("RELEASE bulk_batch")
+            return [values for _, values in prepared]
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK TO bulk_batch")
+            cursor.execute("RELEASE bulk_batch")
+        
+        inserted = []
+        for index, values in prepared:
+            cursor.execute("SAVEPOINT bulk_row")
+            try:
+                cursor.execute(sql, values)
+                cursor.execute("RELEASE bulk_row")
+                inserted.append(values)
+            except sqlite3.Error as e:
+                cursor.execute("ROLLBACK TO bulk_row")
+                cursor.execute("RELEASE bulk_row")
+                failures.append((index, str(e)))
+        return inserted
+    
+    def _insert_transactions(self, cursor, rows: List[tuple]) -> List[Transaction]:
+        """Вставка внутри транзакции записи; ID и created_at известны без перечитывания"""
+        created_ts = int(time.time())
+        created_at = _format_epoch(created_ts)
+        
+        if len(rows) == 1:
+            cursor.execute("""
+                INSERT INTO transactions (user_id, amount, description, category, transaction_type,
+                                          created_at, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (*rows[0], created_at, created_ts))
+            ids = [cursor.lastrowid]
+        else:
+            # AUTOINCREMENT выдает ID по порядку от sqlite_sequence
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'")
+            row = cursor.fetchone()
+            first_id = (row[0] if row else 0) + 1
+            
+            cursor.executemany("""
+                INSERT INTO transactions (user_id, amount, description, category, transaction_type,
+                                          created_at, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(*r, created_at, created_ts) for r in rows])
+            ids = list(range(first_id, first_id + len(rows)))
+        
+        self._apply_deltas(cursor, [
+            (user_id, amount, category, transaction_type, created_at)
+            for user_id, amount, _, category, transaction_type in rows
+        ], 1)
+        
+        created = datetime.fromisoformat(created_at)
+        return [
+            Transaction(
+                id=transaction_id,
+                user_id=user_id,
+                amount=amount,
+                description=description,
+                category=category,
+                transaction_type=transaction_type,
+                created_at=created
+            )
+            for transaction_id, (user_id, amount, description, category, transaction_type) in zip(ids, rows)
+        ]
+    
+    def _read_balances(self, cursor, user_ids) -> Dict[int, float]:
+        """Балансы пользователей внутри текущей транзакции"""
+        user_ids = list(user_ids)
+        placeholders = ", ".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT user_id, income_total - expense_total FROM user_balances 
+            WHERE user_id IN ({placeholders})
+        """, user_ids)
+        balances = {user_id: 0 for user_id in user_ids}
+        balances.update({row[0]: row[1] for row in cursor.fetchall()})
+        return balances
     
+    @timed
     def get_user_balance(self, user_id: int) -> float:
         """Получение баланса пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            # Сумма доходов
             cursor.execute("""
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND transaction_type = 'income'
-            """, (user_id,))
-            income = cursor.fetchone()[0]
-            
-            # Сумма расходов
-            cursor.execute("""
-                SELECT COALESCE(SUM(amount), 0) FROM transactions 
-                WHERE user_id = ? AND transaction_type = 'expense'
+                SELECT income_total - expense_total FROM user_balances 
+                WHERE user_id = ?
             """, (user_id,))
-            expenses = cursor.fetchone()[0]
             
-            return income - expenses
+            row = cursor.fetchone()
+            return row[0] if row else 0
     
-    def get_transactions(self, user_id: int, days: int = 30) -> List[Transaction]:
-        """Получение транзакций за период"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    @timed
+    def get_transactions(self, user_id: int, days: int = 30,
+                         limit: Optional[int] = None) -> List[Transaction]:
+        """Получение транзакций за период (новые первыми)"""
+        since = _since_epoch(days)
+        with self._connection() as conn:
+            source = self._period_source(conn, since)
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT * FROM transactions 
-                WHERE user_id = ? AND created_at >= datetime('now', '-{} days')
-                ORDER BY created_at DESC
-            """.format(days), (user_id,))
+            cursor.execute(f"""
+                SELECT * FROM {source} 
+                WHERE user_id = ? AND created_ts >= ?
+                ORDER BY created_ts DESC
+                LIMIT ?
+            """, (user_id, since, limit if limit is not None else -1))
             
             rows = cursor.fetchall()
             transactions = []
             
             for row in rows:
-                transactions.append(Transaction(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    amount=row['amount'],
-                    description=row['description'],
-                    category=row['category'],
-                    transaction_type=row['transaction_type'],
-                    created_at=datetime.fromisoformat(row['created_at'])
-                ))
+                transactions.append(self._row_to_transaction(row))
             
             return transactions
     
+    @timed
+    def iter_transactions(self, user_id: int, days: int = 30,
+                          chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Transaction]:
+        """Потоковое чтение транзакций за период (новые первыми).
+
+        Курсор читается порциями по chunk_size строк через fetchmany, поэтому
+        в памяти одновременно не больше одной порции. Чтение идет на read-only
+        снимке; соединение занято, пока итератор не исчерпан или не закрыт.
+        """
+        since = _since_epoch(days)
+        with self._snapshot(archives_since=since) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f"""
+                SELECT * FROM {self._transactions_source(self._archive_years(conn, since))} 
+                WHERE user_id = ? AND created_ts >= ?
+                ORDER BY created_ts DESC
+            """, (user_id, since))
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_transaction(row)
+    
+    @timed
+    def get_transaction_batch(self, user_id: int, days: int = 30,
+                              limit: Optional[int] = None) -> TransactionBatch:
+        """Транзакции за период в колоночном виде (новые первыми)"""
+        since = _since_epoch(days)
+        with self._connection() as conn:
+            source = self._period_source(conn, since)
+            cursor = conn.cursor()
+            # Простые кортежи вместо sqlite3.Row, время сразу в epoch-секундах
+            cursor.row_factory = None
+            
+            cursor.execute(f"""
+                SELECT id, amount, description, category, transaction_type, created_ts
+                FROM {source} 
+                WHERE user_id = ? AND created_ts >= ?
+                ORDER BY created_ts DESC
+                LIMIT ?
+            """, (user_id, since, limit if limit is not None else -1))
+            
+            batch = TransactionBatch(user_id)
+            for row in cursor:
+                batch.append(*row)
+            return batch
+    
+    @timed
     def update_user_activity(self, user_id: int, username: str = None, first_name: str = None):
         """Обновление активности пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
+            # UPSERT не трогает registration_date и is_active
             cursor.execute("""
-                INSERT OR REPLACE INTO users (user_id, username, first_name, last_activity)
+                INSERT INTO users (user_id, username, first_name, last_activity)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_activity = excluded.last_activity
             """, (user_id, username, first_name))
             conn.commit()
     
+    @timed
+    def touch_users_activity(self, entries: List[Tuple[int, str]]):
+        """Пакетное обновление last_activity: entries - пары (user_id, время UTC)"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO users (user_id, last_activity)
+                VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    last_activity = MAX(COALESCE(last_activity, ''), excluded.last_activity)
+            """, entries)
+            conn.commit()
+    
+    @timed
     def get_category_stats(self, user_id: int, days: int = 30) -> Dict[str, Dict]:
         """Статистика по категориям"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
+            # Короткие периоды считаем по дням, длинные - по месяцам
+            # Граница периода - префикс created_at нужной длины, параметром
+            since = _format_epoch(_since_epoch(days))
+            if days <= DAILY_ROLLUP_MAX_DAYS:
+                table, bucket, since = "category_rollups_daily", "day", since[:10]
+            else:
+                table, bucket, since = "category_rollups_monthly", "month", since[:7]
+            
+            cursor.execute(f"""
                 SELECT 
                     category,
                     transaction_type,
-                    SUM(amount) as total,
-                    COUNT(*) as count
-                FROM transactions 
-                WHERE user_id = ? AND created_at >= datetime('now', '-{} days')
+                    SUM(total) as total,
+                    SUM(count) as count
+                FROM {table} 
+                WHERE user_id = ? AND {bucket} >= ?
                 GROUP BY category, transaction_type
                 ORDER BY total DESC
-            """.format(days), (user_id,))
+            """, (user_id, since))
             
             stats = {}
             for row in cursor.fetchall():
@@ -344,58 +1389,145 @@ class DatabaseManager:
     
     def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
         """Удаление транзакции по ID"""
+        return self.delete_transaction_returning(transaction_id, user_id) is not None
+    
+    @timed
+    def delete_transaction_returning(self, transaction_id: int,
+                                     user_id: int) -> Optional[Tuple[Transaction, float]]:
+        """Удаление транзакции одним запросом: (удаленная транзакция, новый баланс)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 # Проверяем, что транзакция принадлежит пользователю
                 cursor.execute("""
                     DELETE FROM transactions 
                     WHERE id = ? AND user_id = ?
+                    RETURNING *
                 """, (transaction_id, user_id))
                 
-                deleted_rows = cursor.rowcount
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                transaction = self._row_to_transaction(row)
+                self._apply_deltas(cursor, [(
+                    row['user_id'], row['amount'], row['category'],
+                    row['transaction_type'], row['created_at']
+                )], -1)
+                
+                balances = self._read_balances(cursor, [user_id])
                 conn.commit()
-                return deleted_rows > 0
+                return transaction, balances[user_id]
         except Exception as e:
             print(f"Ошибка удаления транзакции: {e}")
-            return False
+            return None
+    
+    @timed
+    def get_history_page(self, user_id: int, after: Optional[Tuple[datetime, int]] = None,
+                         before: Optional[Tuple[datetime, int]] = None,
+                         limit: int = HISTORY_PAGE_SIZE) -> dict:
+        """Страница истории транзакций пользователя (новые первыми).
+        
+        Keyset-пагинация по (created_at, id), без OFFSET: after - ключ последней
+        строки текущей страницы (более старые), before - первой (более новые).
+        Каждый источник - горячая таблица и архивы по годам - читается одним
+        диапазоном индекса (user_id, created_ts, id) не больше чем на limit + 1
+        строк; архивы, которые заведомо не попадут на страницу, не читаются.
+        """
+        if before is not None:
+            condition, order, key = "AND (created_ts, id) > (?, ?)", "ASC", (_to_epoch(before[0]), before[1])
+        elif after is not None:
+            condition, order, key = "AND (created_ts, id) < (?, ?)", "DESC", (_to_epoch(after[0]), after[1])
+        else:
+            condition, order, key = "", "DESC", ()
+        
+        # Архивы без строк новее ключа странице назад ничего не добавят
+        with self._snapshot(archives_since=key[0] if before is not None else 0) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT year, max_created_ts FROM transaction_archives ORDER BY year DESC")
+            archives = cursor.fetchall()
+            sources = [("main.transactions", "", None)] + [
+                # Строка, уже скопированная в архив, но еще не удаленная, берется из горячей
+                (f"archive_{year}.transactions",
+                 "AND NOT EXISTS (SELECT 1 FROM main.transactions AS m WHERE m.id = a.id)", max_ts)
+                for year, max_ts in archives
+            ]
+            
+            rows = []
+            for table, dedupe, max_ts in sources:
+                if max_ts is not None:
+                    # В архиве нет строк новее ключа - ему нечего добавить
+                    if before is not None and max_ts < key[0]:
+                        continue
+                    # Архивы идут от новых к старым: страница уже набрана строками новее
+                    if order == "DESC" and len(rows) > limit and rows[limit]['created_ts'] > max_ts:
+                        break
+                
+                cursor.execute(f"""
+                    SELECT {TRANSACTION_COLUMNS} FROM {table} AS a
+                    WHERE user_id = ? {condition} {dedupe}
+                    ORDER BY created_ts {order}, id {order}
+                    LIMIT ?
+                """, (user_id, *key, limit + 1))
+                rows.extend(cursor.fetchall())
+                rows.sort(key=lambda row: (row['created_ts'], row['id']), reverse=order == "DESC")
+                del rows[limit + 1:]
+        
+        # Лишняя строка - признак, что в этом направлении есть еще страница
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        
+        return {
+            'transactions': [self._row_to_transaction(row) for row in rows],
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
     
+    @timed
+    def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Transaction]:
+        """Получение транзакции пользователя по ID"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT * FROM transactions 
+                WHERE id = ? AND user_id = ?
+            """, (transaction_id, user_id))
+            
+            row = cursor.fetchone()
+            return self._row_to_transaction(row) if row else None
+    
+    @timed
     def get_last_transaction(self, user_id: int) -> Optional[Transaction]:
         """Получение последней транзакции пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
                 SELECT * FROM transactions 
                 WHERE user_id = ? 
-                ORDER BY created_at DESC 
+                ORDER BY created_ts DESC 
                 LIMIT 1
             """, (user_id,))
             
             row = cursor.fetchone()
             if row:
-                return Transaction(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    amount=row['amount'],
-                    description=row['description'],
-                    category=row['category'],
-                    transaction_type=row['transaction_type'],
-                    created_at=datetime.fromisoformat(row['created_at'])
-                )
+                return self._row_to_transaction(row)
             return None
     
+    @timed
     def get_recent_transactions_for_deletion(self, user_id: int, limit: int = 10) -> List[Transaction]:
         """Получение последних транзакций для удаления"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
                 SELECT * FROM transactions 
                 WHERE user_id = ? 
-                ORDER BY created_at DESC 
+                ORDER BY created_ts DESC 
                 LIMIT ?
             """, (user_id, limit))
 
@@ -403,14 +1535,113 @@ class DatabaseManager:
             transactions = []
 
             for row in rows:
-                transactions.append(Transaction(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    amount=row['amount'],
-                    description=row['description'],
-                    category=row['category'],
-                    transaction_type=row['transaction_type'],
-                    created_at=datetime.fromisoformat(row['created_at'])
-                ))
+                transactions.append(self._row_to_transaction(row))
 
             return transactions
+    
+    @timed
+    def get_admin_analytics(self) -> dict:
+        """Агрегированные данные для админской аналитики (один снимок на весь отчет).
+        
+        Итоги по транзакциям читаются из счетчиков (global_stats,
+        category_counters, daily_counters, user_balances), которые
+        обновляются вместе с транзакциями, - отчет не обходит таблицу
+        transactions и не зависит от ее размера.
+        """
+        with self._snapshot() as conn:
+            cursor = conn.cursor()
+            
+            # === ОБЩАЯ СТАТИСТИКА ===
+            cursor.execute("SELECT name, value FROM global_stats")
+            counters = {row[0]: row[1] for row in cursor.fetchall()}
+            total_transactions = counters.get('transactions', 0)
+            
+            # === СЕГМЕНТАЦИЯ ПОЛЬЗОВАТЕЛЕЙ ===
+            user_segments = {name: counters.get(f"segment_{name}", 0) for name, _ in ACTIVITY_SEGMENTS}
+            active_users_with_transactions = sum(user_segments.values())
+            
+            cursor.execute("SELECT COUNT(*) FROM users")
+            total_registered = cursor.fetchone()[0]
+            
+            # === АКТИВНОСТЬ ПОЛЬЗОВАТЕЛЕЙ ===
+            # Активные за последние 7 дней
+            cursor.execute("""
+                SELECT COUNT(*) FROM users 
+                WHERE last_activity >= datetime('now', '-7 days')
+            """)
+            active_7d = cursor.fetchone()[0]
+            
+            # Новые за последние 30 дней
+            cursor.execute("""
+                SELECT COUNT(*) FROM users 
+                WHERE registration_date >= datetime('now', '-30 days')
+            """)
+            new_30d = cursor.fetchone()[0]
+            
+            # === ПОПУЛЯРНЫЕ КАТЕГОРИИ ===
+            cursor.execute("""
+                SELECT category, count
+                FROM category_counters 
+                WHERE transaction_type = 'expense'
+                ORDER BY count DESC 
+                LIMIT 10
+            """)
+            popular_categories = [
+                (category, count, round(count * 100.0 / total_transactions, 1) if total_transactions else 0)
+                for category, count in cursor.fetchall()
+            ]
+            
+            # === ВРЕМЕННАЯ АКТИВНОСТЬ (последние 7 дней) ===
+            since_day = _format_epoch(_since_epoch(7))[:10]
+            cursor.execute("""
+                SELECT day, SUM(count) as operations
+                FROM daily_counters 
+                WHERE day >= ?
+                GROUP BY day
+                ORDER BY day DESC
+            """, (since_day,))
+            daily_activity = [tuple(row) for row in cursor.fetchall()]
+            
+            # === ДОХОДЫ И РАСХОДЫ ПО ДНЯМ ===
+            cursor.execute("""
+                SELECT 
+                    day,
+                    SUM(CASE WHEN transaction_type = 'income' THEN total ELSE 0 END) as income,
+                    SUM(CASE WHEN transaction_type = 'expense' THEN total ELSE 0 END) as expense
+                FROM daily_counters 
+                WHERE day >= ?
+                GROUP BY day
+                ORDER BY day DESC
+            """, (since_day,))
+            financial_activity = [tuple(row) for row in cursor.fetchall()]
+            
+            # === AI ЭФФЕКТИВНОСТЬ (примерная) ===
+            cursor.execute("SELECT COALESCE(SUM(count), 0) FROM category_counters WHERE category = 'другое'")
+            ai_uncategorized = cursor.fetchone()[0]
+            ai_categorized = total_transactions - ai_uncategorized
+            
+            # === ТОП ПОЛЬЗОВАТЕЛИ ===
+            # Первые строки индекса по txn_count, имена - тем же запросом
+            cursor.execute("""
+                SELECT u.first_name, u.username, b.txn_count
+                FROM user_balances AS b
+                JOIN users AS u ON u.user_id = b.user_id
+                ORDER BY b.txn_count DESC
+                LIMIT 10
+            """)
+            top_users = [tuple(row) for row in cursor.fetchall()]
+            
+            return {
+                'total_transactions': total_transactions,
+                'active_users_with_transactions': active_users_with_transactions,
+                'total_registered': total_registered,
+                'active_7d': active_7d,
+                'new_30d': new_30d,
+                'popular_categories': popular_categories,
+                'user_segments': user_segments,
+                'daily_activity': daily_activity,
+                'financial_activity': financial_activity,
+                'ai_categorized': ai_categorized,
+                'ai_uncategorized': ai_uncategorized,
+                'top_users': top_users
+            }
@@ -0,0 +1,82 @@
+# database/group_commit.py
+import asyncio
+from typing import List, Optional, Tuple
+
+from database.db_manager import DatabaseManager, Transaction
+
+
+class GroupCommitWriter:
+    """Group commit для add_transaction.
+
+    Вставки от параллельных обработчиков складываются в очередь, один
+    сборщик забирает их пачками (каждые max_delay секунд или по max_batch
+    строк) и записывает одним коммитом через executemany. Каждый вызывающий
+    получает свою транзакцию (с ID) и баланс, когда пачка уже записана в базу.
+    """
+
+    def __init__(self, db: DatabaseManager, lane, max_batch: int = 100,
+                 max_delay: float = 0.005, max_pending: int = 1000):
+        self.db = db
+        self._lane = lane
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._max_pending = max_pending
+        # Очередь и задача создаются лениво, внутри работающего цикла событий
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, row: tuple) -> Optional[Tuple[Transaction, float]]:
+        """Постановка строки в очередь; результат - после коммита пачки"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_pending)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._drain())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def close(self):
+        """Дописать все, что осталось в очереди, и остановить сборщик"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _collect(self) -> List[Tuple[tuple, asyncio.Future]]:
+        """Ожидание первой строки и добор пачки в пределах max_delay"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _drain(self):
+        """Цикл сборщика: пачка -> один коммит -> разбор результатов"""
+        while True:
+            batch = await self._collect()
+            results = None
+            try:
+                results = await self._lane.run(self.db.add_transactions_batch, [row for row, _ in batch])
+            except Exception as e:
+                # Сборщик продолжает работу: следующая пачка может пройти
+                print(f"Ошибка записи пачки транзакций: {e}")
+            finally:
+                # При ошибке пачки все ее вызывающие получают None
+                for i, (_, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(results[i] if results else None)
+                    self._queue.task_done()
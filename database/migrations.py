@@ -0,0 +1,360 @@
+# database/migrations.py
+"""
+Версионированные миграции схемы.
+
+Номер примененной версии хранится в таблице schema_version. При старте
+выполняются только миграции с номером больше текущего, каждая ровно один раз
+и по порядку. Новая миграция - новая функция и новая запись в MIGRATIONS;
+уже выпущенные миграции не меняются.
+"""
+import sqlite3
+from typing import List
+
+# Сколько строк обновлять за один коммит при заполнении created_ts
+MIGRATION_CHUNK_SIZE = 5000
+
+# Таблицы сводок: (имя, колонка периода); период = префикс created_at
+ROLLUP_TABLES = (
+    ("category_rollups_daily", "day"),        # 'YYYY-MM-DD'
+    ("category_rollups_monthly", "month"),    # 'YYYY-MM'
+)
+
+# indexed_upto полностью построенного поискового индекса: триггеры ведут все строки
+SEARCH_INDEX_COMPLETE = 2 ** 63 - 1
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _columns(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _initial_schema(db, conn: sqlite3.Connection):
+    """Таблицы transactions и users; приведение старых баз к текущим колонкам"""
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Базы первых версий: в users не было is_active и registration_date
+    columns = _columns(cursor, "users")
+
+    if 'is_active' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 1")
+
+    if 'registration_date' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN registration_date TIMESTAMP")
+        source = "created_at" if 'created_at' in columns else "NULL"
+        cursor.execute(f"""
+            UPDATE users SET registration_date = COALESCE({source}, CURRENT_TIMESTAMP)
+            WHERE registration_date IS NULL
+        """)
+
+    cursor.execute("UPDATE users SET is_active = 1 WHERE is_active IS NULL")
+
+
+def _transaction_indexes(db, conn: sqlite3.Connection):
+    """Покрывающий индекс для сумм по типу (баланс без чтения строк)"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_type_amount
+        ON transactions (user_id, transaction_type, amount)
+    """)
+
+
+def _user_balances(db, conn: sqlite3.Connection):
+    """Баланс пользователя, обновляется вместе с транзакциями"""
+    cursor = conn.cursor()
+    existed = _table_exists(cursor, "user_balances")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_balances (
+            user_id INTEGER PRIMARY KEY,
+            income_total REAL NOT NULL DEFAULT 0,
+            expense_total REAL NOT NULL DEFAULT 0,
+            txn_count INTEGER NOT NULL DEFAULT 0,
+            last_txn_at TIMESTAMP
+        )
+    """)
+    if not existed:
+        db._rebuild_user_balances(cursor)
+
+
+def _category_rollups(db, conn: sqlite3.Connection):
+    """Сводки по категориям за день и за месяц"""
+    cursor = conn.cursor()
+    existed = _table_exists(cursor, ROLLUP_TABLES[0][0])
+
+    for table, bucket in ROLLUP_TABLES:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                {bucket} TEXT NOT NULL,
+                category TEXT NOT NULL,
+                transaction_type TEXT NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, {bucket}, category, transaction_type)
+            ) WITHOUT ROWID
+        """)
+    if not existed:
+        db._rebuild_category_rollups(cursor)
+
+
+def _created_ts(db, conn: sqlite3.Connection, chunk_size: int = MIGRATION_CHUNK_SIZE):
+    """created_ts - время транзакции в epoch-секундах, с индексом по пользователю.
+
+    Заполняется из created_at порциями по диапазону ID, каждая порция -
+    отдельный коммит, чтобы на большой базе не держать блокировку записи.
+    Если миграцию прервать, повторный запуск продолжит с незаполненных строк.
+    """
+    cursor = conn.cursor()
+    if 'created_ts' not in _columns(cursor, "transactions"):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN created_ts INTEGER")
+    conn.commit()
+
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+    max_id = cursor.fetchone()[0]
+
+    for start in range(0, max_id, chunk_size):
+        cursor.execute("""
+            UPDATE transactions
+            SET created_ts = CAST(strftime('%s', created_at) AS INTEGER)
+            WHERE id > ? AND id <= ? AND created_ts IS NULL
+        """, (start, start + chunk_size))
+        conn.commit()
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_ts
+        ON transactions (user_id, created_ts)
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_transactions_user_created")
+
+
+def _transaction_archives(db, conn: sqlite3.Connection):
+    """Учет архивных баз по годам и дат последних архивных транзакций"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transaction_archives (
+            year INTEGER PRIMARY KEY,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            max_created_ts INTEGER NOT NULL
+        )
+    """)
+    # last_txn_at в user_balances после удаления горячих строк берется отсюда
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_users (
+            user_id INTEGER PRIMARY KEY,
+            last_txn_at TIMESTAMP NOT NULL
+        )
+    """)
+
+
+def _users_activity_index(db, conn: sqlite3.Connection):
+    """Индекс для постраничного списка пользователей по last_activity"""
+    cursor = conn.cursor()
+    # Keyset-пагинация не работает с NULL в ключе сортировки
+    cursor.execute("""
+        UPDATE users SET last_activity = COALESCE(registration_date, CURRENT_TIMESTAMP)
+        WHERE last_activity IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_active_activity
+        ON users (is_active, last_activity, user_id)
+    """)
+
+
+def _global_counters(db, conn: sqlite3.Connection):
+    """Счетчики для админской аналитики: общие, по категориям, по дням"""
+    cursor = conn.cursor()
+    # Итоги считаются и по архивам - подключаем их до начала транзакции записи
+    source = db._period_source(conn, 0)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS global_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS category_counters (
+            category TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, transaction_type)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_counters (
+            day TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, transaction_type)
+        ) WITHOUT ROWID
+    """)
+    # Топ пользователей по числу операций - первые строки индекса
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_balances_txn_count
+        ON user_balances (txn_count)
+    """)
+    db._rebuild_global_counters(cursor, source)
+
+
+def _transaction_search(db, conn: sqlite3.Connection):
+    """Полнотекстовый индекс FTS5 по описаниям транзакций.
+
+    Внешний контент: текст хранится только в transactions, индекс ведут
+    триггеры. user_id тоже индексируется - поиск сразу сужается до строк
+    пользователя. Триггеры трогают только строки с id <= indexed_upto:
+    индекс существующей базы строится порциями в фоне
+    (DatabaseManager.build_search_index), не блокируя запись.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            description, user_id,
+            content = 'transactions', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            indexed_upto INTEGER NOT NULL
+        )
+    """)
+    # Пустой базе строить нечего - индекс сразу полный
+    cursor.execute("""
+        INSERT OR IGNORE INTO search_index_state (id, indexed_upto)
+        SELECT 1, CASE WHEN EXISTS (SELECT 1 FROM transactions) THEN 0 ELSE ? END
+    """, (SEARCH_INDEX_COMPLETE,))
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions
+        WHEN new.id <= (SELECT indexed_upto FROM search_index_state)
+        BEGIN
+            INSERT INTO transactions_fts (rowid, description, user_id)
+            VALUES (new.id, new.description, new.user_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions
+        WHEN old.id <= (SELECT indexed_upto FROM search_index_state)
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+        AFTER UPDATE OF description, user_id ON transactions
+        WHEN old.id <= (SELECT indexed_upto FROM search_index_state)
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+            INSERT INTO transactions_fts (rowid, description, user_id)
+            VALUES (new.id, new.description, new.user_id);
+        END
+    """)
+
+
+def _drop_balance_index(db, conn: sqlite3.Connection):
+    """Удаление индекса сумм по типу из миграции 2"""
+    # Балансы читаются из user_balances: индекс не нужен ни одному запросу,
+    # а каждая вставка транзакции его обновляет
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_user_type_amount")
+
+
+def init_archive(conn: sqlite3.Connection):
+    """Схема архивной базы за год: транзакции, сгруппированные по пользователю.
+
+    WITHOUT ROWID с ключом (user_id, created_ts, id): строки пользователя
+    лежат рядом, чтение истории за весь период идет по соседним страницам.
+    WAL - чтобы перенос новой порции не ждал читателей отчетов.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            created_ts INTEGER NOT NULL,
+            PRIMARY KEY (user_id, created_ts, id)
+        ) WITHOUT ROWID
+    """)
+
+
+# (версия, описание, функция); порядок и номера не меняются
+MIGRATIONS = (
+    (1, "initial schema", _initial_schema),
+    (2, "transaction indexes", _transaction_indexes),
+    (3, "user balances", _user_balances),
+    (4, "category rollups", _category_rollups),
+    (5, "created_ts epoch column", _created_ts),
+    (6, "transaction archives", _transaction_archives),
+    (7, "users activity index", _users_activity_index),
+    (8, "global counters", _global_counters),
+    (9, "transaction search", _transaction_search),
+    (10, "drop balance index", _drop_balance_index),
+)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Номер последней примененной миграции (0 - новая база)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def apply_migrations(db, conn: sqlite3.Connection) -> List[int]:
+    """Применение недостающих миграций по порядку; возвращает их номера"""
+    version = current_version(conn)
+    conn.commit()
+
+    applied = []
+    for number, name, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            migrate(db, conn)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (number, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Миграция схемы {number}: {name}")
+        applied.append(number)
+    return applied
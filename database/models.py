@@ -0,0 +1,90 @@
+# database/models.py
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# Начало epoch-времени (naive UTC, как created_at в базе)
+_EPOCH = datetime(1970, 1, 1)
+
+
+class Transaction(NamedTuple):
+    """Модель транзакции (кортеж со слотами: без __dict__ на каждую строку)"""
+    id: Optional[int] = None
+    user_id: int = None
+    amount: float = None
+    description: str = None
+    category: str = None
+    transaction_type: str = None  # 'income' или 'expense'
+    created_at: Optional[datetime] = None
+
+
+class TransactionBatch:
+    """Колоночное представление транзакций одного пользователя.
+
+    Суммы лежат в array('d'), категории - кодами в array('H') со словарем
+    имен, время - epoch-секундами. Объекты Transaction создаются только
+    при обходе rows(), а агрегаты считаются одним проходом по массивам.
+    """
+
+    __slots__ = ('user_id', 'ids', 'amounts', 'is_income', 'category_codes',
+                 'timestamps', 'descriptions', 'categories', '_category_index')
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.ids = array('q')
+        self.amounts = array('d')
+        self.is_income = array('b')
+        self.category_codes = array('H')
+        self.timestamps = array('q')
+        self.descriptions: List[str] = []
+        self.categories: List[str] = []
+        self._category_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, transaction_id: int, amount: float, description: str,
+               category: str, transaction_type: str, timestamp: int):
+        code = self._category_index.get(category)
+        if code is None:
+            code = self._category_index[category] = len(self.categories)
+            self.categories.append(category)
+
+        self.ids.append(transaction_id)
+        self.amounts.append(amount)
+        self.is_income.append(transaction_type == 'income')
+        self.category_codes.append(code)
+        self.timestamps.append(timestamp)
+        self.descriptions.append(description)
+
+    def summarize(self) -> Dict[str, Dict]:
+        """Статистика по категориям за один проход (формат get_category_stats)"""
+        size = len(self.categories)
+        income = [0.0] * size
+        expense = [0.0] * size
+        counts = [0] * size
+
+        for amount, is_income, code in zip(self.amounts, self.is_income, self.category_codes):
+            if is_income:
+                income[code] += amount
+            else:
+                expense[code] += amount
+            counts[code] += 1
+
+        return {
+            category: {'income': income[code], 'expense': expense[code], 'count': counts[code]}
+            for code, category in enumerate(self.categories)
+        }
+
+    def rows(self) -> Iterator[Transaction]:
+        """Ленивый обход в виде Transaction (в порядке выборки)"""
+        for i in range(len(self.ids)):
+            yield Transaction(
+                id=self.ids[i],
+                user_id=self.user_id,
+                amount=self.amounts[i],
+                description=self.descriptions[i],
+                category=self.categories[self.category_codes[i]],
+                transaction_type='income' if self.is_income[i] else 'expense',
+                created_at=_EPOCH + timedelta(seconds=self.timestamps[i])
+            )
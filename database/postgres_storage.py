@@ -0,0 +1,922 @@
+# database/postgres_storage.py
+"""
+Хранилище на PostgreSQL через asyncpg.
+
+Запросы идут через пул соединений asyncpg; каждое выражение готовится
+на соединении один раз и дальше выполняется как prepared statement
+(кэш asyncpg по тексту запроса). Баланс пользователя ведется в user_balances
+в том же запросе, что и вставка или удаление транзакции. Статистика по
+категориям считается по покрывающему индексу, без отдельных сводок.
+
+Время хранится в TIMESTAMP без часового пояса, в UTC - как created_at в SQLite.
+"""
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from database.activity_tracker import ActivityTracker
+from database.db_manager import (
+    BALANCE_TOLERANCE, BULK_BATCH_SIZE, HISTORY_PAGE_SIZE, SEARCH_PAGE_SIZE, STATEMENT_CACHE_SIZE,
+    STREAM_CHUNK_SIZE, USERS_PAGE_SIZE, prepare_bulk_row, search_terms
+)
+from database.models import Transaction, TransactionBatch
+from database.storage import Storage
+from database.user_cache import RegisteredUserCache, USER_CACHE_CAPACITY
+
+try:
+    import asyncpg
+except ImportError:  # asyncpg нужен только для PostgreSQL
+    asyncpg = None
+
+# Ключ advisory-блокировки: миграции выполняет один процесс за раз
+MIGRATION_LOCK_KEY = 7_310_001
+
+# (версия, описание, SQL); порядок и номера не меняются
+# Счетчики аналитики разложены по полосам user_id % COUNTER_STRIPES: записи
+# разных пользователей обновляют разные строки и не ждут одну блокировку,
+# отчет суммирует полосы. Любое распределение по полосам дает те же суммы
+COUNTER_STRIPES = 16
+
+POSTGRES_MIGRATIONS = (
+    (1, "initial schema", """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            registration_date TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            last_activity TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        );
+
+        CREATE TABLE IF NOT EXISTS transactions (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            amount DOUBLE PRECISION NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        );
+
+        -- История по времени и суммы по категориям без чтения строк таблицы
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+        ON transactions (user_id, created_at) INCLUDE (category, transaction_type, amount);
+
+        CREATE TABLE IF NOT EXISTS user_balances (
+            user_id BIGINT PRIMARY KEY,
+            income_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+            expense_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+            txn_count BIGINT NOT NULL DEFAULT 0,
+            last_txn_at TIMESTAMP
+        );
+    """),
+    (2, "users activity index", """
+        UPDATE users SET last_activity = registration_date WHERE last_activity IS NULL;
+
+        -- Ключ страницы передается с точностью до секунды - храним так же
+        ALTER TABLE users ALTER COLUMN last_activity TYPE TIMESTAMP(0);
+
+        -- Постраничный админский список пользователей по последней активности
+        CREATE INDEX IF NOT EXISTS idx_users_active_activity
+        ON users (last_activity, user_id) WHERE is_active;
+    """),
+    (3, "transaction search", """
+        -- Поиск по словам описания; индекс ведет сам PostgreSQL
+        CREATE INDEX IF NOT EXISTS idx_transactions_search
+        ON transactions USING GIN (to_tsvector('simple', description));
+    """),
+    (4, "transaction history index", """
+        -- Ключ истории (created_at, id) целиком в индексе: страница - один диапазон
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_created_id
+        ON transactions (user_id, created_at, id) INCLUDE (category, transaction_type, amount);
+
+        DROP INDEX IF EXISTS idx_transactions_user_created;
+    """),
+    (5, "admin counters", f"""
+        -- Счетчики админской аналитики, как в SQLite, но по полосам
+        -- (COUNTER_STRIPES); общее число транзакций - сумма category_counters
+        CREATE TABLE IF NOT EXISTS category_counters (
+            category TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            stripe SMALLINT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, transaction_type, stripe)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_counters (
+            day DATE NOT NULL,
+            transaction_type TEXT NOT NULL,
+            stripe SMALLINT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            total DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, transaction_type, stripe)
+        );
+
+        -- Запись из других экземпляров ждет конца заполнения
+        LOCK TABLE transactions IN SHARE MODE;
+
+        INSERT INTO category_counters (category, transaction_type, stripe, count)
+        SELECT category, transaction_type, user_id % {COUNTER_STRIPES}, COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2, 3
+        ON CONFLICT DO NOTHING;
+
+        INSERT INTO daily_counters (day, transaction_type, stripe, count, total)
+        SELECT created_at::date, transaction_type, user_id % {COUNTER_STRIPES}, COUNT(*), SUM(amount)
+        FROM transactions
+        GROUP BY 1, 2, 3
+        ON CONFLICT DO NOTHING;
+    """),
+)
+
+# Колонки transactions в порядке полей Transaction
+TRANSACTION_COLUMNS = "id, user_id, amount, description, category, transaction_type, created_at"
+
+
+def _since(days: int) -> datetime:
+    """Граница периода «последние days дней» (naive UTC)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+def _row_to_transaction(row) -> Transaction:
+    return Transaction(
+        id=row['id'],
+        user_id=row['user_id'],
+        amount=row['amount'],
+        description=row['description'],
+        category=row['category'],
+        transaction_type=row['transaction_type'],
+        created_at=row['created_at']
+    )
+
+
+class _DirectLane:
+    """Исполнитель для ActivityTracker: методы хранилища уже асинхронные"""
+
+    async def run(self, func, *args, **kwargs):
+        return await func(*args, **kwargs)
+
+
+class PostgresStorage(Storage):
+    """Хранилище на PostgreSQL: пул asyncpg и подготовленные выражения"""
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10,
+                 user_cache_capacity: int = USER_CACHE_CAPACITY):
+        if asyncpg is None:
+            raise RuntimeError("Для PostgreSQL установите asyncpg: pip install asyncpg")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.user_cache = RegisteredUserCache(user_cache_capacity)
+        self._pool = None
+        self._activity = ActivityTracker(self, _DirectLane())
+
+    async def start(self):
+        """Создание пула, миграции схемы и прогрев кэша пользователей"""
+        if self._pool is not None:
+            return
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=STATEMENT_CACHE_SIZE
+        )
+        await self._apply_migrations()
+        await self._warm_user_cache()
+
+    async def close(self):
+        """Запись буфера активности и закрытие пула"""
+        if self._pool is None:
+            return
+        await self._activity.close()
+        await self._pool.close()
+        self._pool = None
+
+    async def _apply_migrations(self):
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_KEY)
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+                    )
+                """)
+                version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+
+                for number, name, sql in POSTGRES_MIGRATIONS:
+                    if number <= version:
+                        continue
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO schema_version (version, name) VALUES ($1, $2)", number, name
+                    )
+                    print(f"Миграция схемы PostgreSQL {number}: {name}")
+
+    async def _warm_user_cache(self):
+        """Загрузка ID активных пользователей в кэш при старте"""
+        rows = await self._pool.fetch(
+            "SELECT user_id FROM users WHERE is_active LIMIT $1", self.user_cache.capacity
+        )
+        # Кэш никогда не считается полным: пользователей регистрируют и другие
+        # экземпляры бота с той же базой, поэтому промах идет в базу, а
+        # положительный ответ кэшируется в is_user_registered
+        self.user_cache.warm([row['user_id'] for row in rows], complete=False)
+
+    # === ЗАПИСЬ ===
+
+    async def register_user(self, user_id: int, username: str = None, first_name: str = None) -> bool:
+        """Регистрация нового пользователя"""
+        try:
+            inserted = await self._pool.fetchval("""
+                INSERT INTO users (user_id, username, first_name)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING user_id
+            """, user_id, username, first_name)
+            if inserted is not None:
+                self.user_cache.add(user_id)
+            return inserted is not None
+        except Exception as e:
+            print(f"Ошибка регистрации пользователя: {e}")
+            return False
+
+    async def add_transaction(self, user_id: int, amount: float, description: str,
+                              category: str, transaction_type: str) -> Optional[Tuple[Transaction, float]]:
+        """Добавление транзакции и обновление баланса одним запросом"""
+        try:
+            row = await self._pool.fetchrow(f"""
+                WITH t AS (
+                    INSERT INTO transactions (user_id, amount, description, category, transaction_type)
+                    VALUES ($1, $2, $3, $4, $5)
+                    RETURNING {TRANSACTION_COLUMNS}
+                ), b AS (
+                    INSERT INTO user_balances AS ub
+                        (user_id, income_total, expense_total, txn_count, last_txn_at)
+                    SELECT user_id,
+                           CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END,
+                           CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END,
+                           1, created_at
+                    FROM t
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        income_total = ub.income_total + excluded.income_total,
+                        expense_total = ub.expense_total + excluded.expense_total,
+                        txn_count = ub.txn_count + 1,
+                        last_txn_at = GREATEST(ub.last_txn_at, excluded.last_txn_at)
+                    RETURNING income_total - expense_total AS balance
+                ), c AS (
+                    INSERT INTO category_counters AS cc (category, transaction_type, stripe, count)
+                    SELECT category, transaction_type, user_id % {COUNTER_STRIPES}, 1 FROM t
+                    ON CONFLICT (category, transaction_type, stripe) DO UPDATE SET count = cc.count + 1
+                ), d AS (
+                    INSERT INTO daily_counters AS dc (day, transaction_type, stripe, count, total)
+                    SELECT created_at::date, transaction_type, user_id % {COUNTER_STRIPES}, 1, amount FROM t
+                    ON CONFLICT (day, transaction_type, stripe) DO UPDATE SET
+                        count = dc.count + 1,
+                        total = dc.total + excluded.total
+                )
+                SELECT t.*, b.balance FROM t, b
+            """, user_id, amount, description, category, transaction_type)
+            return _row_to_transaction(row), row['balance']
+        except Exception as e:
+            print(f"Ошибка добавления транзакции: {e}")
+            return None
+
+    async def add_transactions_bulk(self, rows: Iterable[tuple], batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Массовый импорт: executemany пачками в одной транзакции, балансы - раз на пачку"""
+        now_ts = int(time.time())
+        numbered = enumerate(rows)
+        inserted = 0
+        failures = []
+        categories = {}
+        days = {}
+
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                while True:
+                    chunk = list(itertools.islice(numbered, batch_size))
+                    if not chunk:
+                        break
+
+                    prepared = []
+                    for index, row in chunk:
+                        try:
+                            *fields, created_ts = prepare_bulk_row(row, now_ts)
+                            prepared.append((index, (*fields, datetime.fromtimestamp(created_ts, timezone.utc).replace(tzinfo=None))))
+                        except (TypeError, ValueError) as e:
+                            failures.append((index, str(e)))
+
+                    values = await self._insert_bulk_chunk(conn, prepared, failures)
+                    if values:
+                        await self._add_balance_deltas(conn, values)
+                    for user_id, amount, _, category, transaction_type, created_at in values:
+                        key = (category, transaction_type, user_id % COUNTER_STRIPES)
+                        categories[key] = categories.get(key, 0) + 1
+                        key = (created_at.date(), transaction_type, user_id % COUNTER_STRIPES)
+                        total, count = days.get(key, (0.0, 0))
+                        days[key] = (total + amount, count + 1)
+                    inserted += len(values)
+
+                # Счетчики - в самом конце: строки полос импортируемых пользователей
+                # нужны и другим пишущим, блокировка держится только до фиксации
+                await self._add_counter_deltas(conn, categories, days)
+
+        return {'inserted': inserted, 'failures': failures}
+
+    @staticmethod
+    async def _insert_bulk_chunk(conn, prepared: List[Tuple[int, tuple]], failures: list) -> List[tuple]:
+        """Пачка одним executemany; если не прошла - по строкам, каждая в своем SAVEPOINT"""
+        sql = """
+            INSERT INTO transactions (user_id, amount, description, category, transaction_type, created_at)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        """
+        try:
+            async with conn.transaction():
+                await conn.executemany(sql, [values for _, values in prepared])
+            return [values for _, values in prepared]
+        except asyncpg.PostgresError:
+            pass
+
+        inserted = []
+        for index, values in prepared:
+            try:
+                async with conn.transaction():
+                    await conn.execute(sql, *values)
+                inserted.append(values)
+            except asyncpg.PostgresError as e:
+                failures.append((index, str(e)))
+        return inserted
+
+    @staticmethod
+    async def _add_balance_deltas(conn, values: List[tuple]):
+        """Одно обновление user_balances на пользователя за пачку"""
+        balances = {}
+        for user_id, amount, _, _, transaction_type, created_at in values:
+            income, expense, count, last_at = balances.get(user_id, (0.0, 0.0, 0, created_at))
+            if transaction_type == 'income':
+                income += amount
+            else:
+                expense += amount
+            balances[user_id] = (income, expense, count + 1, max(last_at, created_at))
+
+        await conn.executemany("""
+            INSERT INTO user_balances AS ub (user_id, income_total, expense_total, txn_count, last_txn_at)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id) DO UPDATE SET
+                income_total = ub.income_total + excluded.income_total,
+                expense_total = ub.expense_total + excluded.expense_total,
+                txn_count = ub.txn_count + excluded.txn_count,
+                last_txn_at = GREATEST(ub.last_txn_at, excluded.last_txn_at)
+        """, [(user_id, *totals) for user_id, totals in balances.items()])
+
+    @staticmethod
+    async def _add_counter_deltas(conn, categories: dict, days: dict, sign: int = 1):
+        """Счетчики админской аналитики: categories - {(категория, тип, полоса): число},
+        days - {(день, тип, полоса): (сумма, число)}; ключи по порядку, чтобы не было взаимных блокировок"""
+        await conn.executemany("""
+            INSERT INTO category_counters AS cc (category, transaction_type, stripe, count)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (category, transaction_type, stripe) DO UPDATE SET count = cc.count + excluded.count
+        """, [(*key, sign * count) for key, count in sorted(categories.items())])
+        await conn.executemany("""
+            INSERT INTO daily_counters AS dc (day, transaction_type, stripe, count, total)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (day, transaction_type, stripe) DO UPDATE SET
+                count = dc.count + excluded.count,
+                total = dc.total + excluded.total
+        """, [(*key, sign * count, sign * total) for key, (total, count) in sorted(days.items())])
+        if sign < 0:
+            await conn.executemany("""
+                DELETE FROM category_counters
+                WHERE category = $1 AND transaction_type = $2 AND stripe = $3 AND count = 0
+            """, sorted(categories))
+            await conn.executemany("""
+                DELETE FROM daily_counters
+                WHERE day = $1 AND transaction_type = $2 AND stripe = $3 AND count = 0
+            """, sorted(days))
+
+    def record_activity(self, user_id: int):
+        """Отметка активности: копится в памяти и пишется пакетом"""
+        self._activity.touch(user_id)
+
+    async def touch_users_activity(self, entries: List[Tuple[int, str]]):
+        """Пакетное обновление last_activity: entries - пары (user_id, время UTC)"""
+        await self._pool.executemany("""
+            INSERT INTO users (user_id, last_activity)
+            VALUES ($1, $2)
+            ON CONFLICT (user_id) DO UPDATE SET
+                last_activity = GREATEST(users.last_activity, excluded.last_activity)
+        """, [(user_id, datetime.fromisoformat(timestamp)) for user_id, timestamp in entries])
+
+    async def update_user_activity(self, user_id: int, username: str = None, first_name: str = None):
+        """Обновление активности пользователя"""
+        await self._pool.execute("""
+            INSERT INTO users (user_id, username, first_name)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_activity = excluded.last_activity
+        """, user_id, username, first_name)
+
+    async def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удаление транзакции по ID"""
+        return await self.delete_transaction_returning(transaction_id, user_id) is not None
+
+    async def delete_transaction_returning(self, transaction_id: int,
+                                           user_id: int) -> Optional[Tuple[Transaction, float]]:
+        """Удаление транзакции: (удаленная транзакция, новый баланс) или None"""
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    row = await conn.fetchrow("""
+                        WITH t AS (
+                            DELETE FROM transactions
+                            WHERE id = $1 AND user_id = $2
+                            RETURNING *
+                        )
+                        UPDATE user_balances AS ub SET
+                            income_total = ub.income_total
+                                - CASE WHEN t.transaction_type = 'income' THEN t.amount ELSE 0 END,
+                            expense_total = ub.expense_total
+                                - CASE WHEN t.transaction_type = 'expense' THEN t.amount ELSE 0 END,
+                            txn_count = ub.txn_count - 1
+                        FROM t
+                        WHERE ub.user_id = t.user_id
+                        RETURNING t.id, t.user_id, t.amount, t.description, t.category,
+                                  t.transaction_type, t.created_at,
+                                  ub.income_total - ub.expense_total AS balance
+                    """, transaction_id, user_id)
+                    if row is None:
+                        return None
+
+                    # Дата последней транзакции - уже без удаленной, по индексу
+                    await conn.execute("""
+                        UPDATE user_balances SET last_txn_at = (
+                            SELECT MAX(created_at) FROM transactions WHERE user_id = $1
+                        )
+                        WHERE user_id = $1
+                    """, user_id)
+                    stripe = user_id % COUNTER_STRIPES
+                    await self._add_counter_deltas(
+                        conn, {(row['category'], row['transaction_type'], stripe): 1},
+                        {(row['created_at'].date(), row['transaction_type'], stripe): (row['amount'], 1)},
+                        sign=-1
+                    )
+                    return _row_to_transaction(row), row['balance']
+        except Exception as e:
+            print(f"Ошибка удаления транзакции: {e}")
+            return None
+
+    async def check_user_balances(self, fix: bool = False) -> List[dict]:
+        """Сверка таблицы балансов с транзакциями (и исправление при fix=True)"""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                expected = {row[0]: tuple(row[1:]) for row in await conn.fetch("""
+                    SELECT
+                        user_id,
+                        COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0),
+                        COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0),
+                        COUNT(*),
+                        MAX(created_at)
+                    FROM transactions
+                    GROUP BY user_id
+                """)}
+                actual = {row[0]: tuple(row[1:]) for row in await conn.fetch("""
+                    SELECT user_id, income_total, expense_total, txn_count, last_txn_at
+                    FROM user_balances
+                """)}
+
+                empty = (0, 0, 0, None)
+                mismatches = []
+                for user_id in sorted(set(expected) | set(actual)):
+                    exp = expected.get(user_id, empty)
+                    act = actual.get(user_id, empty)
+                    if (abs(exp[0] - act[0]) > BALANCE_TOLERANCE
+                            or abs(exp[1] - act[1]) > BALANCE_TOLERANCE
+                            or exp[2] != act[2] or exp[3] != act[3]):
+                        mismatches.append({
+                            'user_id': user_id,
+                            'expected': dict(zip(('income', 'expense', 'transactions', 'last_transaction'), exp)),
+                            'actual': dict(zip(('income', 'expense', 'transactions', 'last_transaction'), act))
+                        })
+
+                if fix and mismatches:
+                    await conn.execute("DELETE FROM user_balances")
+                    await conn.execute("""
+                        INSERT INTO user_balances (user_id, income_total, expense_total, txn_count, last_txn_at)
+                        SELECT
+                            user_id,
+                            COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END), 0),
+                            COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END), 0),
+                            COUNT(*),
+                            MAX(created_at)
+                        FROM transactions
+                        GROUP BY user_id
+                    """)
+                    await conn.execute("DELETE FROM category_counters")
+                    await conn.execute(f"""
+                        INSERT INTO category_counters (category, transaction_type, stripe, count)
+                        SELECT category, transaction_type, user_id % {COUNTER_STRIPES}, COUNT(*)
+                        FROM transactions
+                        GROUP BY 1, 2, 3
+                    """)
+                    await conn.execute("DELETE FROM daily_counters")
+                    await conn.execute(f"""
+                        INSERT INTO daily_counters (day, transaction_type, stripe, count, total)
+                        SELECT created_at::date, transaction_type, user_id % {COUNTER_STRIPES},
+                               COUNT(*), SUM(amount)
+                        FROM transactions
+                        GROUP BY 1, 2, 3
+                    """)
+                return mismatches
+
+    # === ЧТЕНИЕ ===
+
+    async def is_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации пользователя; попадание в кэш - без запроса"""
+        cached = self.user_cache.lookup(user_id)
+        if cached is not None:
+            return cached
+        registered = await self._pool.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM users WHERE user_id = $1 AND is_active)", user_id
+        )
+        if registered:
+            self.user_cache.add(user_id)
+        return registered
+
+    def get_user_cache_stats(self) -> dict:
+        """Счетчики кэша зарегистрированных пользователей"""
+        return self.user_cache.stats()
+
+    async def get_user_stats(self) -> dict:
+        """Статистика пользователей (для админов)"""
+        row = await self._pool.fetchrow("""
+            SELECT
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE last_activity >= $1) AS active_7d,
+                COUNT(*) FILTER (WHERE registration_date >= $2) AS new_30d
+            FROM users
+            WHERE is_active
+        """, _since(7), _since(30))
+        return {
+            "total": row['total'],
+            "active_7d": row['active_7d'],
+            "new_30d": row['new_30d']
+        }
+
+    async def get_detailed_users_list(self) -> list:
+        """Подробный список пользователей (для админов)"""
+        rows = await self._pool.fetch("""
+            SELECT
+                user_id,
+                username,
+                first_name,
+                to_char(registration_date, 'YYYY-MM-DD HH24:MI:SS') AS registration_date,
+                to_char(last_activity, 'YYYY-MM-DD HH24:MI:SS') AS last_activity,
+                is_active
+            FROM users
+            WHERE is_active
+            ORDER BY last_activity DESC
+        """)
+        return [
+            {
+                'user_id': row['user_id'],
+                'username': row['username'],
+                'first_name': row['first_name'],
+                'registration_date': row['registration_date'],
+                'last_activity': row['last_activity'],
+                'is_active': row['is_active']
+            }
+            for row in rows
+        ]
+
+    async def get_users_page(self, after: Optional[Tuple[str, int]] = None,
+                             before: Optional[Tuple[str, int]] = None,
+                             limit: int = USERS_PAGE_SIZE) -> dict:
+        """Страница пользователей со статистикой: keyset по (last_activity, user_id)"""
+        if before is not None:
+            condition, order, key = "AND (u.last_activity, u.user_id) > ($2, $3)", "ASC", before
+        elif after is not None:
+            condition, order, key = "AND (u.last_activity, u.user_id) < ($2, $3)", "DESC", after
+        else:
+            condition, order, key = "", "DESC", None
+        params = [limit + 1]
+        if key is not None:
+            params += [datetime.strptime(key[0], '%Y-%m-%d %H:%M:%S'), key[1]]
+
+        rows = await self._pool.fetch(f"""
+            SELECT
+                u.user_id,
+                u.username,
+                u.first_name,
+                to_char(u.registration_date, 'YYYY-MM-DD HH24:MI:SS') AS registration_date,
+                to_char(u.last_activity, 'YYYY-MM-DD HH24:MI:SS') AS last_activity,
+                COALESCE(b.txn_count, 0) AS transactions,
+                COALESCE(b.income_total, 0) AS income,
+                COALESCE(b.expense_total, 0) AS expense,
+                to_char(b.last_txn_at, 'YYYY-MM-DD HH24:MI:SS') AS last_txn_at
+            FROM users AS u
+            LEFT JOIN user_balances AS b ON b.user_id = u.user_id
+            WHERE u.is_active {condition}
+            ORDER BY u.last_activity {order}, u.user_id {order}
+            LIMIT $1
+        """, *params)
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return {
+            'users': [
+                {
+                    'user_id': row['user_id'],
+                    'username': row['username'],
+                    'first_name': row['first_name'],
+                    'registration_date': row['registration_date'],
+                    'last_activity': row['last_activity'],
+                    'transactions': row['transactions'],
+                    'income': row['income'],
+                    'expense': row['expense'],
+                    'balance': row['income'] - row['expense'],
+                    'last_transaction': row['last_txn_at']
+                }
+                for row in rows
+            ],
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
+
+    async def get_user_transaction_stats(self, user_id: int) -> dict:
+        """Статистика транзакций конкретного пользователя"""
+        row = await self._pool.fetchrow("""
+            SELECT income_total, expense_total, txn_count,
+                   to_char(last_txn_at, 'YYYY-MM-DD HH24:MI:SS') AS last_txn_at
+            FROM user_balances
+            WHERE user_id = $1
+        """, user_id)
+        if not row:
+            return {
+                'transactions': 0,
+                'income': 0,
+                'expense': 0,
+                'balance': 0,
+                'last_transaction': None
+            }
+        return {
+            'transactions': row['txn_count'],
+            'income': row['income_total'],
+            'expense': row['expense_total'],
+            'balance': row['income_total'] - row['expense_total'],
+            'last_transaction': row['last_txn_at']
+        }
+
+    async def get_user_balance(self, user_id: int) -> float:
+        """Получение баланса пользователя"""
+        balance = await self._pool.fetchval(
+            "SELECT income_total - expense_total FROM user_balances WHERE user_id = $1", user_id
+        )
+        return balance if balance is not None else 0
+
+    async def get_transactions(self, user_id: int, days: int = 30,
+                               limit: Optional[int] = None) -> List[Transaction]:
+        """Получение транзакций за период (новые первыми)"""
+        rows = await self._pool.fetch(f"""
+            SELECT {TRANSACTION_COLUMNS} FROM transactions
+            WHERE user_id = $1 AND created_at >= $2
+            ORDER BY created_at DESC
+            LIMIT $3
+        """, user_id, _since(days), limit)
+        return [_row_to_transaction(row) for row in rows]
+
+    async def get_transaction_batch(self, user_id: int, days: int = 30,
+                                    limit: Optional[int] = None) -> TransactionBatch:
+        """Транзакции за период в колоночном виде (новые первыми)"""
+        rows = await self._pool.fetch("""
+            SELECT id, amount, description, category, transaction_type,
+                   EXTRACT(EPOCH FROM created_at)::BIGINT
+            FROM transactions
+            WHERE user_id = $1 AND created_at >= $2
+            ORDER BY created_at DESC
+            LIMIT $3
+        """, user_id, _since(days), limit)
+        batch = TransactionBatch(user_id)
+        for row in rows:
+            batch.append(*row)
+        return batch
+
+    async def iter_transactions(self, user_id: int, days: int = 30,
+                                chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Transaction]:
+        """Потоковое чтение транзакций за период: серверный курсор, порции по chunk_size"""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(f"""
+                    SELECT {TRANSACTION_COLUMNS} FROM transactions
+                    WHERE user_id = $1 AND created_at >= $2
+                    ORDER BY created_at DESC
+                """, user_id, _since(days), prefetch=chunk_size):
+                    yield _row_to_transaction(row)
+
+    async def get_category_stats(self, user_id: int, days: int = 30) -> Dict[str, Dict]:
+        """Статистика по категориям (index-only scan по покрывающему индексу)"""
+        rows = await self._pool.fetch("""
+            SELECT category, transaction_type, SUM(amount) AS total, COUNT(*) AS count
+            FROM transactions
+            WHERE user_id = $1 AND created_at >= $2
+            GROUP BY category, transaction_type
+            ORDER BY total DESC
+        """, user_id, _since(days))
+
+        stats = {}
+        for category, trans_type, total, count in rows:
+            if category not in stats:
+                stats[category] = {'income': 0, 'expense': 0, 'count': 0}
+            stats[category][trans_type] = total
+            stats[category]['count'] += count
+        return stats
+
+    async def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Transaction]:
+        """Получение транзакции пользователя по ID"""
+        row = await self._pool.fetchrow(f"""
+            SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE id = $1 AND user_id = $2
+        """, transaction_id, user_id)
+        return _row_to_transaction(row) if row else None
+
+    async def get_history_page(self, user_id: int, after: Optional[Tuple[datetime, int]] = None,
+                               before: Optional[Tuple[datetime, int]] = None,
+                               limit: int = HISTORY_PAGE_SIZE) -> dict:
+        """Страница истории: keyset по (created_at, id) с точностью до микросекунд"""
+        if before is not None:
+            condition, order, key = "AND (created_at, id) > ($3, $4)", "ASC", before
+        elif after is not None:
+            condition, order, key = "AND (created_at, id) < ($3, $4)", "DESC", after
+        else:
+            condition, order, key = "", "DESC", ()
+
+        rows = await self._pool.fetch(f"""
+            SELECT {TRANSACTION_COLUMNS} FROM transactions
+            WHERE user_id = $1 {condition}
+            ORDER BY created_at {order}, id {order}
+            LIMIT $2
+        """, user_id, limit + 1, *key)
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return {
+            'transactions': [_row_to_transaction(row) for row in rows],
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
+
+    async def get_last_transaction(self, user_id: int) -> Optional[Transaction]:
+        """Получение последней транзакции пользователя"""
+        transactions = await self.get_recent_transactions_for_deletion(user_id, 1)
+        return transactions[0] if transactions else None
+
+    async def get_recent_transactions_for_deletion(self, user_id: int, limit: int = 10) -> List[Transaction]:
+        """Получение последних транзакций для удаления"""
+        rows = await self._pool.fetch(f"""
+            SELECT {TRANSACTION_COLUMNS} FROM transactions
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+            LIMIT $2
+        """, user_id, limit)
+        return [_row_to_transaction(row) for row in rows]
+
+    async def search_transactions(self, user_id: int, query: str, since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None, after: Optional[int] = None,
+                                  before: Optional[int] = None, limit: int = SEARCH_PAGE_SIZE) -> dict:
+        """Поиск по словам описания (GIN по to_tsvector); keyset по ID, как в SQLite"""
+        terms = search_terms(query)
+        if not terms:
+            return {'transactions': [], 'count': 0, 'income': 0.0, 'expense': 0.0,
+                    'has_prev': False, 'has_next': False}
+
+        # Все слова по префиксу: 'такси:* & домой:*'
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        params = [user_id, tsquery, since or datetime.min, until or datetime.max]
+        where = """
+            WHERE user_id = $1
+              AND to_tsvector('simple', description) @@ to_tsquery('simple', $2)
+              AND created_at >= $3 AND created_at < $4
+        """
+        if before is not None:
+            condition, order, key = "AND id > $6", "ASC", before
+        elif after is not None:
+            condition, order, key = "AND id < $6", "DESC", after
+        else:
+            condition, order, key = "", "DESC", None
+
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {TRANSACTION_COLUMNS} FROM transactions
+                {where} {condition}
+                ORDER BY id {order}
+                LIMIT $5
+            """, *params, limit + 1, *([key] if key is not None else []))
+            totals = await conn.fetchrow(f"""
+                SELECT COUNT(*) AS count,
+                       COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'income'), 0) AS income,
+                       COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'expense'), 0) AS expense
+                FROM transactions
+                {where}
+            """, *params)
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before is not None:
+            rows.reverse()
+        return {
+            'transactions': [_row_to_transaction(row) for row in rows],
+            'count': totals['count'],
+            'income': totals['income'],
+            'expense': totals['expense'],
+            'has_prev': more if before is not None else after is not None,
+            'has_next': more if before is None else True
+        }
+
+    async def get_admin_analytics(self) -> dict:
+        """Агрегированные данные для админской аналитики.
+
+        Итоги по транзакциям читаются из счетчиков (category_counters,
+        daily_counters по полосам, user_balances) - таблица transactions не читается.
+        """
+        async with self._pool.acquire() as conn:
+            # Один снимок данных на весь отчет
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                totals = await conn.fetchrow("""
+                    SELECT COALESCE(SUM(count), 0)::BIGINT AS total_transactions,
+                           COALESCE(SUM(count) FILTER (WHERE category = 'другое'), 0)::BIGINT AS uncategorized
+                    FROM category_counters
+                """)
+                users = await conn.fetchrow("""
+                    SELECT COUNT(*) AS total,
+                           COUNT(*) FILTER (WHERE last_activity >= $1) AS active_7d,
+                           COUNT(*) FILTER (WHERE registration_date >= $2) AS new_30d
+                    FROM users
+                """, _since(7), _since(30))
+
+                popular_categories = [tuple(row) for row in await conn.fetch("""
+                    SELECT category, SUM(count)::BIGINT AS count,
+                           ROUND(SUM(count) * 100.0 / GREATEST($1::BIGINT, 1), 1)::FLOAT AS percentage
+                    FROM category_counters
+                    WHERE transaction_type = 'expense'
+                    GROUP BY category
+                    ORDER BY count DESC
+                    LIMIT 10
+                """, totals['total_transactions'])]
+
+                segments = await conn.fetchrow("""
+                    SELECT COUNT(*) FILTER (WHERE txn_count >= 10) AS high,
+                           COUNT(*) FILTER (WHERE txn_count >= 3 AND txn_count < 10) AS medium,
+                           COUNT(*) FILTER (WHERE txn_count >= 1 AND txn_count < 3) AS low
+                    FROM user_balances
+                """)
+                user_segments = dict(segments)
+
+                daily_activity = [tuple(row) for row in await conn.fetch("""
+                    SELECT to_char(day, 'YYYY-MM-DD') AS day, SUM(count)::BIGINT AS operations
+                    FROM daily_counters
+                    WHERE day >= $1
+                    GROUP BY 1
+                    ORDER BY 1 DESC
+                """, _since(7).date())]
+
+                financial_activity = [tuple(row) for row in await conn.fetch("""
+                    SELECT
+                        to_char(day, 'YYYY-MM-DD') AS day,
+                        SUM(CASE WHEN transaction_type = 'income' THEN total ELSE 0 END) AS income,
+                        SUM(CASE WHEN transaction_type = 'expense' THEN total ELSE 0 END) AS expense
+                    FROM daily_counters
+                    WHERE day >= $1
+                    GROUP BY 1
+                    ORDER BY 1 DESC
+                """, _since(7).date())]
+
+                top_users = [tuple(row) for row in await conn.fetch("""
+                    SELECT u.first_name, u.username, b.txn_count
+                    FROM user_balances AS b
+                    JOIN users AS u ON u.user_id = b.user_id
+                    WHERE b.txn_count > 0
+                    ORDER BY b.txn_count DESC
+                    LIMIT 10
+                """)]
+
+        return {
+            'total_transactions': totals['total_transactions'],
+            'active_users_with_transactions': sum(user_segments.values()),
+            'total_registered': users['total'],
+            'active_7d': users['active_7d'],
+            'new_30d': users['new_30d'],
+            'popular_categories': popular_categories,
+            'user_segments': user_segments,
+            'daily_activity': daily_activity,
+            'financial_activity': financial_activity,
+            'ai_categorized': totals['total_transactions'] - totals['uncategorized'],
+            'ai_uncategorized': totals['uncategorized'],
+            'top_users': top_users
+        }
@@ -0,0 +1,397 @@
+# database/query_stats.py
+import functools
+import inspect
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional
+
+# Порог медленного вызова по умолчанию, мс (0 - журнал выключен)
+SLOW_QUERY_MS = 200
+
+# По скольким последним вызовам метода считаются p50/p99
+LATENCY_WINDOW = 1000
+
+# Сколько последних медленных вызовов хранить в журнале
+SLOW_LOG_SIZE = 50
+
+# Длина SQL в журнале: запросы с подключенными архивами бывают длинными
+SLOW_SQL_CHARS = 500
+
+# Запросы, для которых можно построить EXPLAIN QUERY PLAN
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+class _Call:
+    """Один вызов метода: прочитанные строки и самый долгий запрос внутри него.
+
+    Время запроса - от его execute до execute следующего или до конца
+    вызова: сюда входит и чтение результата. Пока вызов на паузе (вложенный вызов, потребитель
+    потокового чтения между порциями), время запроса не идет.
+    """
+
+    __slots__ = ("method", "explain", "rows", "statements", "sql", "params", "sql_seconds", "sql_started",
+                 "slowest_sql", "slowest_params", "slowest_seconds")
+
+    def __init__(self, method: str, explain: Optional[Callable[[str, object], List[str]]]):
+        self.method = method
+        self.explain = explain
+        self.rows = 0
+        self.statements = 0
+        self.sql = None
+        self.params = None
+        self.sql_seconds = 0.0
+        self.sql_started = None
+        self.slowest_sql = None
+        self.slowest_params = None
+        self.slowest_seconds = 0.0
+
+    def statement(self, sql: str, params, now: float):
+        self.pause(now)
+        self.finish()
+        self.statements += 1
+        self.sql = sql
+        self.params = params
+        self.sql_started = now
+
+    def pause(self, now: float):
+        if self.sql_started is not None:
+            self.sql_seconds += now - self.sql_started
+            self.sql_started = None
+
+    def resume(self, now: float):
+        if self.sql is not None:
+            self.sql_started = now
+
+    def finish(self):
+        """Закрытие текущего запроса (вызов уже на паузе)"""
+        if self.sql is not None and self.sql_seconds >= self.slowest_seconds:
+            self.slowest_sql, self.slowest_params, self.slowest_seconds = self.sql, self.params, self.sql_seconds
+        self.sql = None
+        self.params = None
+        self.sql_seconds = 0.0
+
+    def merge(self, inner: "_Call"):
+        """Вложенный вызов входит и в статистику внешнего"""
+        self.rows += inner.rows
+        self.statements += inner.statements
+        if inner.slowest_sql is not None and inner.slowest_seconds >= self.slowest_seconds:
+            self.slowest_sql, self.slowest_params = inner.slowest_sql, inner.slowest_params
+            self.slowest_seconds = inner.slowest_seconds
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Перцентиль по рангу в отсортированном списке"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class QueryStats:
+    """Время вызовов методов DatabaseManager и журнал медленных вызовов.
+
+    По каждому методу: число вызовов и ошибок, суммарное время, строки,
+    прочитанные из SQLite, p50/p99 по последним LATENCY_WINDOW вызовам.
+    Вызов дольше slow_query_ms попадает в журнал вместе с самым долгим
+    запросом внутри него; план запроса строится позже, в explain_slow, а не
+    в потоке медленного вызова. Один объект можно разделить между
+    несколькими базами (шардами) - статистика будет общей.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._methods = {}
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self.slow_total = 0
+        self.since = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def _stack(self) -> List[_Call]:
+        """Вызовы, идущие в текущем потоке (вложенные - в конце)"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, call: _Call):
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            stack[-1].pause(now)
+        stack.append(call)
+        call.resume(now)
+
+    def _leave(self, call: _Call):
+        stack = self._stack()
+        now = time.perf_counter()
+        stack.pop()
+        call.pause(now)
+        if stack:
+            stack[-1].resume(now)
+
+    # === СБОР ===
+
+    def statement(self, sql: str, params):
+        """Начало очередного запроса (params - для EXPLAIN)"""
+        stack = self._stack()
+        if stack:
+            stack[-1].statement(sql, params, time.perf_counter())
+
+    def add_rows(self, count: int):
+        stack = self._stack()
+        if stack:
+            stack[-1].rows += count
+
+    def begin(self, method: str, explain: Optional[Callable[[str, object], List[str]]] = None) -> _Call:
+        """Начало вызова метода; парный end обязателен (try/finally)"""
+        call = _Call(method, explain)
+        self._enter(call)
+        return call
+
+    def end(self, call: _Call, started: float, failed: bool):
+        self._leave(call)
+        self._record(call, time.perf_counter() - started, failed)
+
+    def track_iter(self, method: str, iterator: Iterator,
+                   explain: Optional[Callable[[str, object], List[str]]] = None) -> Iterator:
+        """Замер потокового чтения: считается только время внутри next()"""
+        call = _Call(method, explain)
+        elapsed = 0.0
+        failed = False
+        try:
+            while True:
+                started = time.perf_counter()
+                self._enter(call)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                except BaseException:
+                    failed = True
+                    raise
+                finally:
+                    self._leave(call)
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            # Чтение бросили на середине - закрываем исходный итератор, соединение вернется в пул
+            if inspect.getgeneratorstate(iterator) != inspect.GEN_CLOSED:
+                self._enter(call)
+                try:
+                    iterator.close()
+                finally:
+                    self._leave(call)
+            self._record(call, elapsed, failed)
+
+    def _record(self, call: _Call, seconds: float, failed: bool):
+        call.finish()
+        stack = self._stack()
+        if stack:
+            stack[-1].merge(call)
+
+        with self._lock:
+            stats = self._methods.get(call.method)
+            if stats is None:
+                stats = self._methods[call.method] = {
+                    'calls': 0, 'errors': 0, 'seconds': 0.0, 'rows': 0,
+                    'latencies': deque(maxlen=LATENCY_WINDOW)
+                }
+            stats['calls'] += 1
+            stats['errors'] += int(failed)
+            stats['seconds'] += seconds
+            stats['rows'] += call.rows
+            stats['latencies'].append(seconds)
+
+        if self.slow_query_ms > 0 and seconds * 1000 >= self.slow_query_ms:
+            self._log_slow(call, seconds)
+
+    def _log_slow(self, call: _Call, seconds: float):
+        """Запись в журнал медленных вызовов (без плана - он строится в explain_slow)"""
+        sql = call.slowest_sql
+        explain = None
+        if sql is not None and call.explain and sql.lstrip().upper().startswith(EXPLAINABLE):
+            explain = call.explain
+        entry = {
+            'at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'method': call.method,
+            'seconds': seconds,
+            'rows': call.rows,
+            'statements': call.statements,
+            'sql': " ".join(sql.split())[:SLOW_SQL_CHARS] if sql is not None else None,
+            'sql_seconds': call.slowest_seconds,
+            'plan': []
+        }
+        with self._lock:
+            # [запись, функция плана или None, полный SQL, параметры]
+            self._slow.append([entry, explain, sql, call.slowest_params])
+            self.slow_total += 1
+
+        print(f"🐢 Медленный вызов {call.method}: {seconds * 1000:.0f} мс, "
+              f"запросов {call.statements}, строк {call.rows}")
+        if entry['sql']:
+            print(f"   {entry['sql_seconds'] * 1000:.0f} мс: {entry['sql']}")
+
+    def explain_slow(self):
+        """Планы запросов журнала медленных, которых еще нет.
+
+        Вызывается перед показом журнала (/dbstats), вне потока медленного
+        вызова: EXPLAIN открывает отдельное соединение и не должен задерживать
+        очередь записи.
+        """
+        with self._lock:
+            pending = [item for item in self._slow if item[1] is not None]
+        for item in pending:
+            entry, explain, sql, params = item
+            plan = explain(sql, params)
+            with self._lock:
+                entry['plan'] = plan
+                item[1] = item[3] = None
+
+    # === ОТЧЕТ ===
+
+    def snapshot(self) -> dict:
+        """Текущие счетчики по методам и журнал медленных вызовов"""
+        with self._lock:
+            methods = {}
+            for method, stats in self._methods.items():
+                ordered = sorted(stats['latencies'])
+                methods[method] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'seconds': stats['seconds'],
+                    'rows': stats['rows'],
+                    'p50': _percentile(ordered, 0.5),
+                    'p99': _percentile(ordered, 0.99),
+                    'max': ordered[-1] if ordered else 0.0
+                }
+            return {
+                'since': self.since,
+                'slow_query_ms': self.slow_query_ms,
+                'methods': methods,
+                'slow_total': self.slow_total,
+                'slow_queries': [dict(item[0]) for item in self._slow]
+            }
+
+
+def timed(method):
+    """Замер вызовов метода DatabaseManager в self.query_stats (если статистика включена)"""
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.query_stats is None:
+                return method(self, *args, **kwargs)
+            return self.query_stats.track_iter(
+                method.__name__, method(self, *args, **kwargs), self._explain_query
+            )
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self.query_stats
+            if stats is None:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            call = stats.begin(method.__name__, self._explain_query)
+            failed = True
+            try:
+                result = method(self, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                stats.end(call, started, failed)
+    return wrapper
+
+
+class CountingCursor(sqlite3.Cursor):
+    """Курсор, сообщающий QueryStats о запросах и прочитанных строках"""
+
+    def execute(self, sql: str, parameters=()):
+        self.connection.query_stats.statement(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters):
+        # Для плана хватит первого набора параметров; генератор не трогаем
+        params = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self.connection.query_stats.statement(sql, params)
+        return super().executemany(sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.connection.query_stats.add_rows(1)
+        return row
+
+    def fetchmany(self, size: int = None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.connection.query_stats.add_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.connection.query_stats.add_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self.connection.query_stats.add_rows(1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение SQLite, запросы которого попадают в QueryStats.
+
+    Connection.execute не вызывает переопределенный cursor(), поэтому
+    execute и executemany тоже явно идут через CountingCursor.
+    """
+
+    query_stats: QueryStats
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+
+def format_prometheus(stats: dict, prefix: str = "finance_bot_db") -> str:
+    """Снимок статистики в текстовом формате Prometheus"""
+    metrics = (
+        ("calls_total", "counter", "Вызовы метода", lambda s: s['calls']),
+        ("errors_total", "counter", "Вызовы, завершившиеся ошибкой", lambda s: s['errors']),
+        ("seconds_total", "counter", "Суммарное время вызовов, с", lambda s: s['seconds']),
+        ("rows_total", "counter", "Строки, прочитанные из базы", lambda s: s['rows']),
+    )
+    lines = []
+    for name, kind, help_text, value in metrics:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for method, method_stats in sorted(stats['methods'].items()):
+            lines.append(f'{prefix}_{name}{{method="{method}"}} {value(method_stats)}')
+
+    lines.append(f"# HELP {prefix}_latency_seconds Время вызова по последним {LATENCY_WINDOW} вызовам, с")
+    lines.append(f"# TYPE {prefix}_latency_seconds gauge")
+    for method, method_stats in sorted(stats['methods'].items()):
+        for quantile, key in (("0.5", 'p50'), ("0.99", 'p99')):
+            lines.append(f'{prefix}_latency_seconds{{method="{method}",quantile="{quantile}"}} '
+                         f'{method_stats[key]}')
+
+    lines.append(f"# HELP {prefix}_slow_calls_total Вызовы дольше порога медленного журнала")
+    lines.append(f"# TYPE {prefix}_slow_calls_total counter")
+    lines.append(f"{prefix}_slow_calls_total {stats['slow_total']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str, stats: dict):
+    """Запись метрик в файл для textfile collector: через временный файл, чтобы не читали половину"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(format_prometheus(stats))
+    os.replace(tmp_path, path)
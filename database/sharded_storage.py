@@ -0,0 +1,296 @@
+# database/sharded_storage.py
+"""
+Шардированное хранилище SQLite: пользователи разнесены по N файлам.
+
+Шард пользователя выбирается по хэшу user_id, у каждого шарда свой
+AsyncDatabaseManager - свой пул соединений и свой поток-писатель, поэтому
+записи разных шардов не ждут одну блокировку SQLite. Методы по пользователю
+идут в его шард, админские и общие - параллельно во все шарды с объединением
+результатов. ID транзакций уникальны только внутри шарда, поэтому все
+операции с транзакцией принимают и user_id.
+
+Разделить существующую базу на шарды: python scripts/split_shards.py
+"""
+import asyncio
+import os
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from database.async_db_manager import AsyncDatabaseManager
+from database.db_manager import BULK_BATCH_SIZE, HISTORY_PAGE_SIZE, SEARCH_PAGE_SIZE, STREAM_CHUNK_SIZE, USERS_PAGE_SIZE
+from database.models import Transaction, TransactionBatch
+from database.query_stats import QueryStats
+from database.storage import Storage
+
+
+def shard_index(user_id: int, shards: int) -> int:
+    """Номер шарда пользователя; не зависит от процесса и версии Python"""
+    return zlib.crc32(user_id.to_bytes(8, "big", signed=True)) % shards
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Файлы шардов рядом с основной базой: finance_bot.db -> finance_bot.shard0.db, ..."""
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext}" for i in range(shards)]
+
+
+class ShardedStorage(Storage):
+    """Хранилище из нескольких SQLite-файлов с маршрутизацией по user_id"""
+
+    def __init__(self, db_path: str = "data/finance_bot.db", shards: int = 4,
+                 group_commit: bool = False, query_stats: Optional[QueryStats] = None):
+        self.db_path = db_path
+        # Статистика запросов общая на все шарды: по методам, а не по файлам
+        self.query_stats = query_stats
+        self.shards = [
+            AsyncDatabaseManager(path, group_commit=group_commit, query_stats=query_stats)
+            for path in shard_paths(db_path, shards)
+        ]
+
+    def _shard(self, user_id: int) -> AsyncDatabaseManager:
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    async def _fan_out(self, method: str, *args) -> list:
+        """Параллельный вызов метода во всех шардах"""
+        return await asyncio.gather(*(getattr(shard, method)(*args) for shard in self.shards))
+
+    async def start(self):
+        await asyncio.gather(*(shard.start() for shard in self.shards))
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    # === ЗАПИСЬ ===
+
+    async def register_user(self, user_id: int, username: str = None, first_name: str = None) -> bool:
+        """Регистрация нового пользователя"""
+        return await self._shard(user_id).register_user(user_id, username, first_name)
+
+    async def add_transaction(self, user_id: int, amount: float, description: str,
+                              category: str, transaction_type: str) -> Optional[Tuple[Transaction, float]]:
+        """Добавление транзакции: (созданная транзакция, новый баланс) или None"""
+        return await self._shard(user_id).add_transaction(
+            user_id, amount, description, category, transaction_type
+        )
+
+    async def add_transactions_bulk(self, rows: Iterable[tuple], batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Массовый импорт: строки раскладываются по шардам, шарды пишут параллельно.
+
+        Транзакция у каждого шарда своя. Номера строк в failures - по
+        исходному порядку rows.
+        """
+        by_shard: Dict[int, Tuple[list, list]] = {}
+        failures = []
+        for index, row in enumerate(rows):
+            try:
+                shard = shard_index(int(row[0]), len(self.shards))
+            except (TypeError, ValueError, IndexError) as e:
+                failures.append((index, f"некорректный user_id: {e}"))
+                continue
+            indexes, shard_rows = by_shard.setdefault(shard, ([], []))
+            indexes.append(index)
+            shard_rows.append(row)
+
+        shards = list(by_shard)
+        results = await asyncio.gather(*(
+            self.shards[shard].add_transactions_bulk(by_shard[shard][1], batch_size) for shard in shards
+        ))
+        for shard, result in zip(shards, results):
+            indexes = by_shard[shard][0]
+            failures.extend((indexes[i], reason) for i, reason in result['failures'])
+        return {
+            'inserted': sum(r['inserted'] for r in results),
+            'failures': sorted(failures)
+        }
+
+    def record_activity(self, user_id: int):
+        """Отметка активности: копится в памяти шарда и пишется пакетом"""
+        self._shard(user_id).record_activity(user_id)
+
+    async def update_user_activity(self, user_id: int, username: str = None, first_name: str = None):
+        """Обновление активности пользователя"""
+        return await self._shard(user_id).update_user_activity(user_id, username, first_name)
+
+    async def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удаление транзакции по ID"""
+        return await self._shard(user_id).delete_transaction(transaction_id, user_id)
+
+    async def delete_transaction_returning(self, transaction_id: int,
+                                           user_id: int) -> Optional[Tuple[Transaction, float]]:
+        """Удаление транзакции: (удаленная транзакция, новый баланс) или None"""
+        return await self._shard(user_id).delete_transaction_returning(transaction_id, user_id)
+
+    async def check_user_balances(self, fix: bool = False) -> List[dict]:
+        """Сверка балансов во всех шардах"""
+        results = await self._fan_out("check_user_balances", fix)
+        return sorted((m for mismatches in results for m in mismatches), key=lambda m: m['user_id'])
+
+    async def archive_transactions(self, days: int) -> Dict[int, int]:
+        """Архивирование в каждом шарде (у шарда свои файлы архивов)"""
+        moved = Counter()
+        for shard_moved in await self._fan_out("archive_transactions", days):
+            moved.update(shard_moved)
+        return dict(moved)
+
+    async def build_search_index(self, rebuild: bool = False) -> int:
+        """Достройка поискового индекса в каждом шарде"""
+        return sum(await self._fan_out("build_search_index", rebuild))
+
+    # === ЧТЕНИЕ ПО ПОЛЬЗОВАТЕЛЮ ===
+
+    async def is_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации пользователя"""
+        return await self._shard(user_id).is_user_registered(user_id)
+
+    async def get_user_transaction_stats(self, user_id: int) -> dict:
+        """Статистика транзакций конкретного пользователя"""
+        return await self._shard(user_id).get_user_transaction_stats(user_id)
+
+    async def get_user_balance(self, user_id: int) -> float:
+        """Получение баланса пользователя"""
+        return await self._shard(user_id).get_user_balance(user_id)
+
+    async def get_transactions(self, user_id: int, days: int = 30,
+                               limit: Optional[int] = None) -> List[Transaction]:
+        """Получение транзакций за период (новые первыми)"""
+        return await self._shard(user_id).get_transactions(user_id, days, limit)
+
+    async def get_transaction_batch(self, user_id: int, days: int = 30,
+                                    limit: Optional[int] = None) -> TransactionBatch:
+        """Транзакции за период в колоночном виде (новые первыми)"""
+        return await self._shard(user_id).get_transaction_batch(user_id, days, limit)
+
+    async def iter_transactions(self, user_id: int, days: int = 30,
+                                chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Transaction]:
+        """Потоковое чтение транзакций за период"""
+        async for transaction in self._shard(user_id).iter_transactions(user_id, days, chunk_size):
+            yield transaction
+
+    async def get_category_stats(self, user_id: int, days: int = 30) -> Dict[str, Dict]:
+        """Статистика по категориям"""
+        return await self._shard(user_id).get_category_stats(user_id, days)
+
+    async def get_history_page(self, user_id: int, after: Optional[Tuple[datetime, int]] = None,
+                               before: Optional[Tuple[datetime, int]] = None,
+                               limit: int = HISTORY_PAGE_SIZE) -> dict:
+        """Страница истории транзакций (новые первыми)"""
+        return await self._shard(user_id).get_history_page(user_id, after, before, limit)
+
+    async def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Transaction]:
+        """Получение транзакции пользователя по ID"""
+        return await self._shard(user_id).get_transaction_by_id(transaction_id, user_id)
+
+    async def get_last_transaction(self, user_id: int) -> Optional[Transaction]:
+        """Получение последней транзакции пользователя"""
+        return await self._shard(user_id).get_last_transaction(user_id)
+
+    async def get_recent_transactions_for_deletion(self, user_id: int, limit: int = 10) -> List[Transaction]:
+        """Получение последних транзакций для удаления"""
+        return await self._shard(user_id).get_recent_transactions_for_deletion(user_id, limit)
+
+    async def search_transactions(self, user_id: int, query: str, since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None, after: Optional[int] = None,
+                                  before: Optional[int] = None, limit: int = SEARCH_PAGE_SIZE) -> dict:
+        """Поиск транзакций пользователя по словам описания"""
+        return await self._shard(user_id).search_transactions(
+            user_id, query, since, until, after, before, limit
+        )
+
+    # === ОБЩИЕ (ВСЕ ШАРДЫ) ===
+
+    def get_user_cache_stats(self) -> dict:
+        """Счетчики кэшей пользователей, суммарно по шардам"""
+        stats = [shard.get_user_cache_stats() for shard in self.shards]
+        return {
+            'size': sum(s['size'] for s in stats),
+            'capacity': sum(s['capacity'] for s in stats),
+            'complete': all(s['complete'] for s in stats),
+            'hits': sum(s['hits'] for s in stats),
+            'misses': sum(s['misses'] for s in stats)
+        }
+
+    def get_query_stats(self) -> Optional[dict]:
+        """Статистика запросов всех шардов"""
+        return self.query_stats.snapshot() if self.query_stats is not None else None
+
+    async def explain_slow_queries(self):
+        """Журнал общий для шардов: каждая запись знает свой шард, хватит одного потока"""
+        await self.shards[0].explain_slow_queries()
+
+    async def get_user_stats(self) -> dict:
+        """Статистика пользователей (для админов)"""
+        results = await self._fan_out("get_user_stats")
+        return {key: sum(stats[key] for stats in results) for key in ("total", "active_7d", "new_30d")}
+
+    async def get_detailed_users_list(self) -> list:
+        """Подробный список пользователей (для админов)"""
+        results = await self._fan_out("get_detailed_users_list")
+        users = [user for shard_users in results for user in shard_users]
+        users.sort(key=lambda u: u['last_activity'] or '', reverse=True)
+        return users
+
+    async def get_users_page(self, after: Optional[Tuple[str, int]] = None,
+                             before: Optional[Tuple[str, int]] = None,
+                             limit: int = USERS_PAGE_SIZE) -> dict:
+        """Страница пользователей: ключ (last_activity, user_id) общий для всех шардов"""
+        pages = await self._fan_out("get_users_page", after, before, limit)
+        users = sorted(
+            (user for page in pages for user in page['users']),
+            key=lambda u: (u['last_activity'], u['user_id']), reverse=True
+        )
+        if before is not None:
+            # Ближайшие к ключу - в конце списка
+            more = len(users) > limit or any(page['has_prev'] for page in pages)
+            return {'users': users[-limit:], 'has_prev': more, 'has_next': True}
+        more = len(users) > limit or any(page['has_next'] for page in pages)
+        return {'users': users[:limit], 'has_prev': after is not None, 'has_next': more}
+
+    async def get_admin_analytics(self) -> dict:
+        """Админская аналитика: данные шардов складываются"""
+        results = await self._fan_out("get_admin_analytics")
+
+        totals = {
+            key: sum(r[key] for r in results)
+            for key in ('total_transactions', 'active_users_with_transactions', 'total_registered',
+                        'active_7d', 'new_30d', 'ai_categorized', 'ai_uncategorized')
+        }
+
+        # Категории: складываем счетчики, процент - от общего числа транзакций
+        category_counts = Counter()
+        for r in results:
+            for category, count, _ in r['popular_categories']:
+                category_counts[category] += count
+        total = totals['total_transactions']
+        popular_categories = [
+            (category, count, round(count * 100.0 / total, 1) if total else 0)
+            for category, count in category_counts.most_common(10)
+        ]
+
+        daily = Counter()
+        income = Counter()
+        expense = Counter()
+        for r in results:
+            for day, operations in r['daily_activity']:
+                daily[day] += operations
+            for day, day_income, day_expense in r['financial_activity']:
+                income[day] += day_income or 0
+                expense[day] += day_expense or 0
+
+        user_segments = Counter()
+        for r in results:
+            user_segments.update(r['user_segments'])
+        top_users = sorted(
+            (user for r in results for user in r['top_users']),
+            key=lambda u: u[2], reverse=True
+        )[:10]
+
+        return {
+            **totals,
+            'popular_categories': popular_categories,
+            'user_segments': dict(user_segments),
+            'daily_activity': sorted(daily.items(), reverse=True),
+            'financial_activity': [(day, income[day], expense[day]) for day in sorted(income, reverse=True)],
+            'top_users': top_users
+        }
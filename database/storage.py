@@ -0,0 +1,177 @@
+# database/storage.py
+"""
+Интерфейс хранилища, от которого зависят обработчики бота.
+
+Реализации:
+    AsyncDatabaseManager (database/async_db_manager.py) - SQLite-файл;
+    ShardedStorage (database/sharded_storage.py)        - несколько SQLite-файлов;
+    PostgresStorage (database/postgres_storage.py)      - PostgreSQL через asyncpg.
+
+Какую выбрать, решает create_storage по Config.DATABASE_URL.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from database.db_manager import BULK_BATCH_SIZE, HISTORY_PAGE_SIZE, SEARCH_PAGE_SIZE, STREAM_CHUNK_SIZE, USERS_PAGE_SIZE
+from database.models import Transaction, TransactionBatch
+from database.query_stats import QueryStats
+
+
+class Storage(ABC):
+    """Асинхронное хранилище пользователей и транзакций"""
+
+    async def start(self):
+        """Подготовка к работе (пул соединений, миграции); по умолчанию ничего"""
+
+    @abstractmethod
+    async def close(self):
+        """Запись буферов и закрытие соединений"""
+
+    # === ЗАПИСЬ ===
+
+    @abstractmethod
+    async def register_user(self, user_id: int, username: str = None, first_name: str = None) -> bool:
+        """Регистрация нового пользователя"""
+
+    @abstractmethod
+    async def add_transaction(self, user_id: int, amount: float, description: str,
+                              category: str, transaction_type: str) -> Optional[Tuple[Transaction, float]]:
+        """Добавление транзакции: (созданная транзакция, новый баланс) или None"""
+
+    @abstractmethod
+    async def add_transactions_bulk(self, rows: Iterable[tuple], batch_size: int = BULK_BATCH_SIZE) -> dict:
+        """Массовый импорт пачками в одной транзакции: {'inserted', 'failures': [(номер, причина)]}"""
+
+    @abstractmethod
+    def record_activity(self, user_id: int):
+        """Отметка активности: копится в памяти и пишется пакетом"""
+
+    @abstractmethod
+    async def update_user_activity(self, user_id: int, username: str = None, first_name: str = None):
+        """Обновление активности пользователя"""
+
+    @abstractmethod
+    async def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удаление транзакции по ID"""
+
+    @abstractmethod
+    async def delete_transaction_returning(self, transaction_id: int,
+                                           user_id: int) -> Optional[Tuple[Transaction, float]]:
+        """Удаление транзакции: (удаленная транзакция, новый баланс) или None"""
+
+    @abstractmethod
+    async def check_user_balances(self, fix: bool = False) -> List[dict]:
+        """Сверка таблицы балансов с транзакциями"""
+
+    async def archive_transactions(self, days: int) -> Dict[int, int]:
+        """Перенос транзакций старше days дней в архив: {год: строк}; по умолчанию архива нет"""
+        return {}
+
+    async def build_search_index(self, rebuild: bool = False) -> int:
+        """Достройка (rebuild=True - перестройка) поискового индекса; по умолчанию его ведет сама база"""
+        return 0
+
+    # === ЧТЕНИЕ ===
+
+    @abstractmethod
+    async def is_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации пользователя"""
+
+    @abstractmethod
+    def get_user_cache_stats(self) -> dict:
+        """Счетчики кэша зарегистрированных пользователей"""
+
+    def get_query_stats(self) -> Optional[dict]:
+        """Время вызовов по методам и журнал медленных (QueryStats.snapshot); None - не ведется"""
+        return None
+
+    async def explain_slow_queries(self):
+        """Планы запросов журнала медленных (перед get_query_stats для показа); по умолчанию ничего"""
+
+    @abstractmethod
+    async def get_user_stats(self) -> dict:
+        """Статистика пользователей (для админов)"""
+
+    @abstractmethod
+    async def get_detailed_users_list(self) -> list:
+        """Подробный список пользователей (для админов)"""
+
+    @abstractmethod
+    async def get_users_page(self, after: Optional[Tuple[str, int]] = None,
+                             before: Optional[Tuple[str, int]] = None,
+                             limit: int = USERS_PAGE_SIZE) -> dict:
+        """Страница пользователей со статистикой: {'users', 'has_prev', 'has_next'}"""
+
+    @abstractmethod
+    async def get_user_transaction_stats(self, user_id: int) -> dict:
+        """Статистика транзакций конкретного пользователя"""
+
+    @abstractmethod
+    async def get_user_balance(self, user_id: int) -> float:
+        """Получение баланса пользователя"""
+
+    @abstractmethod
+    async def get_transactions(self, user_id: int, days: int = 30,
+                               limit: Optional[int] = None) -> List[Transaction]:
+        """Получение транзакций за период (новые первыми)"""
+
+    @abstractmethod
+    async def get_transaction_batch(self, user_id: int, days: int = 30,
+                                    limit: Optional[int] = None) -> TransactionBatch:
+        """Транзакции за период в колоночном виде (новые первыми)"""
+
+    @abstractmethod
+    def iter_transactions(self, user_id: int, days: int = 30,
+                          chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Transaction]:
+        """Потоковое чтение транзакций за период (новые первыми)"""
+
+    @abstractmethod
+    async def get_category_stats(self, user_id: int, days: int = 30) -> Dict[str, Dict]:
+        """Статистика по категориям"""
+
+    @abstractmethod
+    async def get_history_page(self, user_id: int, after: Optional[Tuple[datetime, int]] = None,
+                               before: Optional[Tuple[datetime, int]] = None,
+                               limit: int = HISTORY_PAGE_SIZE) -> dict:
+        """Страница истории, keyset по (created_at, id): {'transactions', 'has_prev', 'has_next'}"""
+
+    @abstractmethod
+    async def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Transaction]:
+        """Получение транзакции пользователя по ID"""
+
+    @abstractmethod
+    async def get_last_transaction(self, user_id: int) -> Optional[Transaction]:
+        """Получение последней транзакции пользователя"""
+
+    @abstractmethod
+    async def get_recent_transactions_for_deletion(self, user_id: int, limit: int = 10) -> List[Transaction]:
+        """Получение последних транзакций для удаления"""
+
+    @abstractmethod
+    async def search_transactions(self, user_id: int, query: str, since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None, after: Optional[int] = None,
+                                  before: Optional[int] = None, limit: int = SEARCH_PAGE_SIZE) -> dict:
+        """Поиск по описаниям: {'transactions', 'count', 'income', 'expense', 'has_prev', 'has_next'}"""
+
+    @abstractmethod
+    async def get_admin_analytics(self) -> dict:
+        """Агрегированные данные для админской аналитики"""
+
+
+def create_storage(config) -> Storage:
+    """Хранилище по настройкам: postgres://... - PostgreSQL, DB_SHARDS > 1 - шарды, иначе SQLite-файл"""
+    if config.DATABASE_URL.startswith(("postgres://", "postgresql://")):
+        # asyncpg нужен только этому варианту - импортируем по требованию
+        from database.postgres_storage import PostgresStorage
+        return PostgresStorage(config.DATABASE_URL)
+
+    query_stats = QueryStats(config.DB_SLOW_QUERY_MS) if config.DB_QUERY_STATS else None
+    if config.DB_SHARDS > 1:
+        from database.sharded_storage import ShardedStorage
+        return ShardedStorage(config.DATABASE_PATH, config.DB_SHARDS, group_commit=config.DB_GROUP_COMMIT,
+                              query_stats=query_stats)
+
+    from database.async_db_manager import AsyncDatabaseManager
+    return AsyncDatabaseManager(config.DATABASE_PATH, group_commit=config.DB_GROUP_COMMIT,
+                                query_stats=query_stats)
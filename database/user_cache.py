@@ -0,0 +1,67 @@
+# database/user_cache.py
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# Сколько ID активных пользователей держать в памяти
+USER_CACHE_CAPACITY = 100_000
+
+
+class RegisteredUserCache:
+    """Ограниченный LRU-кэш ID зарегистрированных активных пользователей.
+
+    Если при прогреве в кэш поместились все активные пользователи, кэш
+    считается полным: отсутствие ID в нем означает «не зарегистрирован»
+    без запроса к базе. После первого вытеснения это уже не так.
+    """
+
+    def __init__(self, capacity: int = USER_CACHE_CAPACITY):
+        self.capacity = capacity
+        self._users: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.complete = False
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self, user_ids: Iterable[int], complete: bool):
+        """Заполнение кэша при старте"""
+        with self._lock:
+            self._users.clear()
+            for user_id in user_ids:
+                self._users[user_id] = None
+            self.complete = complete and len(self._users) <= self.capacity
+            self._evict()
+
+    def lookup(self, user_id: int) -> Optional[bool]:
+        """True/False - ответ из кэша, None - нужно спросить базу"""
+        with self._lock:
+            if user_id in self._users:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return True
+            if self.complete:
+                self.hits += 1
+                return False
+            self.misses += 1
+            return None
+
+    def add(self, user_id: int):
+        with self._lock:
+            self._users[user_id] = None
+            self._users.move_to_end(user_id)
+            self._evict()
+
+    def _evict(self):
+        while len(self._users) > self.capacity:
+            self._users.popitem(last=False)
+            self.complete = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._users),
+                'capacity': self.capacity,
+                'complete': self.complete,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -1,12 +1,12 @@
 # handlers/delete_transactions.py
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from database.db_manager import DatabaseManager
+from database.storage import Storage
 from datetime import datetime
 
 class DeleteHandler:
     """Обработчик удаления транзакций"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: Storage):
         self.db = db_manager
     
     async def handle_delete_last(self, message: Message):
@@ -14,7 +14,7 @@ class DeleteHandler:
         user_id = message.from_user.id
         
         # Получаем последнюю транзакцию
-        last_transaction = self.db.get_last_transaction(user_id)
+        last_transaction = await self.db.get_last_transaction(user_id)
         
         if not last_transaction:
             await message.answer("❌ Нет транзакций для удаления")
@@ -47,7 +47,7 @@ class DeleteHandler:
         user_id = message.from_user.id
         
         # Получаем последние 10 транзакций
-        transactions = self.db.get_recent_transactions_for_deletion(user_id, 10)
+        transactions = await self.db.get_recent_transactions_for_deletion(user_id, 10)
         
         if not transactions:
             await message.answer("❌ Нет транзакций для удаления")
@@ -97,8 +97,7 @@ class DeleteHandler:
             transaction_id = int(data.split("_")[2])
             
             # Получаем информацию о транзакции
-            transactions = self.db.get_recent_transactions_for_deletion(user_id, 50)
-            transaction = next((t for t in transactions if t.id == transaction_id), None)
+            transaction = await self.db.get_transaction_by_id(transaction_id, user_id)
             
             if not transaction:
                 await callback.message.edit_text("❌ Транзакция не найдена")
@@ -132,22 +131,11 @@ class DeleteHandler:
             # Подтверждение удаления
             transaction_id = int(data.split("_")[2])
             
-            # Получаем информацию до удаления для отчета
-            transactions = self.db.get_recent_transactions_for_deletion(user_id, 50)
-            transaction = next((t for t in transactions if t.id == transaction_id), None)
+            # Удаляем транзакцию и получаем ее данные и новый баланс одним запросом
+            result = await self.db.delete_transaction_returning(transaction_id, user_id)
             
-            if not transaction:
-                await callback.message.edit_text("❌ Транзакция не найдена")
-                await callback.answer()
-                return
-            
-            # Удаляем транзакцию
-            success = self.db.delete_transaction(transaction_id, user_id)
-            
-            if success:
-                # Получаем новый баланс
-                new_balance = self.db.get_user_balance(user_id)
-                
+            if result:
+                transaction, new_balance = result
                 sign = "+" if transaction.transaction_type == "income" else "-"
                 
                 await callback.message.edit_text(
@@ -157,7 +145,7 @@ class DeleteHandler:
                     parse_mode="Markdown"
                 )
             else:
-                await callback.message.edit_text("❌ Ошибка удаления транзакции")
+                await callback.message.edit_text("❌ Транзакция не найдена")
             
             await callback.answer()
     
@@ -0,0 +1,72 @@
+# handlers/history.py
+from datetime import datetime, timedelta
+
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from database.models import Transaction
+from database.storage import Storage
+
+# Начало epoch-времени (naive UTC, как created_at в базе)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    """Ключ строки (created_at, id) для callback_data: микросекунды epoch и ID"""
+    return f"{(transaction.created_at - _EPOCH) // _MICROSECOND}:{transaction.id}"
+
+
+def decode_cursor(microseconds: str, transaction_id: str):
+    return _EPOCH + int(microseconds) * _MICROSECOND, int(transaction_id)
+
+
+class HistoryHandler:
+    """История транзакций с листанием: /history"""
+
+    def __init__(self, db_manager: Storage):
+        self.db = db_manager
+
+    async def handle_history(self, message: Message):
+        """Первая страница истории (самые новые операции)"""
+        page = await self.db.get_history_page(message.from_user.id)
+        if not page['transactions']:
+            await message.answer("📭 У вас пока нет транзакций")
+            return
+
+        text, keyboard = self._format_page(page)
+        await message.answer(text, reply_markup=keyboard)
+
+    async def handle_history_callback(self, callback: CallbackQuery):
+        """Листание истории (кнопки ◀️ ▶️)"""
+        _, direction, microseconds, transaction_id = callback.data.split(":")
+        key = decode_cursor(microseconds, transaction_id)
+        if direction == "p":
+            page = await self.db.get_history_page(callback.from_user.id, before=key)
+        else:
+            page = await self.db.get_history_page(callback.from_user.id, after=key)
+
+        if not page['transactions']:
+            await callback.message.edit_text("📭 Транзакций больше нет")
+            return
+        text, keyboard = self._format_page(page)
+        await callback.message.edit_text(text, reply_markup=keyboard)
+
+    def _format_page(self, page: dict):
+        """Текст страницы истории и кнопки листания"""
+        lines = ["📜 История операций:\n"]
+        for t in page['transactions']:
+            sign = "+" if t.transaction_type == "income" else "-"
+            date_str = t.created_at.strftime('%d.%m.%Y %H:%M')
+            lines.append(f"{date_str}  {sign}{t.amount:,.0f} ₸  {t.description} ({t.category})")
+
+        # В callback_data - ключ крайней строки страницы (лимит 64 байта)
+        buttons = []
+        if page['has_prev']:
+            buttons.append(InlineKeyboardButton(
+                text="◀️ Новее", callback_data=f"hist:p:{encode_cursor(page['transactions'][0])}"
+            ))
+        if page['has_next']:
+            buttons.append(InlineKeyboardButton(
+                text="Старее ▶️", callback_data=f"hist:n:{encode_cursor(page['transactions'][-1])}"
+            ))
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+        return "\n".join(lines), keyboard
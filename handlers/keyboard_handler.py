@@ -1,5 +1,7 @@
 # handlers/keyboard_handler.py
+import calendar
 import os
+import time
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, Message
 from aiogram import types
 from config import Config
@@ -73,7 +75,7 @@ class KeyboardHandler:
         is_admin = user_id in self.config.ADMIN_USERS
         
         if text == "💰 Баланс":
-            balance = db_manager.get_user_balance(user_id)
+            balance = await db_manager.get_user_balance(user_id)
             await message.answer(
                 "💳 **Ваш текущий баланс**\n\n"
                 f"💰 {balance:,.0f} ₸",
@@ -92,8 +94,7 @@ class KeyboardHandler:
         elif text == "👑 Админка" and is_admin:
             # Детальная админская панель
             try:
-                stats = db_manager.get_user_stats()
-                users_list = db_manager.get_detailed_users_list()
+                stats = await db_manager.get_user_stats()
                 
                 # Сначала отправляем общую статистику
                 await message.answer(
@@ -107,58 +108,11 @@ class KeyboardHandler:
                     f"• Статус: sudo systemctl status finance-bot"
                 )
                 
-                # Затем отправляем список пользователей (простой формат)
-                if users_list:
-                    users_info = []
-                    for user in users_list[:10]:
-                        user_id_info = user['user_id']
-                        username = f"@{user['username']}" if user['username'] else "без username"
-                        first_name = user['first_name'] or "Имя не указано"
-                        
-                        # Получаем статистику транзакций
-                        user_stats = db_manager.get_user_transaction_stats(user_id_info)
-                        
-                        # Простое форматирование без markdown
-                        balance_str = f"{user_stats['balance']:,.0f}"
-                        
-                        user_info = (
-                            f"ID: {user_id_info}\n"
-                            f"Имя: {first_name}\n"
-                            f"Username: {username}\n"
-                            f"Баланс: {balance_str} тенге\n"
-                            f"Операций: {user_stats['transactions']}"
-                        )
-                        users_info.append(user_info)
-                    
-                    # Отправляем по частям если много пользователей
-                    users_text = "\n\n".join(users_info)
-                    
-                    if len(users_text) > 3500:
-                        # Разбиваем на части
-                        for i in range(0, len(users_list[:10]), 3):
-                            chunk_users = users_list[i:i+3]
-                            chunk_info = []
-                            
-                            for user in chunk_users:
-                                user_id_info = user['user_id']
-                                username = f"@{user['username']}" if user['username'] else "без username"
-                                first_name = user['first_name'] or "Имя не указано"
-                                user_stats = db_manager.get_user_transaction_stats(user_id_info)
-                                balance_str = f"{user_stats['balance']:,.0f}"
-                                
-                                user_info = (
-                                    f"ID: {user_id_info}\n"
-                                    f"Имя: {first_name}\n"
-                                    f"Username: {username}\n"
-                                    f"Баланс: {balance_str} тенге\n"
-                                    f"Операций: {user_stats['transactions']}"
-                                )
-                                chunk_info.append(user_info)
-                            
-                            chunk_text = "\n\n".join(chunk_info)
-                            await message.answer(f"👤 ПОЛЬЗОВАТЕЛИ (часть {i//3 + 1}):\n\n{chunk_text}")
-                    else:
-                        await message.answer(f"👤 СПИСОК ПОЛЬЗОВАТЕЛЕЙ:\n\n{users_text}")
+                # Затем первая страница пользователей с кнопками листания
+                page = await db_manager.get_users_page()
+                if page['users']:
+                    page_text, keyboard = self._format_users_page(page)
+                    await message.answer(page_text, reply_markup=keyboard)
                 else:
                     await message.answer("👤 Пользователи не найдены")
                     
@@ -223,116 +177,95 @@ class KeyboardHandler:
         
         return True  # Вернуть True если кнопка обработана
     
+    def _format_users_page(self, page: dict):
+        """Текст страницы пользователей и кнопки листания"""
+        users_info = []
+        for user in page['users']:
+            username = f"@{user['username']}" if user['username'] else "без username"
+            first_name = user['first_name'] or "Имя не указано"
+            
+            # Простое форматирование без markdown
+            users_info.append(
+                f"ID: {user['user_id']}\n"
+                f"Имя: {first_name}\n"
+                f"Username: {username}\n"
+                f"Баланс: {user['balance']:,.0f} тенге\n"
+                f"Операций: {user['transactions']}"
+            )
+        text = "👤 ПОЛЬЗОВАТЕЛИ:\n\n" + "\n\n".join(users_info)
+        
+        # В callback_data - ключ крайней строки страницы: время в epoch и ID (лимит 64 байта)
+        buttons = []
+        if page['has_prev']:
+            first = page['users'][0]
+            buttons.append(types.InlineKeyboardButton(
+                text="⬅️ Назад", callback_data=f"admin_users:p:{self._users_key(first)}"
+            ))
+        if page['has_next']:
+            last = page['users'][-1]
+            buttons.append(types.InlineKeyboardButton(
+                text="Далее ➡️", callback_data=f"admin_users:n:{self._users_key(last)}"
+            ))
+        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+        return text, keyboard
+    
+    @staticmethod
+    def _users_key(user: dict) -> str:
+        activity = time.strptime(user['last_activity'], '%Y-%m-%d %H:%M:%S')
+        return f"{calendar.timegm(activity)}:{user['user_id']}"
+    
+    async def handle_users_page_callback(self, callback: types.CallbackQuery, db_manager):
+        """Листание админского списка пользователей (кнопки Назад/Далее)"""
+        if callback.from_user.id not in self.config.ADMIN_USERS:
+            return
+        
+        _, direction, epoch, user_id = callback.data.split(":")
+        key = (time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(epoch))), int(user_id))
+        if direction == "p":
+            page = await db_manager.get_users_page(before=key)
+        else:
+            page = await db_manager.get_users_page(after=key)
+        
+        if not page['users']:
+            await callback.message.edit_text("👤 Пользователи не найдены")
+            return
+        text, keyboard = self._format_users_page(page)
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    
     async def _create_admin_analytics_report(self, db_manager) -> str:
         """Создание детального аналитического отчета для админа"""
         
-        import sqlite3
-        import os
-        from datetime import datetime, timedelta
-        
-        conn = sqlite3.connect(db_manager.db_path)
-        cursor = conn.cursor()
+        from datetime import datetime
         
         # Дата создания отчета
         report_date = datetime.now().strftime('%d.%m.%Y %H:%M')
         
-        # === ОБЩАЯ СТАТИСТИКА ===
-        cursor.execute("SELECT COUNT(*) FROM transactions")
-        total_transactions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM transactions")
-        active_users_with_transactions = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_registered = cursor.fetchone()[0]
+        # Все запросы выполняются в потоке-читателе, не блокируя бота
+        analytics = await db_manager.get_admin_analytics()
         
-        # === АКТИВНОСТЬ ПОЛЬЗОВАТЕЛЕЙ ===
-        # Активные за последние 7 дней
-        cursor.execute("""
-            SELECT COUNT(*) FROM users 
-            WHERE last_activity >= datetime('now', '-7 days')
-        """)
-        active_7d = cursor.fetchone()[0]
-        
-        # Новые за последние 30 дней
-        cursor.execute("""
-            SELECT COUNT(*) FROM users 
-            WHERE registration_date >= datetime('now', '-30 days') 
-            OR (registration_date IS NULL AND created_at >= datetime('now', '-30 days'))
-        """)
-        new_30d = cursor.fetchone()[0]
+        total_transactions = analytics['total_transactions']
+        active_users_with_transactions = analytics['active_users_with_transactions']
+        total_registered = analytics['total_registered']
+        active_7d = analytics['active_7d']
+        new_30d = analytics['new_30d']
+        popular_categories = analytics['popular_categories']
+        daily_activity = analytics['daily_activity']
+        financial_activity = analytics['financial_activity']
+        ai_categorized = analytics['ai_categorized']
+        ai_uncategorized = analytics['ai_uncategorized']
         
         # Средние операции на пользователя
         avg_operations = round(total_transactions / max(active_users_with_transactions, 1), 1)
         
-        # === ПОПУЛЯРНЫЕ КАТЕГОРИИ ===
-        cursor.execute("""
-            SELECT category, COUNT(*) as count, 
-                   ROUND(COUNT(*) * 100.0 / ?, 1) as percentage
-            FROM transactions 
-            WHERE transaction_type = 'expense'
-            GROUP BY category 
-            ORDER BY count DESC 
-            LIMIT 10
-        """, (total_transactions,))
-        
-        popular_categories = cursor.fetchall()
-        
-        # === СЕГМЕНТАЦИЯ ПОЛЬЗОВАТЕЛЕЙ ===
-        cursor.execute("""
-            SELECT 
-                user_id,
-                COUNT(*) as trans_count
-            FROM transactions 
-            GROUP BY user_id
-            ORDER BY trans_count DESC
-        """)
-        
-        user_segments = cursor.fetchall()
-        high_activity = len([u for u in user_segments if u[1] >= 10])
-        medium_activity = len([u for u in user_segments if 3 <= u[1] < 10])
-        low_activity = len([u for u in user_segments if u[1] < 3])
-        inactive_users = total_registered - len(user_segments)
-        
-        # === ВРЕМЕННАЯ АКТИВНОСТЬ (последние 7 дней) ===
-        cursor.execute("""
-            SELECT 
-                date(created_at) as day,
-                COUNT(*) as operations
-            FROM transactions 
-            WHERE created_at >= datetime('now', '-7 days')
-            GROUP BY date(created_at)
-            ORDER BY day DESC
-        """)
-        
-        daily_activity = cursor.fetchall()
-        
-        # === ДОХОДЫ И РАСХОДЫ ПО ДНЯМ ===
-        cursor.execute("""
-            SELECT 
-                date(created_at) as day,
-                SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) as income,
-                SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END) as expense
-            FROM transactions 
-            WHERE created_at >= datetime('now', '-7 days')
-            GROUP BY date(created_at)
-            ORDER BY day DESC
-        """)
-        
-        financial_activity = cursor.fetchall()
-        
-        # === AI ЭФФЕКТИВНОСТЬ (примерная) ===
-        # Считаем сколько транзакций обработано AI
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE category != 'другое'")
-        ai_categorized = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM transactions WHERE category = 'другое'")
-        ai_uncategorized = cursor.fetchone()[0]
+        # Сегментация пользователей
+        user_segments = analytics['user_segments']
+        high_activity = user_segments['high']
+        medium_activity = user_segments['medium']
+        low_activity = user_segments['low']
+        inactive_users = total_registered - active_users_with_transactions
         
         ai_success_rate = round((ai_categorized / max(total_transactions, 1)) * 100, 1)
         
-        conn.close()
-        
         # === ФОРМИРОВАНИЕ ОТЧЕТА ===
         report_content = f"""
 ═══════════════════════════════════════════════════════════════
@@ -394,18 +327,10 @@ class KeyboardHandler:
 """
         
         # Добавляем топ пользователей
-        for i, (user_id, trans_count) in enumerate(user_segments[:10], 1):
-            # Получаем имя пользователя
-            conn = sqlite3.connect(db_manager.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT first_name, username FROM users WHERE user_id = ?", (user_id,))
-            user_info = cursor.fetchone()
-            conn.close()
-            
-            if user_info:
-                name = user_info[0] or "Без имени"
-                username = f"@{user_info[1]}" if user_info[1] else "без username"
-                report_content += f"{i:>2}. {name:<12} {username:<15} {trans_count:>3} операций\n"
+        for i, (first_name, username, trans_count) in enumerate(analytics['top_users'], 1):
+            name = first_name or "Без имени"
+            username = f"@{username}" if username else "без username"
+            report_content += f"{i:>2}. {name:<12} {username:<15} {trans_count:>3} операций\n"
         
         report_content += f"""
 
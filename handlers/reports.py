@@ -1,15 +1,21 @@
 # handlers/reports.py
+import csv
 import os
 from datetime import datetime, timedelta
 from aiogram.types import Message, FSInputFile
 from aiogram import types
-from database.db_manager import DatabaseManager
+from database.storage import Storage
+from database.models import TransactionBatch
 from ai.openrouter_client import OpenRouterClient
 
+# Сколько последних транзакций показывать в детальном отчете
+RECENT_TRANSACTIONS = 20
+
+
 class ReportHandler:
     """Обработчик отчетов и статистики"""
     
-    def __init__(self, db_manager: DatabaseManager, ai_client: OpenRouterClient):
+    def __init__(self, db_manager: Storage, ai_client: OpenRouterClient):
         self.db = db_manager
         self.ai = ai_client
     
@@ -55,18 +61,21 @@ class ReportHandler:
         
         await callback.message.edit_text("📊 Генерирую отчет...")
         
-        # Получаем транзакции
-        transactions = self.db.get_transactions(user_id, days)
+        # Итоги по категориям берем из сводок, строки - только последние 20
+        # (вся история за период - это /export)
+        category_stats = await self.db.get_category_stats(user_id, days)
         
-        if not transactions:
+        if not category_stats:
             await callback.message.edit_text(
                 f"📭 Нет транзакций за {period_name}"
             )
             return
         
+        recent_transactions = await self.db.get_transaction_batch(user_id, days, limit=RECENT_TRANSACTIONS)
+        
         # Генерируем отчет
         report_path = await self._create_detailed_report(
-            user_id, transactions, period_name
+            user_id, category_stats, recent_transactions, period_name, days
         )
         
         # Отправляем файл
@@ -84,33 +93,23 @@ class ReportHandler:
         
         await callback.answer()
     
-    async def _create_detailed_report(self, user_id: int, transactions: list, period: str) -> str:
+    async def _create_detailed_report(self, user_id: int, category_stats: dict,
+                                      recent_transactions: TransactionBatch, period: str,
+                                      days: int) -> str:
         """Создание детального TXT отчета с AI анализом"""
         
-        # Подготавливаем данные
-        total_income = sum(t.amount for t in transactions if t.transaction_type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.transaction_type == 'expense')
-        balance = total_income - total_expense
-        current_balance = self.db.get_user_balance(user_id)
-        
         # Группируем по категориям
-        income_by_category = {}
-        expense_by_category = {}
+        income_by_category = {c: v['income'] for c, v in category_stats.items() if v['income']}
+        expense_by_category = {c: v['expense'] for c, v in category_stats.items() if v['expense']}
         
-        for t in transactions:
-            if t.transaction_type == 'income':
-                income_by_category[t.category] = income_by_category.get(t.category, 0) + t.amount
-            else:
-                expense_by_category[t.category] = expense_by_category.get(t.category, 0) + t.amount
+        # Подготавливаем данные
+        total_income = sum(income_by_category.values())
+        total_expense = sum(expense_by_category.values())
+        balance = total_income - total_expense
+        current_balance = await self.db.get_user_balance(user_id)
         
         # Получаем AI анализ
-        ai_analysis = await self.ai.analyze_spending(transactions, len(transactions))
-        
-        # Создаем отчет
-        report_content = self._format_report(
-            period, total_income, total_expense, balance, current_balance,
-            income_by_category, expense_by_category, transactions, ai_analysis
-        )
+        ai_analysis = await self.ai.analyze_spending(category_stats, days)
         
         # Сохраняем в файл
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -120,14 +119,19 @@ class ReportHandler:
         # Создаем директорию если не существует
         os.makedirs("temp", exist_ok=True)
         
+        report_content = self._format_report(
+            period, total_income, total_expense, balance, current_balance,
+            income_by_category, expense_by_category, recent_transactions, ai_analysis
+        )
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(report_content)
         
         return filepath
     
     def _format_report(self, period: str, total_income: float, total_expense: float, 
-                      balance: float, current_balance: float, income_by_category: dict,
-                      expense_by_category: dict, transactions: list, ai_analysis: str) -> str:
+                       balance: float, current_balance: float, income_by_category: dict,
+                       expense_by_category: dict, transactions: TransactionBatch,
+                       ai_analysis: str) -> str:
         """Форматирование отчета"""
         
         report = f"""
@@ -167,16 +171,13 @@ class ReportHandler:
             report += "Расходов не найдено\n"
         
         report += f"""
-📋 ПОСЛЕДНИЕ ТРАНЗАКЦИИ
+📋 ПОСЛЕДНИЕ ТРАНЗАКЦИИ ({len(transactions)})
 ───────────────────────────────────────────────────────────────
 """
         
-        # Показываем последние 20 транзакций
-        recent_transactions = sorted(transactions, key=lambda x: x.created_at, reverse=True)[:20]
-        
-        for t in recent_transactions:
+        for t in transactions.rows():
             sign = "+" if t.transaction_type == "income" else "-"
-            date_str = t.created_at.strftime('%d.%m %H:%M')
+            date_str = t.created_at.strftime('%d.%m.%Y %H:%M')
             report += f"{date_str} | {sign}{t.amount:>8,.0f} ₸ | {t.description:<25} | {t.category}\n"
         
         report += f"""
@@ -192,23 +193,54 @@ class ReportHandler:
         
         return report
     
+    async def handle_export_request(self, message: Message):
+        """Выгрузка всех транзакций пользователя в CSV"""
+        
+        user_id = message.from_user.id
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = f"temp/transactions_{user_id}_{timestamp}.csv"
+        os.makedirs("temp", exist_ok=True)
+        
+        # Пишем построчно по мере чтения из базы; utf-8-sig - чтобы Excel понял кириллицу
+        count = 0
+        with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "date", "type", "amount", "category", "description"])
+            async for t in self.db.iter_transactions(user_id, 365 * 10):
+                writer.writerow([
+                    t.id, t.created_at.strftime('%Y-%m-%d %H:%M:%S'), t.transaction_type,
+                    t.amount, t.category, t.description
+                ])
+                count += 1
+        
+        if count == 0:
+            os.remove(filepath)
+            await message.answer("📭 Нет транзакций для выгрузки")
+            return
+        
+        await message.answer_document(
+            FSInputFile(filepath),
+            caption=f"📁 Выгрузка транзакций: {count}"
+        )
+        os.remove(filepath)
+    
     async def handle_stats_request(self, message: Message):
         """Быстрая статистика за месяц"""
         
         user_id = message.from_user.id
         
         # Получаем данные за месяц
-        transactions = self.db.get_transactions(user_id, 30)
-        category_stats = self.db.get_category_stats(user_id, 30)
-        balance = self.db.get_user_balance(user_id)
+        category_stats = await self.db.get_category_stats(user_id, 30)
+        balance = await self.db.get_user_balance(user_id)
         
-        if not transactions:
+        if not category_stats:
             await message.answer("📭 Нет транзакций за последний месяц")
             return
         
         # Считаем итоги
-        total_income = sum(t.amount for t in transactions if t.transaction_type == 'income')
-        total_expense = sum(t.amount for t in transactions if t.transaction_type == 'expense')
+        total_income = sum(v['income'] for v in category_stats.values())
+        total_expense = sum(v['expense'] for v in category_stats.values())
         
         # Топ категории расходов
         expense_categories = {k: v for k, v in category_stats.items() if v.get('expense', 0) > 0}
@@ -0,0 +1,160 @@
+# handlers/search.py
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from database.storage import Storage
+
+# Начала названий месяцев в любом падеже: «март», «марте», «марта»
+MONTH_PREFIXES = ("январ", "феврал", "март", "апрел", None, "июн",
+                  "июл", "август", "сентябр", "октябр", "ноябр", "декабр")
+MAY_FORMS = ("май", "мая", "мае")
+MONTH_NAMES = ("январь", "февраль", "март", "апрель", "май", "июнь",
+               "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь")
+
+# Относительные периоды: слово -> дней
+RELATIVE_PERIODS = {"неделя": 7, "неделю": 7, "месяц": 30, "год": 365}
+
+# Период числом: до 4 цифр ASCII. Число дней ограничено 10 годами, а число
+# от FIRST_YEAR до текущего года - это календарный год («такси 2024»)
+NUMBER_RE = re.compile(r"[0-9]{1,4}")
+MAX_PERIOD_DAYS = 3650
+FIRST_YEAR = 2000
+
+# Первая строка ответа; по ней кнопки листания восстанавливают запрос
+SEARCH_HEADER = "🔎 Поиск: "
+
+
+def _parse_period(word: str) -> Optional[Tuple[datetime, Optional[datetime], str]]:
+    """Период по слову: (since, until, название) или None, если это не период"""
+    # Границы периода - naive UTC, как created_at в базе
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if NUMBER_RE.fullmatch(word):
+        number = int(word)
+        if FIRST_YEAR <= number <= now.year:
+            return datetime(number, 1, 1), datetime(number + 1, 1, 1), f"{number} год"
+        days = min(number, MAX_PERIOD_DAYS)
+    else:
+        days = RELATIVE_PERIODS.get(word)
+    if days:
+        return now - timedelta(days=days), None, f"последние {days} дн."
+
+    month = None
+    if word in MAY_FORMS:
+        month = 5
+    else:
+        for number, prefix in enumerate(MONTH_PREFIXES, 1):
+            if prefix and word.startswith(prefix):
+                month = number
+                break
+    if month is None:
+        return None
+
+    # Месяц без года - последний прошедший или текущий
+    year = now.year if month <= now.month else now.year - 1
+    since = datetime(year, month, 1)
+    until = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return since, until, f"{MONTH_NAMES[month - 1]} {year}"
+
+
+def parse_search_args(args: str) -> Tuple[str, Optional[datetime], Optional[datetime], str]:
+    """Аргументы /search -> (запрос, since, until, название периода).
+
+    Период - последнее слово: число дней (не больше MAX_PERIOD_DAYS), год
+    («такси 2024»), «неделя», «месяц», «год» или название месяца
+    («такси март», «такси в марте»).
+    """
+    words = args.split()
+    if len(words) > 1:
+        period = _parse_period(words[-1].lower())
+        if period:
+            words = words[:-1]
+            if len(words) > 1 and words[-1].lower() in ("за", "в", "во"):
+                words = words[:-1]
+            return " ".join(words), *period
+    return " ".join(words), None, None, "весь период"
+
+
+class SearchHandler:
+    """Поиск транзакций по описанию: /search <запрос> [период]"""
+
+    def __init__(self, db_manager: Storage):
+        self.db = db_manager
+
+    async def handle_search(self, message: Message, args: Optional[str]):
+        """Первая страница результатов поиска"""
+        args = " ".join((args or "").split())
+        try:
+            query, since, until, period_name = parse_search_args(args)
+        except (ValueError, OverflowError) as e:
+            print(f"Ошибка разбора периода поиска {args!r}: {e}")
+            await message.answer("❌ Не понял период. Примеры: /search такси март, /search кофе 30")
+            return
+        if not query:
+            await message.answer(
+                "🔎 Укажите, что искать:\n"
+                "• /search такси\n"
+                "• /search такси март\n"
+                "• /search кофе 30"
+            )
+            return
+
+        page = await self.db.search_transactions(message.from_user.id, query, since, until)
+        text, keyboard = self._format_page(args, period_name, page)
+        await message.answer(text, reply_markup=keyboard)
+
+    async def handle_search_callback(self, callback: CallbackQuery):
+        """Листание результатов (кнопки Назад/Далее)"""
+        header = callback.message.text.split("\n", 1)[0]
+        if not header.startswith(SEARCH_HEADER):
+            return
+
+        args = header[len(SEARCH_HEADER):]
+        try:
+            query, since, until, period_name = parse_search_args(args)
+        except (ValueError, OverflowError) as e:
+            print(f"Ошибка разбора периода поиска {args!r}: {e}")
+            await callback.answer("❌ Не понял период запроса")
+            return
+        _, direction, transaction_id = callback.data.split(":")
+        if direction == "p":
+            page = await self.db.search_transactions(
+                callback.from_user.id, query, since, until, before=int(transaction_id)
+            )
+        else:
+            page = await self.db.search_transactions(
+                callback.from_user.id, query, since, until, after=int(transaction_id)
+            )
+
+        text, keyboard = self._format_page(args, period_name, page)
+        await callback.message.edit_text(text, reply_markup=keyboard)
+
+    def _format_page(self, args: str, period_name: str, page: dict):
+        """Текст страницы результатов и кнопки листания"""
+        lines = [
+            f"{SEARCH_HEADER}{args}",
+            f"📅 {period_name} · найдено: {page['count']}"
+        ]
+        if not page['transactions']:
+            lines.append("\n📭 Ничего не найдено")
+            return "\n".join(lines), None
+
+        lines.append(f"💸 Расходы: {page['expense']:,.0f} ₸  💰 Доходы: {page['income']:,.0f} ₸\n")
+        for t in page['transactions']:
+            sign = "+" if t.transaction_type == "income" else "-"
+            date_str = t.created_at.strftime('%d.%m.%Y')
+            lines.append(f"{date_str}  {sign}{t.amount:,.0f} ₸  {t.description} ({t.category})")
+
+        # В callback_data только ID крайней строки; запрос берется из первой строки сообщения
+        buttons = []
+        if page['has_prev']:
+            buttons.append(InlineKeyboardButton(
+                text="⬅️ Назад", callback_data=f"search:p:{page['transactions'][0].id}"
+            ))
+        if page['has_next']:
+            buttons.append(InlineKeyboardButton(
+                text="Далее ➡️", callback_data=f"search:n:{page['transactions'][-1].id}"
+            ))
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+        return "\n".join(lines), keyboard
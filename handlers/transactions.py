@@ -1,7 +1,7 @@
 # handlers/transactions.py
 import re
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from database.db_manager import DatabaseManager
+from database.storage import Storage
 from ai.openrouter_client import OpenRouterClient
 from config import Config
 from typing import Optional
@@ -9,7 +9,7 @@ from typing import Optional
 class TransactionHandler:
     """Обработчик транзакций"""
     
-    def __init__(self, db_manager: DatabaseManager, ai_client: OpenRouterClient):
+    def __init__(self, db_manager: Storage, ai_client: OpenRouterClient):
         self.db = db_manager
         self.ai = ai_client
         self.config = Config()
@@ -24,12 +24,8 @@ class TransactionHandler:
         if not await self._check_user_access(message):
             return
         
-        # Обновляем активность пользователя
-        self.db.update_user_activity(
-            user_id, 
-            message.from_user.username, 
-            message.from_user.first_name
-        )
+        # Отмечаем активность (запишется в базу пакетом)
+        self.db.record_activity(user_id)
         
         # Парсим транзакцию
         transaction_data = self._parse_transaction(text)
@@ -60,8 +56,8 @@ class TransactionHandler:
                 transaction_type = "expense"
                 category = "другое"
         
-        # Сохраняем в базу
-        success = self.db.add_transaction(
+        # Сохраняем в базу: сразу получаем созданную транзакцию и новый баланс
+        result = await self.db.add_transaction(
             user_id=user_id,
             amount=amount,
             description=description,
@@ -69,15 +65,11 @@ class TransactionHandler:
             transaction_type=transaction_type
         )
         
-        if not success:
+        if not result:
             await message.answer("❌ Ошибка сохранения транзакции")
             return
         
-        # Получаем ID последней транзакции для кнопки удаления
-        last_transaction = self.db.get_last_transaction(user_id)
-        
-        # Получаем новый баланс
-        balance = self.db.get_user_balance(user_id)
+        transaction, balance = result
         
         # Формируем ответ
         emoji = "💰" if transaction_type == "income" else "💸"
@@ -92,14 +84,12 @@ class TransactionHandler:
         )
         
         # Создаем кнопку быстрого удаления
-        keyboard = None
-        if last_transaction:
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(
-                    text="🗑 Удалить эту транзакцию", 
-                    callback_data=f"delete_confirm_{last_transaction.id}"
-                )]
-            ])
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🗑 Удалить эту транзакцию", 
+                callback_data=f"delete_confirm_{transaction.id}"
+            )]
+        ])
         
         # Добавляем AI совет для расходов
         if transaction_type == "expense" and amount > 1000:
@@ -111,15 +101,6 @@ class TransactionHandler:
                 print(f"Ошибка получения совета: {e}")
         
         await message.answer(response, reply_markup=keyboard)
-        
-        # Возвращаем интерактивное меню если его нет
-        if not keyboard:
-            from handlers.keyboard_handler import KeyboardHandler
-            menu_handler = KeyboardHandler()
-            await message.answer(
-                "✨ Используйте меню внизу для быстрого доступа к функциям:",
-                reply_markup=menu_handler.get_main_menu()
-            )
     
     async def _check_user_access(self, message: Message) -> bool:
         """Проверка доступа пользователя к боту"""
@@ -128,15 +109,15 @@ class TransactionHandler:
         # Админы всегда имеют доступ
         if user_id in self.config.ADMIN_USERS:
             # Регистрируем админа если не зарегистрирован
-            if not self.db.is_user_registered(user_id):
-                self.db.register_user(user_id, message.from_user.username, message.from_user.first_name)
+            if not await self.db.is_user_registered(user_id):
+                await self.db.register_user(user_id, message.from_user.username, message.from_user.first_name)
             return True
         
         # Проверяем регистрацию
-        if not self.db.is_user_registered(user_id):
+        if not await self.db.is_user_registered(user_id):
             if self.config.AUTO_REGISTRATION:
                 # Автоматическая регистрация
-                success = self.db.register_user(user_id, message.from_user.username, message.from_user.first_name)
+                success = await self.db.register_user(user_id, message.from_user.username, message.from_user.first_name)
                 if success:
                     await message.answer(
                         f"🎉 Добро пожаловать в финансовый бот, {message.from_user.first_name}!\n\n"
@@ -0,0 +1,50 @@
+# scripts/archive_transactions.py
+"""
+Перенос старых транзакций в архивные базы по годам.
+
+Запуск: python scripts/archive_transactions.py --days 365 [--db data/finance_bot.db]
+
+Транзакции старше --days дней переносятся из горячей таблицы в файлы
+finance_bot.archive<год>.db и удаляются из основной базы; отчеты за весь
+период читают их через ATTACH. Бота останавливать не нужно: блокировка
+записи берется на каждую порцию отдельно. Бот делает то же самое
+раз в сутки, если задан ARCHIVE_AFTER_DAYS.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к базе данных")
+    parser.add_argument("--days", type=int, required=True, help="архивировать транзакции старше N дней")
+    args = parser.parse_args()
+
+    if args.days < 1:
+        parser.error("--days должно быть больше 0")
+
+    db = DatabaseManager(args.db)
+    try:
+        moved = db.archive_transactions(args.days)
+    except ValueError as e:
+        print(f"❌ Архивирование невозможно: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    if not moved:
+        print("✅ Транзакций старше горизонта нет")
+        return
+    for year, count in sorted(moved.items()):
+        print(f"  {year}: {count} транзакций -> {db.archive_path(year)}")
+    print(f"\n✅ В архив перенесено: {sum(moved.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# scripts/backup_db.py
+"""
+Разовый онлайн-бэкап базы SQLite (бота останавливать не нужно).
+
+Запуск: python scripts/backup_db.py [--db data/finance_bot.db] [--dir data/backups] [--keep 7]
+
+Вместо копирования файла базы: копия снимается через sqlite3 backup API
+шагами с паузами, сжимается в gzip, старые архивы сверх --keep удаляются.
+При DB_SHARDS > 1 копируется каждый шард.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.backup import backup_database
+from database.sharded_storage import shard_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к базе данных")
+    parser.add_argument("--dir", default=Config.BACKUP_DIR, help="каталог для архивов")
+    parser.add_argument("--keep", type=int, default=Config.BACKUP_KEEP, help="сколько архивов хранить")
+    parser.add_argument("--pages", type=int, default=Config.BACKUP_PAGES, help="страниц за шаг")
+    parser.add_argument("--sleep", type=float, default=Config.BACKUP_SLEEP, help="пауза между шагами, с")
+    args = parser.parse_args()
+
+    db_paths = shard_paths(args.db, Config.DB_SHARDS) if Config.DB_SHARDS > 1 else [args.db]
+    for db_path in db_paths:
+        if not os.path.exists(db_path):
+            print(f"❌ Нет файла базы: {db_path}")
+            sys.exit(1)
+        result = backup_database(db_path, args.dir, args.pages, args.sleep, args.keep)
+        print(f"✅ {result['path']}: {result['size']} -> {result['compressed_size']} байт, "
+              f"{result['steps']} шагов, {result['total_seconds']} с")
+        for name in result['removed']:
+            print(f"  🗑 удален старый архив {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# scripts/check_backup.py
+"""
+Проверка онлайн-бэкапа SQLite под параллельной записью.
+
+Запуск: python scripts/check_backup.py [--rows 50000] [--pages 64]
+
+Во временной базе поток-писатель вставляет транзакции, пока идет бэкап
+мелкими шагами. Проверяется, что архив распаковывается, проходит
+integrity_check и содержит согласованный снимок (балансы сходятся
+с транзакциями), что задержка вставок во время бэкапа не выросла и что
+старые архивы удаляются по retention. Код выхода 1, если проверка не прошла.
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.backup import BackupCancelled, backup_database
+from database.db_manager import DatabaseManager
+
+# Допустимая задержка одной вставки во время бэкапа (с запасом для CI)
+MAX_WRITE_LATENCY = 0.05
+
+
+def seed(db: DatabaseManager, rows: int):
+    for user_id in range(1, 101):
+        db.register_user(user_id, f"user{user_id}", "User")
+    batch = [(1 + i % 100, 100 + i % 900, "покупка", "еда", "expense") for i in range(1000)]
+    for _ in range(rows // len(batch)):
+        db.add_transactions_batch(batch)
+
+
+def restore(archive_path: str, target_path: str):
+    with gzip.open(archive_path, "rb") as archive, open(target_path, "wb") as raw:
+        shutil.copyfileobj(archive, raw)
+
+
+def check(rows: int, pages: int) -> list:
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "finance_bot.db")
+        backup_dir = os.path.join(tmp, "backups")
+        db = DatabaseManager(db_path)
+        seed(db, rows)
+
+        latencies = []
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.add_transaction(1, 10, "кофе", "еда", "expense")
+                latencies.append(time.perf_counter() - started)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            result = backup_database(db_path, backup_dir, pages=pages, sleep=0.001, keep=2)
+        finally:
+            stop.set()
+            thread.join()
+
+        print(f"  {result['steps']} шагов, копирование {result['copy_seconds']} с, "
+              f"всего {result['total_seconds']} с, {result['size']} -> {result['compressed_size']} байт")
+        print(f"  вставок во время бэкапа: {len(latencies)}, "
+              f"макс. задержка {max(latencies) * 1000:.1f} мс")
+
+        if result['steps'] < 2:
+            failures.append(f"бэкап прошел за {result['steps']} шаг - уменьшите --pages")
+        if not latencies or max(latencies) > MAX_WRITE_LATENCY:
+            failures.append(f"задержка записи во время бэкапа: {max(latencies or [0]):.3f} с")
+
+        restored_path = os.path.join(tmp, "restored.db")
+        restore(result['path'], restored_path)
+        restored = sqlite3.connect(restored_path)
+        integrity = restored.execute("PRAGMA integrity_check").fetchone()[0]
+        if integrity != "ok":
+            failures.append(f"integrity_check: {integrity}")
+        restored_rows = restored.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        restored.close()
+        if restored_rows < rows:
+            failures.append(f"в архиве {restored_rows} транзакций из {rows}")
+
+        # Снимок согласован: таблица балансов сходится с транзакциями
+        mismatches = DatabaseManager(restored_path).check_user_balances()
+        if mismatches:
+            failures.append(f"балансы в архиве не сходятся: {mismatches[:3]}")
+
+        # Retention: из трех архивов остаются два последних
+        time.sleep(1)
+        backup_database(db_path, backup_dir, keep=2)
+        time.sleep(1)
+        last = backup_database(db_path, backup_dir, keep=2)
+        archives = sorted(os.listdir(backup_dir))
+        if len(archives) != 2 or os.path.basename(result['path']) in archives:
+            failures.append(f"retention: {archives}")
+        if last['removed'] != [os.path.basename(result['path'])]:
+            failures.append(f"retention, удалены: {last['removed']}")
+
+        # Остановка посреди бэкапа не оставляет файлов
+        def cancel(path, remaining, total):
+            raise BackupCancelled()
+
+        try:
+            backup_database(db_path, backup_dir, pages=pages, keep=10, progress=cancel)
+            failures.append("прерванный бэкап завершился")
+        except BackupCancelled:
+            pass
+        if sorted(os.listdir(backup_dir)) != archives:
+            failures.append(f"после прерывания: {sorted(os.listdir(backup_dir))}")
+
+        db.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000, help="транзакций в базе перед бэкапом")
+    parser.add_argument("--pages", type=int, default=64, help="страниц за шаг бэкапа")
+    args = parser.parse_args()
+
+    failures = check(args.rows, args.pages)
+    if failures:
+        print("❌ Проверка бэкапа не прошла:")
+        for failure in failures:
+            print(f"  • {failure}")
+        sys.exit(1)
+    print("✅ Бэкап согласован и не мешает записи")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# scripts/check_balances.py
+"""
+Сверка таблицы user_balances с сырыми транзакциями.
+
+Запуск: python scripts/check_balances.py [--db data/finance_bot.db] [--fix]
+
+Без --fix только выводит расхождения (код выхода 1, если они есть),
+с --fix пересчитывает таблицу балансов из транзакций.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к базе данных")
+    parser.add_argument("--fix", action="store_true", help="пересчитать таблицу балансов")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    mismatches = db.check_user_balances(fix=args.fix)
+    db.close()
+
+    if not mismatches:
+        print("✅ Балансы согласованы")
+        return
+
+    for m in mismatches:
+        print(f"user {m['user_id']}: ожидалось {m['expected']}, в таблице {m['actual']}")
+
+    if args.fix:
+        print(f"\n🔧 Пересчитано, расхождений было: {len(mismatches)}")
+    else:
+        print(f"\n⚠️ Расхождений: {len(mismatches)} (запустите с --fix для исправления)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
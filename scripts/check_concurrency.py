@@ -0,0 +1,154 @@
+# scripts/check_concurrency.py
+"""
+Проверка, что долгие отчеты не задерживают быстрые запросы бота.
+
+Запуск: python scripts/check_concurrency.py [--rows 200000] [--rounds 3]
+
+Во временной базе у одного пользователя много транзакций. Через
+AsyncDatabaseManager параллельно идут долгие операции - сверка балансов
+(аналитический поток), выгрузка всей истории потоком и чтение всех
+транзакций (потоки-читатели), - а цикл событий тем временем каждые 5 мс
+спрашивает get_user_balance другого пользователя, как /balance.
+Код выхода 1, если /balance ждал дольше допустимого (p95 или максимум)
+или если отчеты прошли слишком быстро, чтобы проверка что-то значила.
+Отдельно: выгрузки, которые потребитель не дочитывает, и долгая аналитика
+держат свои read-only соединения, а история в потоках-читателях не ждет их.
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.async_db_manager import AsyncDatabaseManager
+
+HEAVY_USER_ID = 1
+USER_ID = 2
+
+# Допустимые задержки /balance во время отчетов (с запасом для CI). Потоки
+# отчетов делят GIL с циклом событий, отсюда разброс в единицы миллисекунд;
+# встань /balance в очередь за отчетом, он ждал бы секунды
+P95_BALANCE_LATENCY = 0.025
+MAX_BALANCE_LATENCY = 0.2
+
+# Отчеты должны идти заметно дольше допустимой задержки, иначе проверять нечего
+MIN_REPORT_SECONDS = 10 * MAX_BALANCE_LATENCY
+
+
+def seed(db: AsyncDatabaseManager, rows: int):
+    db.sync.register_user(HEAVY_USER_ID, "heavy", "Heavy")
+    db.sync.register_user(USER_ID, "user", "User")
+    db.sync.add_transaction(USER_ID, 500, "зарплата", "доход", "income")
+    db.sync.add_transactions_bulk(
+        (HEAVY_USER_ID, 100 + i % 900, f"покупка {i}", "еда", "expense") for i in range(rows)
+    )
+
+
+async def reports(db: AsyncDatabaseManager, rounds: int):
+    """Долгие операции, которые может запустить админ или пользователь с большой историей"""
+
+    async def export():
+        return sum([1 async for _ in db.iter_transactions(HEAVY_USER_ID, 3650)])
+
+    for _ in range(rounds):
+        await asyncio.gather(
+            db.check_user_balances(),
+            export(),
+            db.get_transactions(HEAVY_USER_ID, 3650)
+        )
+
+
+async def check(rows: int, rounds: int) -> list:
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabaseManager(os.path.join(tmp, "finance_bot.db"))
+        seed(db, rows)
+        await db.start()
+        try:
+            started = time.perf_counter()
+            running = asyncio.ensure_future(reports(db, rounds))
+            latencies = []
+            while not running.done():
+                probe = time.perf_counter()
+                balance = await db.get_user_balance(USER_ID)
+                latencies.append(time.perf_counter() - probe)
+                if balance != 500:
+                    failures.append(f"get_user_balance: {balance}")
+                    break
+                await asyncio.sleep(0.005)
+            await running
+            report_seconds = time.perf_counter() - started
+        finally:
+            await db.close()
+
+    latencies.sort()
+    p95 = latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)] if latencies else 0
+    slowest = latencies[-1] if latencies else 0
+    print(f"  отчеты: {report_seconds:.2f} с, запросов /balance: {len(latencies)}, "
+          f"p95 {p95 * 1000:.1f} мс, макс. {slowest * 1000:.1f} мс")
+    if report_seconds < MIN_REPORT_SECONDS:
+        failures.append(f"отчеты прошли за {report_seconds:.2f} с - увеличьте --rows")
+    if not latencies or p95 > P95_BALANCE_LATENCY:
+        failures.append(f"p95 задержки /balance во время отчетов: {p95:.3f} с")
+    if slowest > MAX_BALANCE_LATENCY:
+        failures.append(f"макс. задержка /balance во время отчетов: {slowest:.3f} с")
+    return failures
+
+
+async def check_paused_streams() -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabaseManager(os.path.join(tmp, "finance_bot.db"))
+        db.sync.register_user(HEAVY_USER_ID, "heavy", "Heavy")
+        db.sync.add_transactions_bulk(
+            (HEAVY_USER_ID, 100, f"покупка {i}", "еда", "expense") for i in range(1000)
+        )
+        await db.start()
+        released = threading.Event()
+
+        def analytics():
+            with db.sync._snapshot():
+                released.wait(5)
+
+        # Медленные потребители: прочитали первую порцию и держат снимок
+        streams = [db.iter_transactions(HEAVY_USER_ID, 3650, chunk_size=10) for _ in range(db._max_streams)]
+        holding = asyncio.ensure_future(db._analytics.run(analytics))
+        try:
+            for stream in streams:
+                await stream.__anext__()
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(
+                asyncio.gather(*[db.get_history_page(HEAVY_USER_ID) for _ in range(3)]), MAX_BALANCE_LATENCY
+            )
+            return []
+        except asyncio.TimeoutError:
+            return ["история ждет соединение за недочитанными выгрузками"]
+        finally:
+            released.set()
+            await holding
+            for stream in streams:
+                await stream.aclose()
+            await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="транзакций у пользователя с отчетом")
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз повторить отчеты")
+    args = parser.parse_args()
+
+    failures = asyncio.run(check(args.rows, args.rounds)) + asyncio.run(check_paused_streams())
+    if failures:
+        print("❌ Долгие отчеты задерживают быстрые запросы:")
+        for failure in failures:
+            print(f"  • {failure}")
+        sys.exit(1)
+    print("✅ Долгие отчеты не задерживают /balance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# scripts/check_query_plans.py
+"""
+Проверка планов запросов DatabaseManager (EXPLAIN QUERY PLAN).
+
+Запуск: python scripts/check_query_plans.py [-v]
+
+Каждый публичный метод DatabaseManager вызывается на временной базе,
+все выполненные SQL-запросы перехватываются и для каждого строится план.
+Скрипт завершается с кодом 1, если запрос по пользователю скатился
+в полный SCAN таблицы, если отчет на счетчиках читает transactions,
+или если у нового метода нет записи в QUERY_CATALOG или декоратора @timed
+(у оберток из THIN_WRAPPERS декоратора, наоборот, быть не должно).
+"""
+import argparse
+import inspect
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+
+USER_ID = 1001
+
+# Часть транзакций seed() сдвигает на столько дней назад - они уходят в архив
+ARCHIVED_AGE_DAYS = 800
+ARCHIVE_YEAR = time.gmtime(time.time() - ARCHIVED_AGE_DAYS * 86400).tm_year
+
+# Метод -> аргументы вызова. Новые публичные методы нужно добавлять сюда.
+# archive_transactions идет первым: запросы за весь период читают и архив.
+QUERY_CATALOG = {
+    "archive_transactions": (365,),
+    "compact_archive": (ARCHIVE_YEAR,),
+    "register_user": (USER_ID + 1, "new_user", "New"),
+    "is_user_registered": (USER_ID,),
+    "fetch_user_registered": (USER_ID,),
+    "get_user_stats": (),
+    "get_detailed_users_list": (),
+    "get_users_page": (("2000-01-01 00:00:00", USER_ID),),
+    "get_user_transaction_stats": (USER_ID,),
+    "add_transaction": (USER_ID, 1500, "такси", "транспорт", "expense"),
+    "add_transactions_batch": ([(USER_ID, 700, "кофе", "еда", "expense")] * 3,),
+    "add_transactions_bulk": ([(USER_ID, 100, "импорт", "еда", "expense", "2024-01-01 00:00:00")] * 3,),
+    "get_user_balance": (USER_ID,),
+    "get_transactions": (USER_ID, 3650),
+    "get_transaction_batch": (USER_ID, 30),
+    "iter_transactions": (USER_ID, 30),
+    "update_user_activity": (USER_ID, "user", "User"),
+    "touch_users_activity": ([(USER_ID, "2030-01-01 00:00:00")],),
+    "get_category_stats": (USER_ID, 30),
+    "delete_transaction": (1, USER_ID),
+    "delete_transaction_returning": (2, USER_ID),
+    "get_history_page": (USER_ID, (datetime(2030, 1, 1), 10 ** 9)),
+    "get_transaction_by_id": (3, USER_ID),
+    "get_last_transaction": (USER_ID,),
+    "get_recent_transactions_for_deletion": (USER_ID, 10),
+    "build_search_index": (True,),
+    "search_transactions": (USER_ID, "обед"),
+    "get_admin_analytics": (),
+    "check_user_balances": (),
+}
+
+# Админские методы по всей базе: полный обход для них ожидаем
+ALLOWED_FULL_SCANS = {
+    "get_user_stats", "get_detailed_users_list", "get_admin_analytics", "check_user_balances",
+    "archive_transactions"
+}
+
+# Отчеты на счетчиках: не должны читать транзакции, сколько бы их ни было
+COUNTER_METHODS = {"get_admin_analytics"}
+TRANSACTIONS_RE = re.compile(r"\b(FROM|JOIN)\s+transactions\b", re.IGNORECASE)
+
+# Служебные методы без запросов к данным
+SKIPPED_METHODS = {"init_database", "close", "archive_path"}
+
+# Обертки, которые только вызывают другой метод с @timed: свой @timed
+# записал бы то же время второй раз (попадания в кэш считает user_cache)
+THIN_WRAPPERS = {"delete_transaction", "is_user_registered"}
+
+# Служебные таблицы sqlite_* (например, sqlite_sequence), transaction_archives
+# (строка на год архива), search_index_state (одна строка) и конфигурация FTS5
+# крошечные - не считаем. Виртуальная таблица FTS5 с MATCH (M в плане) - поиск
+# по индексу, а не обход
+FULL_SCAN_RE = re.compile(
+    r"^SCAN (?!sqlite_|transaction_archives\b|search_index_state\b|(main\.)?transactions_fts_config\b)"
+    r"([\w.]+)\b(?! USING (COVERING )?INDEX| VIRTUAL TABLE INDEX \d+:\S*M)"
+)
+
+
+class TracingDatabaseManager(DatabaseManager):
+    """DatabaseManager, запоминающий все выполненные SQL-запросы"""
+
+    def __init__(self, *args, **kwargs):
+        self.statements = []
+        super().__init__(*args, **kwargs)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+    def _connect_readonly(self) -> sqlite3.Connection:
+        conn = super()._connect_readonly()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def seed(db: DatabaseManager):
+    """Небольшой набор данных, чтобы планировщик видел реальные таблицы"""
+    for user_id in (USER_ID, USER_ID + 2):
+        db.register_user(user_id, f"user{user_id}", "User")
+        for i in range(20):
+            db.add_transaction(user_id, 100 + i, "обед", "еда", "expense")
+        db.add_transaction(user_id, 200000, "зарплата", "доход", "income")
+
+    with db._connection() as conn:
+        conn.execute("""
+            UPDATE transactions SET created_ts = created_ts - ? * 86400
+            WHERE id % 4 = 0
+        """, (ARCHIVED_AGE_DAYS,))
+        conn.execute("UPDATE transactions SET created_at = datetime(created_ts, 'unixepoch')")
+
+
+def explainable(sql: str) -> bool:
+    return sql.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"))
+
+
+def check(verbose: bool) -> int:
+    public = {
+        name for name in dir(DatabaseManager)
+        if not name.startswith("_") and callable(getattr(DatabaseManager, name))
+    }
+    missing = sorted(public - set(QUERY_CATALOG) - SKIPPED_METHODS)
+    failures = [f"{name}: нет записи в QUERY_CATALOG" for name in missing]
+    # functools.wraps в @timed оставляет ссылку на исходный метод
+    timed = {name for name in QUERY_CATALOG if hasattr(getattr(DatabaseManager, name), "__wrapped__")}
+    failures += [f"{name}: нет @timed - вызовы не попадут в статистику запросов"
+                 for name in sorted(set(QUERY_CATALOG) - timed - THIN_WRAPPERS)]
+    failures += [f"{name}: @timed у обертки - время запишется дважды" for name in sorted(timed & THIN_WRAPPERS)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = TracingDatabaseManager(os.path.join(tmp, "plans.db"))
+        seed(db)
+
+        with db._connection() as conn:
+            for method, args in QUERY_CATALOG.items():
+                # Для EXPLAIN запросов с архивами они должны быть подключены и здесь
+                db._attach_archives(conn, db._archive_years(conn))
+                db.statements.clear()
+                result = getattr(db, method)(*args)
+                if inspect.isgenerator(result):
+                    # Потоковые методы выполняют запрос только при чтении
+                    list(result)
+                statements = [sql for sql in db.statements if explainable(sql)]
+
+                for sql in statements:
+                    plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                    scans = [line for line in plan if FULL_SCAN_RE.match(line)]
+
+                    if verbose or scans:
+                        print(f"{method}: {' '.join(sql.split())[:100]}")
+                        for line in plan:
+                            print(f"    {line}")
+
+                    if scans and method not in ALLOWED_FULL_SCANS:
+                        failures.append(f"{method}: {', '.join(scans)}")
+                    if method in COUNTER_METHODS and TRANSACTIONS_RE.search(sql):
+                        failures.append(f"{method}: читает transactions вместо счетчиков")
+        db.close()
+
+    if failures:
+        print("\n❌ Регрессии планов запросов:")
+        for failure in failures:
+            print(f"  • {failure}")
+        return 1
+
+    print("✅ Все запросы по пользователю используют индексы")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="показать все планы")
+    args = parser.parse_args()
+    sys.exit(check(args.verbose))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# scripts/import_transactions.py
+"""
+Импорт транзакций пользователя из CSV в формате выгрузки /export.
+
+Запуск: python scripts/import_transactions.py --user 123456 --csv transactions.csv
+                                              [--db data/finance_bot.db]
+
+Колонки: id, date, type, amount, category, description (id игнорируется,
+транзакции получают новые ID). Все строки вставляются одной транзакцией
+пачками через add_transactions_bulk; строки с ошибками не прерывают импорт,
+их номера печатаются в конце.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+
+
+def read_rows(path: str, user_id: int):
+    """Строки CSV -> кортежи для add_transactions_bulk"""
+    # utf-8-sig - выгрузка /export пишется с BOM для Excel
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for record in csv.DictReader(f):
+            yield (user_id, record['amount'], record['description'], record['category'],
+                   record['type'], record['date'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к базе данных")
+    parser.add_argument("--user", type=int, required=True, help="Telegram ID пользователя")
+    parser.add_argument("--csv", required=True, help="файл выгрузки /export")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    try:
+        if not db.is_user_registered(args.user):
+            print(f"❌ Пользователь {args.user} не зарегистрирован")
+            sys.exit(1)
+
+        started = time.perf_counter()
+        result = db.add_transactions_bulk(read_rows(args.csv, args.user))
+    finally:
+        db.close()
+
+    print(f"✅ Импортировано транзакций: {result['inserted']} за {time.perf_counter() - started:.1f} с")
+    for index, error in result['failures']:
+        # +2: заголовок CSV и нумерация строк с единицы
+        print(f"  • строка {index + 2}: {error}")
+
+
+if __name__ == "__main__":
+    main()
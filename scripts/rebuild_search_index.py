@@ -0,0 +1,49 @@
+# scripts/rebuild_search_index.py
+"""
+Построение поискового индекса FTS5 по описаниям транзакций.
+
+Запуск: python scripts/rebuild_search_index.py [--rebuild] [--db data/finance_bot.db]
+
+Без --rebuild индекс достраивается с места остановки (после миграции
+существующей базы бот делает это сам при старте). С --rebuild индекс
+очищается и строится заново - например, после смены токенизатора или
+если integrity-check нашел расхождения. Бота останавливать не нужно:
+блокировка записи берется на каждую порцию отдельно, новые транзакции
+индексируют триггеры.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к базе данных")
+    parser.add_argument("--rebuild", action="store_true", help="очистить индекс и построить заново")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    started = time.perf_counter()
+    indexed = db.build_search_index(rebuild=args.rebuild)
+    try:
+        with db._connection() as conn:
+            # С rank = 1 индекс сверяется с содержимым transactions
+            conn.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('integrity-check', 1)")
+    except sqlite3.DatabaseError as e:
+        print(f"❌ Индекс не сходится с транзакциями ({e}) - запустите с --rebuild")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"✅ В индекс добавлено транзакций: {indexed} за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# scripts/split_shards.py
+"""
+Разделение одной базы SQLite на шарды для DB_SHARDS > 1.
+
+Запуск: python scripts/split_shards.py --shards 4 [--db data/finance_bot.db]
+
+Пользователи и их транзакции копируются в файлы finance_bot.shard0.db, ...
+по тому же хэшу user_id, что использует ShardedStorage; ID транзакций
+сохраняются. Балансы, сводки по категориям и счетчики аналитики в каждом
+шарде пересчитываются из скопированных строк. Исходная база не меняется (кроме миграций схемы),
+существующие файлы шардов не перезаписываются. Бота на время разделения
+нужно остановить.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+from database.sharded_storage import shard_index, shard_paths
+
+USER_COLUMNS = "user_id, username, first_name, is_active, registration_date, last_activity"
+TRANSACTION_COLUMNS = ("id, user_id, amount, description, category, transaction_type, "
+                       "created_at, created_ts")
+
+
+def count_rows(db: DatabaseManager, table: str) -> int:
+    with db._connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def split(source_path: str, shards: int) -> int:
+    # Приводим исходную базу к текущей схеме, чтобы колонки совпали
+    source = DatabaseManager(source_path)
+    expected = {table: count_rows(source, table) for table in ("users", "transactions")}
+    archived = count_rows(source, "transaction_archives")
+    source.close()
+
+    if archived:
+        print("❌ У базы есть архивы транзакций по годам - разделение их не переносит")
+        return 1
+
+    paths = shard_paths(source_path, shards)
+    existing = [path for path in paths if os.path.exists(path)]
+    if existing:
+        print(f"❌ Файлы шардов уже существуют: {', '.join(existing)}")
+        return 1
+
+    copied = {"users": 0, "transactions": 0}
+    for index, path in enumerate(paths):
+        shard = DatabaseManager(path)
+        with shard._connection() as conn:
+            conn.create_function("shard_index", 2, shard_index, deterministic=True)
+            conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                INSERT INTO users ({USER_COLUMNS})
+                SELECT {USER_COLUMNS} FROM src.users
+                WHERE shard_index(user_id, ?) = ?
+            """, (shards, index))
+            cursor.execute(f"""
+                INSERT INTO transactions ({TRANSACTION_COLUMNS})
+                SELECT {TRANSACTION_COLUMNS} FROM src.transactions
+                WHERE shard_index(user_id, ?) = ?
+                ORDER BY id
+            """, (shards, index))
+
+            shard._rebuild_user_balances(cursor)
+            shard._rebuild_category_rollups(cursor)
+            shard._rebuild_global_counters(cursor)
+            conn.commit()
+            conn.execute("DETACH DATABASE src")
+
+        counts = {table: count_rows(shard, table) for table in copied}
+        shard.close()
+        for table, count in counts.items():
+            copied[table] += count
+        print(f"  {path}: пользователей {counts['users']}, транзакций {counts['transactions']}")
+
+    if copied != expected:
+        print(f"❌ Скопировано {copied}, в исходной базе {expected}")
+        return 1
+
+    print(f"\n✅ База разделена на {shards} шардов. Включите DB_SHARDS={shards}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="путь к исходной базе")
+    parser.add_argument("--shards", type=int, required=True, help="число шардов (больше 1)")
+    args = parser.parse_args()
+
+    if args.shards < 2:
+        parser.error("--shards должно быть больше 1")
+    sys.exit(split(args.db, args.shards))
+
+
+if __name__ == "__main__":
+    main()